@@ -0,0 +1,207 @@
+# src/ava/core/file_content_cache.py
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+BINARY_SNIFF_BYTES = 8192
+
+# Sentinels stored in place of content for files that are never handed out.
+_BINARY = object()
+_TOO_LARGE = object()
+
+
+def _normalize_newlines(text: str) -> str:
+    return text.replace('\r\n', '\n').replace('\r', '\n') if '\r' in text else text
+
+
+class FileContentCache:
+    """
+    Decoded text of project files, keyed by absolute path and validated
+    against (size, mtime_ns) on every read, so an edited file is never
+    served stale. Entries are evicted least-recently-used once the cached
+    text exceeds max_bytes. Binary files (a NUL byte in the first 8 KB) and
+    files over max_file_bytes are remembered as such and never read whole.
+    Newlines are normalized to '\n', as reading in text mode would.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, max_file_bytes: int = 2 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self._entries: "OrderedDict[str, Tuple[int, int, object, int]]" = OrderedDict()  # (size, mtime_ns, value, cost)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.skipped_binary = 0
+        self.skipped_large = 0
+
+    def _lookup(self, key: str, size: int, mtime_ns: int):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] != size or entry[1] != mtime_ns:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[2]
+
+    def _store(self, key: str, size: int, mtime_ns: int, value: object, cost: int):
+        self._drop(key)
+        if cost > self.max_bytes:
+            return
+        self._entries[key] = (size, mtime_ns, value, cost)
+        self._bytes += cost
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, _, _, evicted_cost) = self._entries.popitem(last=False)
+            self._bytes -= evicted_cost
+            self.evictions += 1
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[3]
+
+    def _classify(self, key: str, stat: os.stat_result) -> object:
+        """Returns the cached value, or _TOO_LARGE / _BINARY without reading the whole file."""
+        cached = self._lookup(key, stat.st_size, stat.st_mtime_ns)
+        if cached is not None:
+            return cached
+        if stat.st_size > self.max_file_bytes:
+            self._store(key, stat.st_size, stat.st_mtime_ns, _TOO_LARGE, 0)
+            self.skipped_large += 1
+            return _TOO_LARGE
+        return None
+
+    def is_text(self, path: Path) -> bool:
+        """True if path is a readable text file within the size cap. Reads at most the sniff prefix."""
+        key = str(path)
+        try:
+            stat = os.stat(key)
+        except OSError:
+            return False
+        with self._lock:
+            value = self._classify(key, stat)
+            if value is not None:
+                return isinstance(value, str)
+        try:
+            with open(key, 'rb') as handle:
+                head = handle.read(BINARY_SNIFF_BYTES)
+        except OSError:
+            return False
+        if b'\0' in head:
+            with self._lock:
+                self._store(key, stat.st_size, stat.st_mtime_ns, _BINARY, 0)
+                self.skipped_binary += 1
+            return False
+        return True
+
+    def read(self, path: Path) -> Optional[str]:
+        """The file's text, or None for missing, binary and oversized files."""
+        key = str(path)
+        try:
+            stat = os.stat(key)
+        except OSError:
+            return None
+        with self._lock:
+            value = self._classify(key, stat)
+            if value is not None:
+                if isinstance(value, str):
+                    self.hits += 1
+                    return value
+                return None
+            self.misses += 1
+        try:
+            with open(key, 'rb') as handle:
+                raw = handle.read()
+        except OSError:
+            return None
+        with self._lock:
+            if b'\0' in raw[:BINARY_SNIFF_BYTES]:
+                self._store(key, stat.st_size, stat.st_mtime_ns, _BINARY, 0)
+                self.skipped_binary += 1
+                return None
+            content = _normalize_newlines(raw.decode('utf-8', errors='ignore'))
+            self._store(key, stat.st_size, stat.st_mtime_ns, content, len(raw))
+        return content
+
+    def put(self, path: Path, content: str):
+        """Primes the cache with content just written to path, so the next read is a hit."""
+        key = str(path)
+        try:
+            stat = os.stat(key)
+        except OSError:
+            return
+        with self._lock:
+            self._store(key, stat.st_size, stat.st_mtime_ns, _normalize_newlines(content), stat.st_size)
+
+    def invalidate(self, paths: Iterable[Path]):
+        with self._lock:
+            for path in paths:
+                self._drop(str(path))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "skipped_binary": self.skipped_binary,
+            "skipped_large": self.skipped_large,
+        }
+
+
+class LazyProjectFiles(Mapping):
+    """
+    A read-only {relative_path: content} view over a set of project files.
+    Nothing is read until a key is accessed; contents come from the shared
+    FileContentCache. Binary and oversized files are not part of the mapping,
+    matching what an eager read would have returned.
+    """
+
+    def __init__(self, root: Path, relative_paths: Iterable[str], cache: FileContentCache):
+        self._root = Path(root)
+        self._candidates: List[str] = list(relative_paths)
+        self._candidate_set = set(self._candidates)
+        self._cache = cache
+        self._keys: Optional[List[str]] = None
+        self._key_set: Optional[set] = None
+
+    def _resolve_keys(self) -> List[str]:
+        if self._keys is None:
+            self._keys = [rel for rel in self._candidates if self._cache.is_text(self._root / rel)]
+            self._key_set = set(self._keys)
+        return self._keys
+
+    def __getitem__(self, relative_path: str) -> str:
+        if relative_path not in self._candidate_set:
+            raise KeyError(relative_path)
+        content = self._cache.read(self._root / relative_path)
+        if content is None:
+            raise KeyError(relative_path)
+        return content
+
+    def __contains__(self, relative_path: object) -> bool:
+        if self._key_set is not None:
+            return relative_path in self._key_set
+        return relative_path in self._candidate_set and self._cache.is_text(self._root / relative_path)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._resolve_keys())
+
+    def __len__(self) -> int:
+        return len(self._resolve_keys())
+
+    def __repr__(self) -> str:
+        return f"LazyProjectFiles({self._root.name!r}, {len(self._candidates)} candidates)"
@@ -86,7 +86,7 @@ class ServiceManager:
 
         self.app_state_service = AppStateService(self.event_bus)
         self.project_indexer_service = ProjectIndexerService()
-        self.import_fixer_service = ImportFixerService()
+        self.import_fixer_service = ImportFixerService(self.project_indexer_service)
         self.context_manager = ContextManager(self)
         self.dependency_planner = DependencyPlanner(self)
         self.integration_validator = IntegrationValidator(self)
@@ -107,7 +107,8 @@ class ServiceManager:
             rag_service_instance, self.project_indexer_service, self.import_fixer_service
         )
         self.reviewer_service = ReviewerService(self.event_bus, self.llm_client)
-        self.validation_service = ValidationService(self.event_bus, self.project_manager, self.reviewer_service)
+        self.validation_service = ValidationService(self.event_bus, self.project_manager, self.reviewer_service,
+                                                    self.project_indexer_service)
         self.terminal_service = TerminalService(self.event_bus, self.project_manager)
         self.action_service = ActionService(self.event_bus, self, None, None)
 
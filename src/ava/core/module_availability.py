@@ -0,0 +1,179 @@
+# src/ava/core/module_availability.py
+import importlib.util
+import json
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+MODULE_CACHE_DIR = ".ava_cache"
+MODULE_CACHE_NAME = "venv_modules.json"
+PROBE_TIMEOUT_SECONDS = 60
+
+# Runs inside the project's interpreter. It lists what is importable without importing any of it:
+# stdlib and builtin names, top-level names declared by installed distributions, and whatever
+# else sits directly in site-packages (e.g. modules installed without metadata).
+_PROBE_SCRIPT = r"""
+import json, os, pkgutil, sys, sysconfig
+from importlib import metadata
+
+stdlib = set(getattr(sys, "stdlib_module_names", ()))
+if not stdlib:
+    stdlib_dir = sysconfig.get_paths().get("stdlib")
+    if stdlib_dir and os.path.isdir(stdlib_dir):
+        stdlib = {m.name for m in pkgutil.iter_modules([stdlib_dir])}
+        dynload = os.path.join(stdlib_dir, "lib-dynload")
+        if os.path.isdir(dynload):
+            stdlib |= {m.name for m in pkgutil.iter_modules([dynload])}
+
+installed = set()
+for dist in metadata.distributions():
+    top_level = dist.read_text("top_level.txt")
+    if top_level:
+        installed.update(line.strip() for line in top_level.splitlines() if line.strip())
+        continue
+    for file in dist.files or ():
+        parts = file.parts
+        if not parts or parts[0] in ("..", "__pycache__") or parts[0].endswith((".dist-info", ".egg-info", ".data")):
+            continue
+        name = parts[0][:-3] if len(parts) == 1 and parts[0].endswith(".py") else parts[0]
+        if len(parts) > 1 or file.suffix in (".py", ".pyd", ".so"):
+            installed.add(name.split(".")[0])
+
+site_dirs = [p for p in sys.path if p and os.path.isdir(p) and os.path.basename(p) in ("site-packages", "dist-packages")]
+for module in pkgutil.iter_modules(site_dirs):
+    installed.add(module.name)
+
+print(json.dumps({
+    "executable": sys.executable,
+    "version": list(sys.version_info[:3]),
+    "stdlib": sorted(stdlib | set(sys.builtin_module_names)),
+    "installed": sorted(installed),
+}))
+"""
+
+
+class ModuleAvailabilityIndex:
+    """
+    Which top-level modules a project's interpreter can import, answered
+    by set lookups and never by importing anything. The index is built by
+    one subprocess in the project's venv, and saved in
+    .ava_cache/venv_modules.json keyed by the site-packages mtimes. It is
+    rebuilt only when a package is installed or removed.
+
+    Without a venv, the names come from this interpreter's stdlib list and
+    importlib.util.find_spec, which locates a top-level module without
+    executing it.
+    """
+
+    _registry: Dict[Tuple[str, str], "ModuleAvailabilityIndex"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, project_root: Path, python_path: Optional[Path]):
+        self.project_root = Path(project_root)
+        self.python_path = Path(python_path) if python_path else None
+        self.cache_path = self.project_root / MODULE_CACHE_DIR / MODULE_CACHE_NAME
+        self._stamp: Optional[List[Tuple[str, int]]] = None
+        self._modules: FrozenSet[str] = frozenset()
+        self._failed_stamp: Optional[List[Tuple[str, int]]] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_project(cls, project_root: Path, python_path: Optional[Path]) -> "ModuleAvailabilityIndex":
+        key = (str(Path(project_root).resolve()), str(python_path or ""))
+        with cls._registry_lock:
+            index = cls._registry.get(key)
+            if index is None:
+                index = cls._registry[key] = cls(project_root, python_path)
+        return index
+
+    # --- Staleness ---
+
+    def _site_packages_dirs(self) -> List[Path]:
+        if not self.python_path:
+            return []
+        venv_dir = self.python_path.parent.parent
+        return sorted(set(venv_dir.glob("lib/python*/site-packages")) | set(venv_dir.glob("Lib/site-packages")))
+
+    def _current_stamp(self) -> List[Tuple[str, int]]:
+        """(path, mtime_ns) of every site-packages directory; installing or removing a package changes it."""
+        stamp = []
+        for directory in self._site_packages_dirs():
+            try:
+                stamp.append((str(directory), directory.stat().st_mtime_ns))
+            except OSError:
+                continue
+        return stamp
+
+    def _ensure_current(self):
+        if not self.python_path:
+            return
+        stamp = self._current_stamp()
+        with self._lock:
+            if stamp == self._stamp or stamp == self._failed_stamp:
+                return
+            modules = self._load_cached(stamp)
+            if modules is None:
+                modules = self._probe()
+                if modules is None:
+                    # Not retried until the venv changes; queries use the fallback meanwhile.
+                    self._failed_stamp = stamp
+                    return
+                self._save_cached(stamp, modules)
+            self._modules, self._stamp = frozenset(modules), stamp
+
+    def _load_cached(self, stamp: List[Tuple[str, int]]) -> Optional[List[str]]:
+        try:
+            data = json.loads(self.cache_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if data.get("python") != str(self.python_path) or [tuple(s) for s in data.get("stamp", [])] != stamp:
+            return None
+        return data.get("modules")
+
+    def _save_cached(self, stamp: List[Tuple[str, int]], modules: List[str]):
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self.cache_path.write_text(json.dumps({"python": str(self.python_path), "stamp": stamp,
+                                                   "modules": modules}), encoding="utf-8")
+        except OSError as e:
+            print(f"[ModuleAvailability] Warning: Could not cache module index: {e}")
+
+    def _probe(self) -> Optional[List[str]]:
+        print(f"[ModuleAvailability] Indexing importable modules of {self.python_path}...")
+        startupinfo = None
+        if sys.platform == "win32":
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            startupinfo.wShowWindow = subprocess.SW_HIDE
+        try:
+            result = subprocess.run([str(self.python_path), "-I", "-c", _PROBE_SCRIPT], capture_output=True,
+                                    text=True, timeout=PROBE_TIMEOUT_SECONDS, startupinfo=startupinfo)
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "no output")
+            data = json.loads(result.stdout)
+        except Exception as e:
+            print(f"[ModuleAvailability] Warning: Could not index the project interpreter: {e}")
+            return None
+        modules = sorted(set(data["stdlib"]) | set(data["installed"]))
+        print(f"[ModuleAvailability] {len(data['stdlib'])} stdlib and {len(data['installed'])} installed "
+              f"top-level modules for Python {'.'.join(map(str, data['version']))}.")
+        return modules
+
+    # --- Queries ---
+
+    def is_available(self, module_name: str) -> bool:
+        """True if the top-level package of module_name can be imported by the project's interpreter."""
+        top_level = module_name.split(".")[0]
+        if not top_level:
+            return False
+        self._ensure_current()
+        if self._stamp is not None:
+            return top_level in self._modules
+        if top_level in getattr(sys, "stdlib_module_names", ()) or top_level in sys.builtin_module_names:
+            return True
+        try:
+            return importlib.util.find_spec(top_level) is not None
+        except (ImportError, ValueError):
+            return False
@@ -1,10 +1,36 @@
 # src/ava/core/project_manager.py
+import os
+import secrets
 import shutil
+from dataclasses import dataclass, field
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Mapping
 
+from src.ava.core.file_content_cache import FileContentCache, LazyProjectFiles
 from src.ava.core.venv_manager import VenvManager
+from src.ava.core.workspace_inventory import WorkspaceInventory
+
+
+@dataclass
+class FileChangeSet:
+    """What a save_files call actually did, as relative paths."""
+    added: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def changed(self) -> List[str]:
+        return self.added + self.modified
+
+    def changed_files(self, files: Mapping[str, str]) -> Dict[str, str]:
+        """The subset of files that was written."""
+        return {path: files[path] for path in self.changed}
+
+    def summary(self) -> str:
+        text = f"{len(self.added)} added, {len(self.modified)} modified, {len(self.unchanged)} unchanged"
+        return text + (f", {len(self.failed)} failed" if self.failed else "")
 
 
 class ProjectManager:
@@ -18,15 +44,33 @@ class ProjectManager:
 
         self.active_project_path: Optional[Path] = None
         self.venv_manager: Optional[VenvManager] = None
+        self.inventory: Optional[WorkspaceInventory] = None
+        self.content_cache = FileContentCache()
         self.is_existing_project: bool = False
 
     def clear_active_project(self):
         """Resets the active project context."""
         print("[ProjectManager] Clearing active project.")
+        self._close_inventory()
         self.active_project_path = None
         self.venv_manager = None
         self.is_existing_project = False
 
+    def _open_inventory(self):
+        """Crawls the active project once; every component then reads its file list from the inventory."""
+        self._close_inventory()
+        self.inventory = WorkspaceInventory.open(self.active_project_path)
+
+    def _close_inventory(self):
+        if self.inventory:
+            self.inventory.close()
+            self.inventory = None
+        self.content_cache.clear()
+
+    def _refresh_inventory(self, *relative_paths: str):
+        if self.inventory:
+            self.inventory.refresh(relative_paths)
+
     @property
     def active_project_name(self) -> str:
         return self.active_project_path.name if self.active_project_path else "(none)"
@@ -65,6 +109,7 @@ class ProjectManager:
             shutil.rmtree(project_path, ignore_errors=True)
             self.clear_active_project()
             return None
+        self._open_inventory()
 
         print(f"[ProjectManager] Successfully created new project: {project_path}")
         return str(project_path)
@@ -80,6 +125,7 @@ class ProjectManager:
         self.active_project_path = project_path
         self.is_existing_project = True
         self.venv_manager = VenvManager(project_path)
+        self._open_inventory()
 
         if not self.venv_manager.is_active:
             print("[ProjectManager] Warning: No virtual environment found. Please run install command.")
@@ -87,47 +133,124 @@ class ProjectManager:
         print(f"[ProjectManager] Project loaded: {self.active_project_path}")
         return str(self.active_project_path)
 
-    def get_project_files(self) -> dict[str, str]:
-        """Reads all relevant text files from the project directory."""
+    def get_project_files(self) -> Mapping[str, str]:
+        """
+        Returns a lazy {relative_path: content} mapping of the project's text files.
+        Contents are read on first access and served from the content cache after
+        that, for as long as the file's size and mtime are unchanged.
+        """
         if not self.active_project_path: return {}
-        project_files = {}
-        ignore_dirs = {'.venv', 'venv', '__pycache__', 'node_modules', 'dist', 'build', 'rag_db'}
+        if not self.inventory: self._open_inventory()
         allowed_extensions = {
             '.py', '.md', '.txt', '.json', '.toml', '.ini', '.cfg', '.yaml', '.yml',
             '.html', '.css', '.js', '.ts', '.java', '.c', '.cpp', '.h', '.hpp',
             '.cs', '.go', '.rb', '.php', '.sh', '.bat', '.ps1', '.dockerfile',
             '.gitignore', '.env', '.gd', '.tscn', '.godot'
         }
-        for item in self.active_project_path.rglob('*'):
-            if any(part in ignore_dirs for part in item.relative_to(self.active_project_path).parts):
-                continue
-            if item.is_file() and item.suffix.lower() in allowed_extensions:
-                try:
-                    project_files[item.relative_to(self.active_project_path).as_posix()] = item.read_text(encoding='utf-8', errors='ignore')
-                except Exception:
-                    pass # Ignore unreadable files
-        return project_files
+        return LazyProjectFiles(self.inventory.root, self.inventory.by_extension(*allowed_extensions),
+                                self.content_cache)
+
+    def get_content_cache_stats(self) -> dict:
+        return self.content_cache.stats()
 
     def read_file(self, relative_path: str) -> Optional[str]:
         if not self.active_project_path: return None
         full_path = self.active_project_path / relative_path
         if not full_path.exists(): return None
         try:
-            return full_path.read_text(encoding='utf-8')
+            return self.content_cache.read(full_path)
         except Exception:
             return None
 
     # --- New/Re-implemented Methods ---
-    def save_files(self, files: dict[str, str]):
-        """Writes files to disk."""
-        if not self.active_project_path: return
+    def save_files(self, files: Mapping[str, str]) -> FileChangeSet:
+        """
+        Writes files to disk, skipping any whose content is already on disk.
+        Each changed file is written to a temporary sibling and moved into place
+        with os.replace, so a crash never leaves a half-written file; the
+        affected directories are fsynced once per batch.
+
+        Returns:
+            A FileChangeSet listing added, modified, unchanged and failed paths.
+        """
+        changes = FileChangeSet()
+        if not self.active_project_path: return changes
+        touched_dirs = set()
         for relative_path_str, content in files.items():
             full_path = self.active_project_path / relative_path_str
+            # Same newline translation write_text would apply.
+            data = (content if os.linesep == '\n' else content.replace('\n', os.linesep)).encode('utf-8')
             try:
+                existed = full_path.is_file()
+                if existed and self._content_matches(full_path, data):
+                    changes.unchanged.append(relative_path_str)
+                    continue
                 full_path.parent.mkdir(parents=True, exist_ok=True)
-                full_path.write_text(content, encoding='utf-8')
+                self._write_atomically(full_path, data)
+                touched_dirs.add(full_path.parent)
+                self.content_cache.put(full_path, data.decode('utf-8'))
+                (changes.modified if existed else changes.added).append(relative_path_str)
             except Exception as e:
+                changes.failed[relative_path_str] = str(e)
                 print(f"[ProjectManager] Error writing file {relative_path_str}: {e}")
+        self._fsync_directories(touched_dirs)
+        self._refresh_inventory(*changes.changed)
+        if changes.changed or changes.failed:
+            print(f"[ProjectManager] Saved files: {changes.summary()}.")
+        return changes
+
+    def _content_matches(self, full_path: Path, data: bytes) -> bool:
+        """
+        Compares against the raw on-disk bytes; the content cache holds
+        newline-normalized text, so it cannot tell '\r\n' from '\n'.
+        """
+        try:
+            if full_path.stat().st_size != len(data):
+                return False
+        except OSError:
+            return False
+        return full_path.read_bytes() == data
+
+    @staticmethod
+    def _write_atomically(full_path: Path, data: bytes):
+        while True:
+            temp_name = str(full_path.parent / f".{full_path.name}.{secrets.token_hex(4)}.tmp")
+            try:
+                # Unlike mkstemp's fixed 0600, mode 0o666 lets the kernel apply the umask, as open() would.
+                fd = os.open(temp_name, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+                break
+            except FileExistsError:
+                continue
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(data)
+                handle.flush()
+                os.fsync(handle.fileno())
+            if full_path.exists():
+                shutil.copymode(full_path, temp_name)
+            os.replace(temp_name, full_path)
+        except BaseException:
+            try:
+                os.unlink(temp_name)
+            except OSError:
+                pass
+            raise
+
+    @staticmethod
+    def _fsync_directories(directories):
+        """Makes the renames durable. Directories cannot be opened for fsync on Windows."""
+        if os.name == 'nt': return
+        for directory in directories:
+            try:
+                fd = os.open(directory, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.fsync(fd)
+            except OSError:
+                pass
+            finally:
+                os.close(fd)
 
     def rename_item(self, relative_item_path_str: str, new_name_str: str) -> tuple[bool, str, Optional[str]]:
         if not self.active_project_path: return False, "No active project.", None
@@ -142,6 +265,7 @@ class ProjectManager:
         try:
             old_abs_path.rename(new_abs_path)
             new_relative_path_str = new_abs_path.relative_to(self.active_project_path).as_posix()
+            self._refresh_inventory(relative_item_path_str, new_relative_path_str)
             return True, f"Renamed to '{new_name_str}'.", new_relative_path_str
         except Exception as e:
             return False, f"Error renaming: {e}", None
@@ -156,6 +280,7 @@ class ProjectManager:
                 elif abs_path.is_dir(): shutil.rmtree(abs_path)
             except Exception as e:
                 errors.append(f"Error deleting '{rel_path_str}': {e}")
+        self._refresh_inventory(*relative_item_paths)
 
         if errors:
             return False, "\n".join(errors)
@@ -169,6 +294,7 @@ class ProjectManager:
         try:
             parent_abs_path.mkdir(parents=True, exist_ok=True)
             new_file_abs_path.touch()
+            self._refresh_inventory(new_file_rel_path_str)
             return True, f"File '{new_filename_str}' created.", new_file_rel_path_str
         except Exception as e:
             return False, f"Error creating file: {e}", None
@@ -180,6 +306,7 @@ class ProjectManager:
         new_folder_rel_path_str = new_folder_abs_path.relative_to(self.project_path).as_posix()
         try:
             new_folder_abs_path.mkdir(parents=True, exist_ok=True)
+            self._refresh_inventory(new_folder_rel_path_str)
             return True, f"Folder '{new_folder_name_str}' created.", new_folder_rel_path_str
         except Exception as e:
             return False, f"Error creating folder: {e}", None
@@ -203,6 +330,7 @@ class ProjectManager:
         try:
             shutil.move(str(source_abs_path), str(destination_abs_path))
             new_final_rel_path = destination_abs_path.relative_to(self.project_path).as_posix()
+            self._refresh_inventory(relative_item_path_str, new_final_rel_path)
             return True, "Item moved successfully.", new_final_rel_path
         except Exception as e:
             return False, f"Error moving item: {e}", None
@@ -225,6 +353,7 @@ class ProjectManager:
                 copied_infos.append({'original_abs_path': src_path_str, 'new_project_rel_path': new_rel_path})
             except Exception as e:
                 errors.append(f"Error copying '{src_path.name}': {e}")
+        self._refresh_inventory(*(info['new_project_rel_path'] for info in copied_infos))
         if errors:
             return False, "\n".join(errors), copied_infos
         return True, f"Copied {len(copied_infos)} items.", copied_infos
\ No newline at end of file
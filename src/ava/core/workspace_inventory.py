@@ -0,0 +1,481 @@
+# src/ava/core/workspace_inventory.py
+import fnmatch
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# The one ignore configuration every project walker shares.
+DEFAULT_IGNORE_DIRS = frozenset({
+    '.git', '.hg', '.svn', '__pycache__', '.venv', 'venv', 'node_modules', 'dist', 'build', 'rag_db',
+    '.idea', '.vscode', '.pytest_cache', '.mypy_cache', '.ruff_cache', '.tox', 'htmlcov', '.ava_cache',
+})
+DEFAULT_IGNORE_FILE_PATTERNS = ('*.pyc', '*.pyo', '*.pyd', '.DS_Store')
+PROJECT_IGNORE_FILE = '.avaignore'
+
+# Directory events arriving within this window are coalesced into one rescan.
+WATCH_DEBOUNCE_MS = 150
+
+
+@dataclass
+class InventoryEntry:
+    """A file known to the inventory. rel_path is POSIX-style and relative to the root."""
+    rel_path: str
+    size: int
+    mtime_ns: int
+
+    @property
+    def suffix(self) -> str:
+        return os.path.splitext(self.rel_path)[1].lower()
+
+
+class IgnoreRules:
+    """
+    A small .gitignore matcher: '#' comments, '!' negation, trailing '/' for
+    directory-only rules, leading or inner '/' to anchor a rule to its file's
+    directory, and the '*', '?', '[...]' and '**' wildcards. The last matching
+    rule wins, as in git.
+    """
+
+    def __init__(self):
+        self._rules: List[Tuple[re.Pattern, bool, bool]] = []  # (pattern, negated, dir_only)
+
+    def add(self, line: str, base: str = ""):
+        """Adds one ignore-file line; base is the POSIX path of the file's directory ('' for the root)."""
+        line = line.rstrip()
+        if not line or line.startswith('#'):
+            return
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        # A leading or middle slash anchors the rule to base; a trailing one only means 'directories'.
+        anchored = '/' in line
+        line = line.lstrip('/')
+        if not line:
+            return
+        body = self._translate(line)
+        prefix = re.escape(base + '/') if base else ''
+        if not anchored:
+            prefix += '(?:.*/)?'
+        self._rules.append((re.compile(f'^{prefix}{body}$'), negated, dir_only))
+
+    @staticmethod
+    def _translate(pattern: str) -> str:
+        out, i = [], 0
+        while i < len(pattern):
+            if pattern.startswith('**/', i):
+                out.append('(?:.*/)?')
+                i += 3
+            elif pattern.startswith('**', i):
+                out.append('.*')
+                i += 2
+            elif pattern[i] == '*':
+                out.append('[^/]*')
+                i += 1
+            elif pattern[i] == '?':
+                out.append('[^/]')
+                i += 1
+            elif pattern[i] == '[' and ']' in pattern[i + 1:]:
+                end = pattern.index(']', i + 1)
+                members = pattern[i + 1:end]
+                out.append('[' + ('^' + members[1:] if members.startswith('!') else members) + ']')
+                i = end + 1
+            else:
+                out.append(re.escape(pattern[i]))
+                i += 1
+        return ''.join(out)
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """True if ignored, False if explicitly re-included, None if no rule applies."""
+        result = None
+        for pattern, negated, dir_only in self._rules:
+            if dir_only and not is_dir:
+                continue
+            if pattern.match(rel_path):
+                result = not negated
+        return result
+
+    def __bool__(self) -> bool:
+        return bool(self._rules)
+
+
+class WorkspaceInventory:
+    """
+    The file list of one project root, built by a single pruned os.scandir
+    crawl that honours the shared ignore set, the project's .gitignore files
+    and an optional .avaignore. Components query it instead of walking the
+    tree themselves.
+
+    While watching, directory events from QFileSystemWatcher trigger a
+    debounced rescan of just the affected directories. In-app writes call
+    refresh() directly, and changed_since() re-stats tracked files, so
+    in-place edits that produce no directory event are still noticed.
+
+    The inventory of the active project is registered per root;
+    WorkspaceInventory.for_root() returns it, or a one-off crawl for any
+    other directory.
+    """
+
+    _registry: Dict[Path, "WorkspaceInventory"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, root: Path, ignore_dirs: Iterable[str] = DEFAULT_IGNORE_DIRS,
+                 ignore_file_patterns: Iterable[str] = DEFAULT_IGNORE_FILE_PATTERNS):
+        self.root = Path(root).resolve()
+        self.ignore_dirs = frozenset(ignore_dirs)
+        self.ignore_file_patterns = tuple(ignore_file_patterns)
+        self._files: Dict[str, InventoryEntry] = {}
+        self._dirs: Set[str] = set()
+        self._pruned_dirs: Set[str] = set()
+        self._ignore_rules: Dict[str, IgnoreRules] = {}
+        self._lock = threading.RLock()
+        self._listeners: List[Callable[[Set[str]], None]] = []
+        self._watcher = None
+        self._debounce_timer = None
+        self._pending_dirs: Set[str] = set()
+        self.scanned_at_ns = 0
+        self.scan()
+
+    # --- Registry ---
+
+    @classmethod
+    def open(cls, root: Path, watch: bool = True) -> "WorkspaceInventory":
+        """Crawls root, registers the inventory as the shared one for that root and starts watching it."""
+        inventory = cls(root)
+        with cls._registry_lock:
+            previous = cls._registry.get(inventory.root)
+            cls._registry[inventory.root] = inventory
+        if previous:
+            previous.close()
+        if watch:
+            inventory.start_watching()
+        return inventory
+
+    @classmethod
+    def for_root(cls, root: Path) -> "WorkspaceInventory":
+        """The registered inventory for root, or a fresh unwatched crawl of it."""
+        resolved = Path(root).resolve()
+        with cls._registry_lock:
+            inventory = cls._registry.get(resolved)
+        return inventory if inventory else cls(resolved)
+
+    def close(self):
+        """Stops watching and unregisters this inventory."""
+        self.stop_watching()
+        with self._registry_lock:
+            if self._registry.get(self.root) is self:
+                del self._registry[self.root]
+        self._listeners.clear()
+
+    # --- Crawling ---
+
+    def scan(self):
+        """Rebuilds the whole inventory with one pruned crawl."""
+        started = time.perf_counter()
+        with self._lock:
+            self._files.clear()
+            self._dirs = {''}
+            self._pruned_dirs.clear()
+            self._ignore_rules.clear()
+            if self.root.is_dir():
+                self._crawl('')
+            self.scanned_at_ns = time.time_ns()
+        print(f"[WorkspaceInventory] Indexed {len(self._files)} files in {len(self._dirs)} directories under "
+              f"{self.root.name} in {(time.perf_counter() - started) * 1000:.0f} ms.")
+
+    def _crawl(self, rel_dir: str, recursive: bool = True):
+        """Records the entries of rel_dir and, if recursive, everything below it."""
+        abs_dir = self.root / rel_dir if rel_dir else self.root
+        self._load_ignore_rules(rel_dir, abs_dir)
+        stack = [rel_dir]
+        while stack:
+            current = stack.pop()
+            current_abs = self.root / current if current else self.root
+            try:
+                iterator = os.scandir(current_abs)
+            except OSError:
+                continue
+            with iterator:
+                for entry in iterator:
+                    rel_path = f"{current}/{entry.name}" if current else entry.name
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    if self._is_ignored(rel_path, entry.name, is_dir):
+                        if is_dir:
+                            self._pruned_dirs.add(rel_path)
+                        continue
+                    if is_dir:
+                        self._dirs.add(rel_path)
+                        if recursive:
+                            self._load_ignore_rules(rel_path, Path(entry.path))
+                            stack.append(rel_path)
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    self._files[rel_path] = InventoryEntry(rel_path, stat.st_size, stat.st_mtime_ns)
+
+    def _load_ignore_rules(self, rel_dir: str, abs_dir: Path):
+        rules = IgnoreRules()
+        names = ('.gitignore', PROJECT_IGNORE_FILE) if not rel_dir else ('.gitignore',)
+        for name in names:
+            try:
+                lines = (abs_dir / name).read_text(encoding='utf-8', errors='ignore').splitlines()
+            except OSError:
+                continue
+            for line in lines:
+                rules.add(line, rel_dir)
+        if rules:
+            self._ignore_rules[rel_dir] = rules
+        else:
+            self._ignore_rules.pop(rel_dir, None)
+
+    def _is_ignored(self, rel_path: str, name: str, is_dir: bool) -> bool:
+        if is_dir and name in self.ignore_dirs:
+            return True
+        if not is_dir and any(fnmatch.fnmatch(name, pattern) for pattern in self.ignore_file_patterns):
+            return True
+        # Rules from deeper ignore files override shallower ones.
+        parts = rel_path.split('/')
+        for depth in range(len(parts) - 1, -1, -1):
+            rules = self._ignore_rules.get('/'.join(parts[:depth]))
+            if rules:
+                verdict = rules.match(rel_path, is_dir)
+                if verdict is not None:
+                    return verdict
+        return False
+
+    def _is_under_ignored_dir(self, rel_path: str) -> bool:
+        parts = rel_path.split('/')
+        return any('/'.join(parts[:depth]) in self._pruned_dirs or parts[depth - 1] in self.ignore_dirs
+                   for depth in range(1, len(parts)))
+
+    def refresh(self, rel_paths: Iterable[str]):
+        """
+        Brings the given paths (files or directories, relative to the root) up to
+        date without a full rescan. Called after in-app writes, renames and deletes.
+        """
+        changed: Set[str] = set()
+        with self._lock:
+            for rel_path in rel_paths:
+                rel_path = Path(rel_path).as_posix().strip('/')
+                if rel_path in ('', '.'):
+                    self.scan()
+                    changed.add('')
+                    continue
+                if self._is_under_ignored_dir(rel_path):
+                    continue
+                self._forget(rel_path)
+                abs_path = self.root / rel_path
+                parent = rel_path.rpartition('/')[0]
+                if abs_path.is_dir():
+                    if self._is_ignored(rel_path, abs_path.name, True):
+                        self._pruned_dirs.add(rel_path)
+                    else:
+                        self._ensure_parent_dirs(rel_path)
+                        self._dirs.add(rel_path)
+                        self._crawl(rel_path)
+                elif abs_path.is_file() and not self._is_ignored(rel_path, abs_path.name, False):
+                    self._ensure_parent_dirs(rel_path)
+                    stat = abs_path.stat()
+                    self._files[rel_path] = InventoryEntry(rel_path, stat.st_size, stat.st_mtime_ns)
+                changed.add(parent)
+        self._notify(changed)
+
+    def _ensure_parent_dirs(self, rel_path: str):
+        parts = rel_path.split('/')[:-1]
+        for depth in range(1, len(parts) + 1):
+            self._dirs.add('/'.join(parts[:depth]))
+
+    def _forget(self, rel_path: str):
+        """Drops rel_path and everything below it."""
+        prefix = rel_path + '/'
+        self._files.pop(rel_path, None)
+        for path in [p for p in self._files if p.startswith(prefix)]:
+            del self._files[path]
+        self._dirs -= {d for d in self._dirs if d == rel_path or d.startswith(prefix)}
+        self._pruned_dirs -= {d for d in self._pruned_dirs if d == rel_path or d.startswith(prefix)}
+
+    def _rescan_directory(self, rel_dir: str):
+        """Re-lists one directory after a watcher event; new subdirectories are crawled in full."""
+        abs_dir = self.root / rel_dir if rel_dir else self.root
+        if not abs_dir.is_dir():
+            self._forget(rel_dir)
+            return
+        known_subdirs = {d for d in self._dirs if d and d.rpartition('/')[0] == rel_dir}
+        for path in [p for p in self._files if p.rpartition('/')[0] == rel_dir]:
+            del self._files[path]
+        self._crawl(rel_dir, recursive=False)
+        for subdir in {d for d in self._dirs if d and d.rpartition('/')[0] == rel_dir}:
+            if not (self.root / subdir).is_dir():
+                self._forget(subdir)
+            elif subdir not in known_subdirs:
+                self._crawl(subdir)
+
+    # --- Queries ---
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def __contains__(self, rel_path: str) -> bool:
+        return rel_path in self._files
+
+    def files(self) -> List[str]:
+        """All tracked file paths, sorted."""
+        with self._lock:
+            return sorted(self._files)
+
+    def entries(self) -> List[InventoryEntry]:
+        with self._lock:
+            return [self._files[path] for path in sorted(self._files)]
+
+    def get(self, rel_path: str) -> Optional[InventoryEntry]:
+        return self._files.get(rel_path)
+
+    def directories(self) -> List[str]:
+        """All tracked directories except the root, sorted."""
+        with self._lock:
+            return sorted(d for d in self._dirs if d)
+
+    def pruned_directories(self) -> List[str]:
+        """Directories that exist but were skipped by the ignore rules (e.g. '.venv')."""
+        with self._lock:
+            return sorted(self._pruned_dirs)
+
+    def by_extension(self, *extensions: str) -> List[str]:
+        """Files whose suffix is one of extensions (case-insensitive, e.g. '.py')."""
+        wanted = {ext.lower() if ext.startswith('.') else f'.{ext.lower()}' for ext in extensions}
+        with self._lock:
+            return sorted(path for path, entry in self._files.items() if entry.suffix in wanted)
+
+    def by_prefix(self, prefix: str) -> List[str]:
+        """Files whose relative path starts with prefix ('src/' for a directory, 'src/ma' for a partial name)."""
+        prefix = prefix[2:] if prefix.startswith('./') else prefix
+        with self._lock:
+            return sorted(path for path in self._files if path.startswith(prefix))
+
+    def children(self, rel_dir: str = '') -> Tuple[List[str], List[str]]:
+        """The (directories, files) directly inside rel_dir, each sorted by name."""
+        rel_dir = rel_dir.strip('/')
+        with self._lock:
+            dirs = sorted((d for d in self._dirs if d and d.rpartition('/')[0] == rel_dir),
+                          key=lambda d: d.rpartition('/')[2].lower())
+            files = sorted((f for f in self._files if f.rpartition('/')[0] == rel_dir),
+                           key=lambda f: f.rpartition('/')[2].lower())
+        return dirs, files
+
+    def changed_since(self, since_ns: int) -> List[str]:
+        """
+        Files added or modified after since_ns (a time.time_ns() value). Tracked
+        files are re-stat'ed first, so edits that raised no directory event count too.
+        """
+        changed = []
+        with self._lock:
+            for path, entry in list(self._files.items()):
+                try:
+                    stat = (self.root / path).stat()
+                except OSError:
+                    del self._files[path]
+                    continue
+                entry.size, entry.mtime_ns = stat.st_size, stat.st_mtime_ns
+                if entry.mtime_ns > since_ns:
+                    changed.append(path)
+        return sorted(changed)
+
+    def absolute(self, rel_path: str) -> Path:
+        return self.root / rel_path
+
+    # --- Watching ---
+
+    def add_listener(self, callback: Callable[[Set[str]], None]):
+        """callback receives the set of changed directories (relative, '' for the root) after each update."""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[Set[str]], None]):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, changed_dirs: Set[str]):
+        if not changed_dirs:
+            return
+        for callback in list(self._listeners):
+            try:
+                callback(changed_dirs)
+            except Exception as e:
+                print(f"[WorkspaceInventory] Listener failed: {e}")
+
+    @property
+    def is_watching(self) -> bool:
+        return self._watcher is not None
+
+    def start_watching(self) -> bool:
+        """Watches every tracked directory. Returns False when no Qt application is available."""
+        if self._watcher is not None:
+            return True
+        try:
+            from PySide6.QtCore import QCoreApplication, QFileSystemWatcher, QTimer
+        except ImportError:
+            return False
+        if QCoreApplication.instance() is None:
+            return False
+        self._watcher = QFileSystemWatcher()
+        self._watcher.directoryChanged.connect(self._on_directory_changed)
+        self._debounce_timer = QTimer()
+        self._debounce_timer.setSingleShot(True)
+        self._debounce_timer.setInterval(WATCH_DEBOUNCE_MS)
+        self._debounce_timer.timeout.connect(self._apply_pending_changes)
+        self._sync_watched_directories()
+        return True
+
+    def stop_watching(self):
+        if self._debounce_timer is not None:
+            self._debounce_timer.stop()
+            self._debounce_timer = None
+        if self._watcher is not None:
+            watched = self._watcher.directories()
+            if watched:
+                self._watcher.removePaths(watched)
+            self._watcher = None
+        self._pending_dirs.clear()
+
+    def _sync_watched_directories(self):
+        if self._watcher is None:
+            return
+        wanted = {str(self.root / d) if d else str(self.root) for d in self._dirs}
+        current = set(self._watcher.directories())
+        stale = current - wanted
+        if stale:
+            self._watcher.removePaths(list(stale))
+        missing = wanted - current
+        if missing:
+            self._watcher.addPaths(sorted(missing))
+
+    def _on_directory_changed(self, abs_dir: str):
+        try:
+            rel_dir = Path(abs_dir).resolve().relative_to(self.root).as_posix()
+        except ValueError:
+            return
+        self._pending_dirs.add('' if rel_dir == '.' else rel_dir)
+        if self._debounce_timer is not None:
+            self._debounce_timer.start()
+
+    def _apply_pending_changes(self):
+        pending, self._pending_dirs = self._pending_dirs, set()
+        with self._lock:
+            # Parents first. A parent's rescan does not descend into subdirectories it already
+            # knows, so each pending directory is re-listed itself.
+            for rel_dir in sorted(pending, key=len):
+                self._rescan_directory(rel_dir)
+            self._sync_watched_directories()
+        self._notify(pending)
@@ -6,7 +6,7 @@ from PySide6.QtWidgets import (
     QTreeWidget, QTreeWidgetItem, QMenu, QInputDialog, QMessageBox, QAbstractItemView, QApplication,
     QTreeWidgetItemIterator, QStyle, QWidget, QVBoxLayout, QHBoxLayout
 )
-from PySide6.QtCore import Qt, Signal, QPoint, QMimeData, QByteArray, QUrl, QObject
+from PySide6.QtCore import Qt, Signal, QPoint, QMimeData, QByteArray, QUrl, QObject, QTimer
 from PySide6.QtGui import QFont, QAction, QDragEnterEvent, QDropEvent, QDrag, QMouseEvent, QPixmap, \
     QDragMoveEvent
 import qtawesome as qta
@@ -14,6 +14,7 @@ import qtawesome as qta
 from .components import Colors, ModernButton
 from src.ava.core.event_bus import EventBus
 from src.ava.core.project_manager import ProjectManager
+from src.ava.core.workspace_inventory import WorkspaceInventory
 
 # --- Custom MIME Type for Internal D&D ---
 INTERNAL_MIME_TYPE_PROJECT_ITEMS = "application/x-projectitems"
@@ -185,13 +186,16 @@ class FileTreeManager(QObject):
         self.project_manager = project_manager
         self.event_bus = event_bus
         self.on_file_selected_callback: Optional[Callable[[Path], None]] = None
-        self._ignore_dirs: Set[str] = {
-            '__pycache__', 'node_modules', 'rag_db',
-            '.pytest_cache', '.mypy_cache', 'htmlcov',
-        }
+        # Ignored by the workspace inventory, but still shown (empty) so users can see they exist.
         self._collapse_dirs: Set[str] = {
             '.venv', 'venv', '.git', '.tox', 'build', 'dist'
         }
+        self._watched_inventory: Optional[WorkspaceInventory] = None
+        # Coalesces bursts of inventory updates (e.g. a multi-file generation) into one tree refresh.
+        self._inventory_refresh_timer = QTimer(self)
+        self._inventory_refresh_timer.setSingleShot(True)
+        self._inventory_refresh_timer.setInterval(250)
+        self._inventory_refresh_timer.timeout.connect(self.refresh_tree_from_disk)
 
         # Main widget and layout for this manager
         self.container_widget = QWidget(tree_widget_parent)
@@ -270,6 +274,7 @@ class FileTreeManager(QObject):
         self.on_file_selected_callback = callback
 
     def clear_tree(self):
+        self._inventory_refresh_timer.stop()
         self.tree_widget.clear()
         print("[FileTreeManager] Tree cleared")
 
@@ -305,6 +310,7 @@ class FileTreeManager(QObject):
             root_item = self._create_project_root_item(project_path)
             self.tree_widget.addTopLevelItem(root_item)
             self._populate_from_disk_enhanced(root_item, project_path)
+            self._watch_inventory(self.project_manager.inventory)
             self._restore_expanded_items(current_expanded_items)
             self._restore_selected_items(current_selected_items)
 
@@ -322,6 +328,19 @@ class FileTreeManager(QObject):
         else:
             self.log("warning", "Cannot refresh tree, no active project.")
 
+    def _watch_inventory(self, inventory: Optional[WorkspaceInventory]):
+        """Refreshes the tree whenever the active project's inventory reports changes on disk."""
+        if inventory is self._watched_inventory:
+            return
+        if self._watched_inventory:
+            self._watched_inventory.remove_listener(self._on_inventory_changed)
+        self._watched_inventory = inventory
+        if inventory:
+            inventory.add_listener(self._on_inventory_changed)
+
+    def _on_inventory_changed(self, changed_dirs: Set[str]):
+        self._inventory_refresh_timer.start()
+
     def _get_expanded_items_paths(self) -> Set[str]:
         expanded_paths = set()
         iterator = QTreeWidgetItemIterator(self.tree_widget)
@@ -382,22 +401,37 @@ class FileTreeManager(QObject):
 
     def _populate_from_disk_enhanced(self, parent_item: QTreeWidgetItem, directory_path: Path):
         try:
-            entries = sorted(list(directory_path.iterdir()), key=lambda p: (p.is_file(), p.name.lower()))
-            for entry in entries:
-                if entry.name in self._ignore_dirs: continue
-                if entry.name.startswith('.') and entry.name not in {'.env', '.gitignore', '.git'}: continue
-                if self._find_child_item_by_path(parent_item, entry.resolve()): continue
-
-                if entry.is_dir():
-                    dir_item = self._create_directory_item(entry.name, entry.resolve())
-                    parent_item.addChild(dir_item)
-                    self._populate_from_disk_enhanced(dir_item, entry.resolve())
-                else:
-                    file_item = self._create_file_item(entry.name, entry.resolve())
-                    parent_item.addChild(file_item)
+            project_path = self.project_manager.active_project_path
+            if project_path and directory_path.resolve() == project_path.resolve():
+                inventory = self.project_manager.inventory or WorkspaceInventory.for_root(directory_path)
+            else:
+                inventory = WorkspaceInventory.for_root(directory_path)
+            collapsed = [d for d in inventory.pruned_directories() if d.rpartition('/')[2] in self._collapse_dirs]
+            self._populate_from_inventory(parent_item, inventory, '', collapsed)
         except Exception as e:
             print(f"[FileTreeManager] Error populating from {directory_path}: {e}")
 
+    def _populate_from_inventory(self, parent_item: QTreeWidgetItem, inventory: WorkspaceInventory, rel_dir: str,
+                                 collapsed: List[str]):
+        sub_dirs, files = inventory.children(rel_dir)
+        sub_dirs += [d for d in collapsed if d.rpartition('/')[0] == rel_dir]
+        sub_dirs.sort(key=lambda d: d.rpartition('/')[2].lower())
+        for rel_path in sub_dirs:
+            name = rel_path.rpartition('/')[2]
+            if name.startswith('.') and name not in self._collapse_dirs: continue
+            abs_path = inventory.absolute(rel_path).resolve()
+            if self._find_child_item_by_path(parent_item, abs_path): continue
+            dir_item = self._create_directory_item(name, abs_path)
+            parent_item.addChild(dir_item)
+            if rel_path not in collapsed:
+                self._populate_from_inventory(dir_item, inventory, rel_path, collapsed)
+        for rel_path in files:
+            name = rel_path.rpartition('/')[2]
+            if name.startswith('.') and name not in {'.env', '.gitignore'}: continue
+            abs_path = inventory.absolute(rel_path).resolve()
+            if self._find_child_item_by_path(parent_item, abs_path): continue
+            parent_item.addChild(self._create_file_item(name, abs_path))
+
     def _create_directory_item(self, dir_name: str, dir_path: Path) -> QTreeWidgetItem:
         dir_item = QTreeWidgetItem([f"{dir_name}"])
         dir_item.setData(0, Qt.ItemDataRole.UserRole, str(dir_path.resolve()))
@@ -5,6 +5,7 @@ from PySide6.QtWidgets import (QDialog, QVBoxLayout, QLineEdit, QListWidget,
 from PySide6.QtCore import Qt, Signal, QTimer
 from PySide6.QtGui import QKeySequence, QShortcut
 
+from src.ava.core.workspace_inventory import WorkspaceInventory
 from .components import Colors, Typography
 
 
@@ -121,6 +122,8 @@ class QuickFileFinder(QDialog):
             self.status_label.setText("No project loaded")
             return
 
+        # The shared inventory is kept current by its watcher, so re-reading it on every open is cheap.
+        self._scan_project_files()
         self.show()
         self.raise_()
         self.activateWindow()
@@ -134,20 +137,9 @@ class QuickFileFinder(QDialog):
             return
 
         self.file_paths = []
-        exclude_patterns = {
-            '.git', '__pycache__', '.pytest_cache', 'node_modules',
-            '.venv', 'venv', '.env', 'dist', 'build', '.idea',
-            '.vscode', '*.pyc', '*.pyo', '*.pyd', '.DS_Store', 'rag_db'
-        }
-
-        def should_exclude(path: Path) -> bool:
-            return any(part in exclude_patterns for part in path.parts)
-
         try:
-            for file_path in self.project_root.rglob('*'):
-                if file_path.is_file() and not should_exclude(file_path):
-                    relative_path = file_path.relative_to(self.project_root)
-                    self.file_paths.append(str(relative_path))
+            inventory = WorkspaceInventory.for_root(self.project_root)
+            self.file_paths = [str(Path(relative_path)) for relative_path in inventory.files()]
         except Exception as e:
             print(f"[QuickFileFinder] Error scanning project: {e}")
 
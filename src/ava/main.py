@@ -1,3 +1,4 @@
+import multiprocessing
 import sys
 from pathlib import Path
 
@@ -98,6 +99,9 @@ async def main_async_logic(app_instance, root_path: Path):
 
 
 if __name__ == "__main__":
+    # Must run first: in a frozen build, the spawned workers of the ingestion, indexing and
+    # summarizing pools re-launch this executable and would otherwise start the GUI again.
+    multiprocessing.freeze_support()
     setup_exception_hook()
     app = QApplication(sys.argv)
 
@@ -0,0 +1,336 @@
+# rag_embeddings.py
+# Embedding backends for the RAG server. Kept free of FastAPI imports so that
+# worker processes can load a backend without pulling in the web stack.
+
+import importlib.util
+import os
+import time
+import logging
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+import numpy as np
+
+rag_logger = logging.getLogger("RAGServer")
+
+DEFAULT_MAX_SEQ_LENGTH = 256  # all-MiniLM-L6-v2 truncates at 256 word-pieces
+ONNX_CACHE_DIR = Path(os.getenv("RAG_ONNX_CACHE_DIR", Path(__file__).parent / "onnx_models"))
+# Local safetensors snapshots; loading from here memory-maps the weights and skips hub resolution.
+MODEL_SNAPSHOT_DIR = Path(os.getenv("RAG_MODEL_SNAPSHOT_DIR", Path(__file__).parent / "model_snapshots"))
+
+# Fixed sentences for the ONNX drift self-check and the benchmark.
+SELF_CHECK_SENTENCES = [
+    "def load_config(path: str) -> dict:\n    with open(path) as f:\n        return json.load(f)",
+    "class PlayerController:\n    def update(self, dt):\n        self.position += self.velocity * dt",
+    "How do I read a CSV file and group rows by a column?",
+    "The event bus emits log_message_received with a source, level and message.",
+    "import asyncio\n\nasync def main():\n    await asyncio.gather(*tasks)",
+]
+
+
+class EmbeddingBackend:
+    """
+    Common interface for embedding backends. encode() mirrors
+    SentenceTransformer.encode: a single string yields a 1-D vector, a list
+    yields a 2-D array of L2-normalized float32 embeddings.
+    """
+    name = "base"
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               show_progress_bar: bool = False) -> np.ndarray:
+        single = isinstance(sentences, str)
+        batch = [sentences] if single else list(sentences)
+        if not batch:
+            return np.zeros((0, 0), dtype=np.float32)
+        embeddings = self._encode_batch(batch, batch_size)
+        return embeddings[0] if single else embeddings
+
+    def _encode_batch(self, sentences: List[str], batch_size: int) -> np.ndarray:
+        raise NotImplementedError
+
+
+def snapshot_dir_for(model_name: str) -> Path:
+    return MODEL_SNAPSHOT_DIR / model_name.replace("/", "_")
+
+
+class TorchEmbeddingBackend(EmbeddingBackend):
+    """
+    The reference backend: SentenceTransformer running fp32 PyTorch. The first
+    load saves a local safetensors snapshot; later loads (e.g. after an idle
+    unload) read the memory-mapped snapshot instead of resolving the hub cache.
+    """
+    name = "torch"
+
+    def __init__(self, model_name: str, threads: int = 0, device: Optional[str] = None,
+                 use_snapshot: bool = True):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if threads > 0:
+            torch.set_num_threads(threads)
+
+        snapshot_dir = snapshot_dir_for(model_name)
+        if use_snapshot and (snapshot_dir / "modules.json").exists():
+            self.model = SentenceTransformer(str(snapshot_dir), device=device)
+            return
+
+        self.model = SentenceTransformer(model_name, device=device)
+        if use_snapshot:
+            try:
+                self.model.save(str(snapshot_dir), safe_serialization=True)
+                rag_logger.info(f"Saved safetensors snapshot of '{model_name}' to '{snapshot_dir}' for fast reloads.")
+            except Exception as e:
+                rag_logger.warning(f"Could not save model snapshot to '{snapshot_dir}': {e}")
+
+    def _encode_batch(self, sentences: List[str], batch_size: int) -> np.ndarray:
+        return self.model.encode(sentences, batch_size=batch_size, show_progress_bar=False,
+                                 convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+
+
+class OnnxEmbeddingBackend(EmbeddingBackend):
+    """
+    int8-quantized ONNX Runtime backend for CPU-only hosts. Runs the same
+    transformer as the torch backend, exported and quantized locally, with
+    the model's mean pooling and normalization done in NumPy.
+    """
+    name = "onnx"
+
+    def __init__(self, model_name: str, threads: int = 0, max_seq_length: int = DEFAULT_MAX_SEQ_LENGTH,
+                 model_dir: Optional[Path] = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_dir = model_dir or export_onnx_model(model_name)
+        self.max_seq_length = max_seq_length
+        self.tokenizer = AutoTokenizer.from_pretrained(str(self.model_dir))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(self.model_dir / "model_int8.onnx"), sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self._input_names = {inp.name for inp in self.session.get_inputs()}
+
+    def _encode_batch(self, sentences: List[str], batch_size: int) -> np.ndarray:
+        outputs = []
+        for start in range(0, len(sentences), batch_size):
+            encoded = self.tokenizer(sentences[start:start + batch_size], padding=True, truncation=True,
+                                     max_length=self.max_seq_length, return_tensors="np")
+            feed = {name: encoded[name].astype(np.int64) for name in self._input_names if name in encoded}
+            if "token_type_ids" in self._input_names and "token_type_ids" not in feed:
+                feed["token_type_ids"] = np.zeros_like(feed["input_ids"])
+            token_embeddings = self.session.run(None, feed)[0]
+
+            mask = encoded["attention_mask"].astype(np.float32)[..., None]
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            outputs.append(pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None))
+        return np.vstack(outputs).astype(np.float32)
+
+
+def export_onnx_model(model_name: str, cache_dir: Path = ONNX_CACHE_DIR) -> Path:
+    """
+    Exports the model's transformer to ONNX and quantizes it to int8, once.
+    Returns the directory holding model_int8.onnx and the tokenizer files.
+    """
+    export_dir = cache_dir / model_name.replace("/", "_")
+    int8_path = export_dir / "model_int8.onnx"
+    if int8_path.exists():
+        return export_dir
+
+    if importlib.util.find_spec("onnx") is None:
+        # torch.onnx.export and quantize_dynamic both need it; onnxruntime alone is not enough.
+        raise ImportError("The 'onnx' package is required to export the ONNX model (pip install onnx).")
+    import torch
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    from sentence_transformers import SentenceTransformer
+
+    rag_logger.info(f"Exporting '{model_name}' to ONNX and quantizing to int8 in '{export_dir}' (one-time)...")
+    export_dir.mkdir(parents=True, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    st_model.tokenizer.save_pretrained(str(export_dir))
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids)[0]
+
+    dummy = st_model.tokenizer(["export sample"], return_tensors="pt", padding=True)
+    token_type_ids = dummy.get("token_type_ids", torch.zeros_like(dummy["input_ids"]))
+    fp32_path = export_dir / "model_fp32.onnx"
+    dynamic_axes = {"input_ids": {0: "batch", 1: "sequence"}, "attention_mask": {0: "batch", 1: "sequence"},
+                    "token_type_ids": {0: "batch", 1: "sequence"}, "last_hidden_state": {0: "batch", 1: "sequence"}}
+    with torch.no_grad():
+        torch.onnx.export(_LastHiddenState(transformer), (dummy["input_ids"], dummy["attention_mask"], token_type_ids),
+                          str(fp32_path), input_names=["input_ids", "attention_mask", "token_type_ids"],
+                          output_names=["last_hidden_state"], dynamic_axes=dynamic_axes, opset_version=14)
+    quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+    fp32_path.unlink(missing_ok=True)
+    rag_logger.info(f"ONNX int8 model written to '{int8_path}'.")
+    return export_dir
+
+
+def measure_drift(candidate: EmbeddingBackend, reference: EmbeddingBackend,
+                  sentences: List[str] = SELF_CHECK_SENTENCES) -> float:
+    """Returns the worst-case cosine distance between two backends over the sample sentences."""
+    a = candidate.encode(sentences)
+    b = reference.encode(sentences)
+    cosines = np.sum(a * b, axis=1)  # Both sides are L2-normalized
+    return float(1.0 - cosines.min())
+
+
+def create_embedding_backend(kind: str, model_name: str, threads: int = 0, self_check: bool = True,
+                             drift_tolerance: float = 0.02) -> EmbeddingBackend:
+    """
+    Builds the requested backend ('torch' or 'onnx'). The ONNX backend is
+    checked against the torch reference and rejected, with a fallback to
+    torch, if its cosine drift exceeds drift_tolerance or it cannot load.
+    """
+    if kind == "torch":
+        return TorchEmbeddingBackend(model_name, threads=threads)
+    if kind != "onnx":
+        raise ValueError(f"Unknown embedding backend '{kind}'. Use 'torch' or 'onnx'.")
+
+    try:
+        backend = OnnxEmbeddingBackend(model_name, threads=threads)
+    except Exception as e:
+        rag_logger.error(f"ONNX embedding backend unavailable ({e}). Falling back to torch.", exc_info=True)
+        return TorchEmbeddingBackend(model_name, threads=threads)
+
+    if not self_check:
+        return backend
+
+    reference = TorchEmbeddingBackend(model_name, threads=threads)
+    drift = measure_drift(backend, reference)
+    if drift > drift_tolerance:
+        rag_logger.error(f"ONNX backend cosine drift {drift:.4f} exceeds tolerance {drift_tolerance}. "
+                         f"Falling back to torch.")
+        return reference
+    rag_logger.info(f"ONNX backend self-check passed (max cosine drift {drift:.4f} <= {drift_tolerance}).")
+    return backend
+
+
+def benchmark_backends(model_name: str, kinds: List[str], n_sentences: int = 2000, batch_size: int = 32,
+                       threads: int = 0) -> Dict[str, Any]:
+    """Encodes the same synthetic corpus with each backend and reports sentences per second."""
+    corpus = [SELF_CHECK_SENTENCES[i % len(SELF_CHECK_SENTENCES)] + f" #{i}" for i in range(n_sentences)]
+    report: Dict[str, Any] = {}
+    for kind in kinds:
+        try:
+            backend = create_embedding_backend(kind, model_name, threads=threads, self_check=False)
+            backend.encode(corpus[:batch_size], batch_size=batch_size)  # Warm-up
+            started = time.perf_counter()
+            backend.encode(corpus, batch_size=batch_size)
+            elapsed = time.perf_counter() - started
+            report[kind] = {"backend": backend.name, "sentences": n_sentences, "seconds": round(elapsed, 3),
+                            "sentences_per_second": round(n_sentences / elapsed, 1)}
+        except Exception as e:
+            report[kind] = {"error": str(e)}
+    return report
+
+
+# --- Multi-process bulk encoding ---
+_worker_backend: Optional[EmbeddingBackend] = None
+
+
+def prepare_worker_model(kind: str, model_name: str) -> Tuple[str, Optional[str]]:
+    """
+    Runs in the parent before a pool starts. It writes the safetensors
+    snapshot or the ONNX export once, so workers only ever read it. Returns
+    the (kind, model_dir) the workers should load. An ONNX export that
+    fails falls back to torch, as create_embedding_backend does.
+    """
+    if kind == "onnx":
+        try:
+            return "onnx", str(export_onnx_model(model_name))
+        except Exception as e:
+            rag_logger.error(f"ONNX export unavailable for workers ({e}). Falling back to torch.")
+            kind = "torch"
+    if kind != "torch":
+        raise ValueError(f"Unknown embedding backend '{kind}'. Use 'torch' or 'onnx'.")
+    snapshot_dir = snapshot_dir_for(model_name)
+    if not (snapshot_dir / "modules.json").exists():
+        TorchEmbeddingBackend(model_name)  # Saves the snapshot
+    return "torch", str(snapshot_dir) if (snapshot_dir / "modules.json").exists() else None
+
+
+def _init_encode_worker(kind: str, model_name: str, model_dir: Optional[str], threads: int):
+    """Process-pool initializer: each worker loads its own model copy once, read-only from model_dir."""
+    global _worker_backend
+    if kind == "onnx":
+        _worker_backend = OnnxEmbeddingBackend(model_name, threads=threads, model_dir=Path(model_dir))
+    else:
+        # use_snapshot=False: never write the snapshot from a worker.
+        _worker_backend = TorchEmbeddingBackend(model_dir or model_name, threads=threads, use_snapshot=False)
+
+
+def _encode_shard(texts: List[str], batch_size: int) -> np.ndarray:
+    return _worker_backend.encode(texts, batch_size=batch_size)
+
+
+def plan_worker_count(requested: int = 0, memory_limit_mb: int = 0, per_worker_mb: int = 600) -> int:
+    """
+    Picks a worker count: the requested number if given, otherwise one per
+    core, capped so that workers * per_worker_mb fits the memory limit. With
+    no explicit limit, 75% of currently available memory is used when known.
+    """
+    cores = os.cpu_count() or 1
+    workers = requested if requested > 0 else cores
+    if memory_limit_mb <= 0:
+        try:
+            import psutil
+            memory_limit_mb = int(psutil.virtual_memory().available / (1024 * 1024) * 0.75)
+        except ImportError:
+            memory_limit_mb = 0
+    if memory_limit_mb > 0:
+        workers = min(workers, max(1, memory_limit_mb // per_worker_mb))
+    return max(1, workers)
+
+
+class ParallelEncoder:
+    """
+    Encodes large corpora on a pool of worker processes, each with its own
+    model. Texts are split into shards; results are yielded in input order so
+    callers can commit them alongside their ids and metadata.
+    """
+
+    def __init__(self, kind: str, model_name: str, workers: int, batch_size: int = 64):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.workers = workers
+        self.batch_size = batch_size
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+        kind, model_dir = prepare_worker_model(kind, model_name)
+        # 'spawn' everywhere: forking a process that already holds torch/ONNX thread pools is unsafe.
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_encode_worker,
+                                             initargs=(kind, model_name, model_dir, threads_per_worker))
+        rag_logger.info(f"Started {workers} encoding worker(s) ({threads_per_worker} thread(s) each, backend: {kind}).")
+
+    def encode_in_order(self, texts: List[str], shard_size: int = 512):
+        """
+        Yields (start_index, embeddings) for consecutive shards of texts, in
+        order. At most two shards per worker are in flight, bounding memory.
+        """
+        from collections import deque
+
+        pending = deque()
+        max_in_flight = self.workers * 2
+        for start in range(0, len(texts), shard_size):
+            pending.append((start, self._executor.submit(_encode_shard, texts[start:start + shard_size],
+                                                         self.batch_size)))
+            if len(pending) >= max_in_flight:
+                shard_start, future = pending.popleft()
+                yield shard_start, future.result()
+        while pending:
+            shard_start, future = pending.popleft()
+            yield shard_start, future.result()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,541 @@
+# rag_flat_index.py
+# A lightweight alternative to ChromaDB for small and medium knowledge bases:
+# float16 embeddings in a memory-mapped array, records in an append-only JSONL
+# log, and exact brute-force cosine top-k with NumPy. FlatVectorCollection
+# implements the subset of the Chroma collection API the RAG server uses, so
+# the endpoints do not care which backend a collection lives in.
+
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+rag_logger = logging.getLogger("RAGServer")
+
+VECTOR_BACKENDS = ("chroma", "flat")
+FLAT_INDEX_DIR_NAME = "flat_index"  # Created inside the collection's DB directory
+BACKEND_CHOICE_FILE = "vector_backend.json"  # Per-DB-directory record of which backend each collection uses
+FLAT_FORMAT_VERSION = 1
+INITIAL_CAPACITY = 1024  # Rows pre-allocated in a new vector file; doubles as the collection grows
+QUERY_BLOCK_ROWS = 65536  # Rows converted to float32 at a time during a search
+
+
+def read_backend_choice(db_path: Path, collection_name: str) -> Optional[str]:
+    """Returns the backend recorded for a collection in db_path, or None if none was recorded."""
+    choice_file = Path(db_path) / BACKEND_CHOICE_FILE
+    if not choice_file.exists():
+        return None
+    try:
+        return json.loads(choice_file.read_text(encoding="utf-8")).get(collection_name)
+    except (OSError, json.JSONDecodeError) as e:
+        rag_logger.warning(f"Could not read {choice_file}: {e}")
+        return None
+
+
+def write_backend_choice(db_path: Path, collection_name: str, backend: str):
+    choice_file = Path(db_path) / BACKEND_CHOICE_FILE
+    choices = {}
+    if choice_file.exists():
+        try:
+            choices = json.loads(choice_file.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            choices = {}
+    choices[collection_name] = backend
+    _atomic_write_text(choice_file, json.dumps(choices, indent=2))
+
+
+def _atomic_write_text(path: Path, text: str):
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.")
+    with os.fdopen(fd, "w", encoding="utf-8") as handle:
+        handle.write(text)
+    os.replace(tmp_path, path)
+
+
+def _matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluates a Chroma-style metadata filter ($and/$or, $eq/$ne/$in/$nin/$gt/$gte/$lt/$lte)."""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches_where(metadata, clause) for clause in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(_matches_where(metadata, clause) for clause in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$eq" and value != operand:
+                return False
+            if op == "$ne" and value == operand:
+                return False
+            if op == "$in" and value not in operand:
+                return False
+            if op == "$nin" and value in operand:
+                return False
+            if op in ("$gt", "$gte", "$lt", "$lte"):
+                if value is None:
+                    return False
+                if op == "$gt" and not value > operand:
+                    return False
+                if op == "$gte" and not value >= operand:
+                    return False
+                if op == "$lt" and not value < operand:
+                    return False
+                if op == "$lte" and not value <= operand:
+                    return False
+    return True
+
+
+class FlatVectorCollection:
+    """
+    Exact-search vector collection stored in a directory:
+
+        header.json    - dimension, used rows, collection id
+        vectors.f16    - memory-mapped float16 matrix (capacity x dim) of L2-normalized embeddings
+        records.jsonl  - append-only log of puts and deletes; replayed on open
+
+    Deleted or replaced rows stay in the vector file until compaction, which
+    runs when dead rows outnumber live ones. A boolean mask of live rows is
+    kept up to date on every put and delete, so a search never walks the
+    records in Python; a where filter is only evaluated on the best-scoring
+    candidates. Distances are squared L2 between
+    normalized vectors (2 - 2 * cosine), matching Chroma's default space.
+    """
+
+    def __init__(self, directory: Path, name: str):
+        self.directory = Path(directory)
+        self.name = name
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._vectors: Optional[np.memmap] = None
+        self._dim = 0
+        self._rows = 0
+        self._row_of_id: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []  # row -> id, None for dead rows
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict[str, Any]]] = []
+        self._live = np.zeros(0, dtype=bool)  # row -> live; may be longer than _rows
+        self.id = None
+        self._load()
+
+    # --- Persistence ---
+    @property
+    def _header_path(self) -> Path:
+        return self.directory / "header.json"
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.directory / "vectors.f16"
+
+    @property
+    def _records_path(self) -> Path:
+        return self.directory / "records.jsonl"
+
+    def _load(self):
+        if not self._header_path.exists():
+            self.id = str(uuid.uuid4())
+            self._write_header()
+            return
+
+        header = json.loads(self._header_path.read_text(encoding="utf-8"))
+        if header.get("format_version") != FLAT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported flat index format in {self.directory}: {header.get('format_version')}")
+        self.id = header["id"]
+        self._dim = header.get("dim", 0)
+        self._rows = header.get("rows", 0)
+        self._ids = [None] * self._rows
+        self._documents = [None] * self._rows
+        self._metadatas = [None] * self._rows
+        self._live = np.zeros(self._rows, dtype=bool)
+
+        if self._records_path.exists():
+            self._replay_records()
+
+        if self._dim and self._vectors_path.exists():
+            capacity = self._vectors_path.stat().st_size // (self._dim * 2)
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float16, mode="r+", shape=(capacity, self._dim))
+
+    def _replay_records(self):
+        """
+        Applies the record log. Records past the last committed header (a put
+        whose vector row was never committed, or a line cut short by a crash)
+        and everything after them are dropped, and the log is truncated there,
+        so new puts never share a row number with a stale record.
+        """
+        valid_end = 0
+        dangling = False
+        with open(self._records_path, "rb") as handle:
+            for line in handle:
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        dangling = True
+                        break
+                    row = record.get("row")
+                    if row is not None and row >= self._rows:
+                        dangling = True
+                        break
+                    self._apply_record(record)
+                valid_end += len(line)
+        if dangling:
+            with open(self._records_path, "r+b") as handle:
+                handle.truncate(valid_end)
+            rag_logger.warning(f"Flat index '{self.name}': dropped uncommitted records after byte {valid_end} "
+                               f"of {self._records_path.name}.")
+
+    def _write_header(self):
+        _atomic_write_text(self._header_path, json.dumps({
+            "format_version": FLAT_FORMAT_VERSION,
+            "id": self.id,
+            "name": self.name,
+            "dim": self._dim,
+            "rows": self._rows,
+        }))
+
+    def _apply_record(self, record: Dict[str, Any]):
+        doc_id = record["id"]
+        previous = self._row_of_id.pop(doc_id, None)
+        if previous is not None:
+            self._ids[previous] = None
+            self._documents[previous] = None
+            self._metadatas[previous] = None
+            self._live[previous] = False
+        if record["op"] == "put":
+            row = record["row"]
+            self._row_of_id[doc_id] = row
+            self._live[row] = True
+            self._ids[row] = doc_id
+            self._documents[row] = record.get("document")
+            self._metadatas[row] = record.get("metadata") or {}
+
+    def _ensure_capacity(self, rows_needed: int, dim: int):
+        if self._dim and dim != self._dim:
+            raise ValueError(f"Embedding dimension {dim} does not match collection dimension {self._dim}.")
+        self._dim = dim
+        capacity = self._vectors.shape[0] if self._vectors is not None else 0
+        if rows_needed <= capacity:
+            return
+        new_capacity = max(INITIAL_CAPACITY, capacity)
+        while new_capacity < rows_needed:
+            new_capacity *= 2
+        if self._vectors is not None:
+            self._vectors.flush()
+            del self._vectors
+        # Growing the file in place keeps existing rows; the new tail reads as zeros.
+        with open(self._vectors_path, "ab") as handle:
+            handle.truncate(new_capacity * dim * 2)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float16, mode="r+", shape=(new_capacity, dim))
+
+    # --- Chroma-compatible API ---
+    def count(self) -> int:
+        return len(self._row_of_id)
+
+    def add(self, ids: List[str], embeddings: List[List[float]], documents: Optional[List[str]] = None,
+            metadatas: Optional[List[Dict[str, Any]]] = None):
+        """Adds new records. Like Chroma, IDs that already exist are skipped rather than replaced."""
+        with self._lock:
+            keep = [i for i, doc_id in enumerate(ids) if doc_id not in self._row_of_id]
+            if len(keep) < len(ids):
+                rag_logger.warning(f"Flat index '{self.name}': skipped {len(ids) - len(keep)} existing IDs on add.")
+            self._put([ids[i] for i in keep], [embeddings[i] for i in keep],
+                      [documents[i] for i in keep] if documents else None,
+                      [metadatas[i] for i in keep] if metadatas else None)
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Dict[str, Any]]] = None):
+        with self._lock:
+            self._put(ids, embeddings, documents, metadatas)
+
+    def _put(self, ids: List[str], embeddings, documents: Optional[List[str]],
+             metadatas: Optional[List[Dict[str, Any]]]):
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+
+        start = self._rows
+        self._ensure_capacity(start + len(ids), vectors.shape[1])
+        self._vectors[start:start + len(ids)] = vectors.astype(np.float16)
+        self._vectors.flush()
+        if len(self._live) < start + len(ids):
+            grown = np.zeros(max(start + len(ids), 2 * len(self._live)), dtype=bool)
+            grown[:len(self._live)] = self._live
+            self._live = grown
+
+        with open(self._records_path, "a", encoding="utf-8") as handle:
+            for offset, doc_id in enumerate(ids):
+                record = {"op": "put", "id": doc_id, "row": start + offset,
+                          "document": documents[offset] if documents else None,
+                          "metadata": metadatas[offset] if metadatas else {}}
+                handle.write(json.dumps(record) + "\n")
+                self._ids.append(None)
+                self._documents.append(None)
+                self._metadatas.append(None)
+                self._apply_record(record)
+        # Rows become visible to a reopened index only once the header is committed.
+        self._rows = start + len(ids)
+        self._write_header()
+        self._maybe_compact()
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            targets = set(ids or [])
+            if where:
+                matching = {doc_id for doc_id, row in self._row_of_id.items()
+                            if _matches_where(self._metadatas[row], where)}
+                targets = (targets & matching) if ids else matching
+            targets = [doc_id for doc_id in targets if doc_id in self._row_of_id]
+            if not targets:
+                return
+            with open(self._records_path, "a", encoding="utf-8") as handle:
+                for doc_id in targets:
+                    record = {"op": "delete", "id": doc_id}
+                    handle.write(json.dumps(record) + "\n")
+                    self._apply_record(record)
+            self._maybe_compact()
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: int = 0, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        include = include if include is not None else ["documents", "metadatas"]
+        with self._lock:
+            if ids is not None:
+                rows = [self._row_of_id[doc_id] for doc_id in ids if doc_id in self._row_of_id]
+            else:
+                rows = sorted(self._row_of_id.values())
+            if where:
+                rows = [row for row in rows if _matches_where(self._metadatas[row], where)]
+            rows = rows[offset:offset + limit if limit is not None else None]
+            result: Dict[str, Any] = {"ids": [self._ids[row] for row in rows]}
+            if "documents" in include:
+                result["documents"] = [self._documents[row] for row in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadatas[row] for row in rows]
+            if "embeddings" in include:
+                result["embeddings"] = (np.asarray(self._vectors[rows], dtype=np.float32)
+                                        if rows else np.zeros((0, self._dim), dtype=np.float32))
+            return result
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Exact cosine top-k. Returns Chroma's nested-list result layout, one inner list per query."""
+        include = include or ["documents", "metadatas", "distances"]
+        result: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            for query_embedding in query_embeddings:
+                top_rows, top_scores = self._search(np.asarray(query_embedding, dtype=np.float32), n_results, where)
+                result["ids"].append([self._ids[row] for row in top_rows])
+                result["documents"].append([self._documents[row] for row in top_rows])
+                result["metadatas"].append([self._metadatas[row] for row in top_rows])
+                result["distances"].append([float(2.0 - 2.0 * score) for score in top_scores])
+        for key in ("documents", "metadatas", "distances"):
+            if key not in include:
+                result[key] = None
+        return result
+
+    def _search(self, query: np.ndarray, n_results: int, where: Optional[Dict[str, Any]] = None):
+        live_rows = self._live[:self._rows]
+        live_count = int(np.count_nonzero(live_rows))
+        if self._vectors is None or not live_count or n_results <= 0:
+            return [], []
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        scores = np.full(self._rows, -np.inf, dtype=np.float32)
+        for block_start in range(0, self._rows, QUERY_BLOCK_ROWS):
+            block_end = min(block_start + QUERY_BLOCK_ROWS, self._rows)
+            block = np.asarray(self._vectors[block_start:block_end], dtype=np.float32)
+            scores[block_start:block_end] = block @ query
+        scores[~live_rows] = -np.inf
+
+        if not where:
+            ordered = self._top_rows(scores, min(n_results, live_count))
+            return ordered, scores[ordered].tolist()
+        # Filter the best-scoring rows, widening the candidate set until enough match.
+        k = min(n_results * 4, live_count)
+        while True:
+            matches = [row for row in self._top_rows(scores, k) if _matches_where(self._metadatas[row], where)]
+            if len(matches) >= n_results or k >= live_count:
+                matches = matches[:n_results]
+                return matches, scores[matches].tolist()
+            k = min(k * 4, live_count)
+
+    @staticmethod
+    def _top_rows(scores: np.ndarray, k: int) -> List[int]:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        return candidates[np.argsort(-scores[candidates])].tolist()
+
+    # --- Maintenance ---
+    def _maybe_compact(self):
+        dead_rows = self._rows - len(self._row_of_id)
+        if dead_rows > max(INITIAL_CAPACITY, len(self._row_of_id)):
+            self.compact()
+
+    def compact(self):
+        """Rewrites the vector file and record log with live rows only."""
+        with self._lock:
+            live = sorted(self._row_of_id.items(), key=lambda item: item[1])
+            rows = [row for _, row in live]
+            vectors = np.asarray(self._vectors[rows], dtype=np.float16) if rows else None
+
+            tmp_vectors = self._vectors_path.with_suffix(".f16.tmp")
+            tmp_records = self._records_path.with_suffix(".jsonl.tmp")
+            capacity = max(INITIAL_CAPACITY, len(rows))
+            compacted = np.memmap(tmp_vectors, dtype=np.float16, mode="w+", shape=(capacity, max(self._dim, 1)))
+            if vectors is not None:
+                compacted[:len(rows)] = vectors
+            compacted.flush()
+            del compacted
+            with open(tmp_records, "w", encoding="utf-8") as handle:
+                for new_row, (doc_id, old_row) in enumerate(live):
+                    handle.write(json.dumps({"op": "put", "id": doc_id, "row": new_row,
+                                             "document": self._documents[old_row],
+                                             "metadata": self._metadatas[old_row]}) + "\n")
+
+            self.close()
+            os.replace(tmp_vectors, self._vectors_path)
+            os.replace(tmp_records, self._records_path)
+            self._rows = len(rows)
+            self._write_header()
+            self._row_of_id, self._ids, self._documents, self._metadatas = {}, [], [], []
+            self._load()
+            rag_logger.info(f"Compacted flat index '{self.name}' to {self._rows} rows.")
+
+    def disk_bytes(self) -> int:
+        return sum(p.stat().st_size for p in self.directory.iterdir() if p.is_file())
+
+    def close(self):
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+
+
+def open_flat_collection(db_path: Path, collection_name: str) -> FlatVectorCollection:
+    return FlatVectorCollection(Path(db_path) / FLAT_INDEX_DIR_NAME / collection_name, collection_name)
+
+
+def open_collection(db_path: Path, collection_name: str, default_backend: str):
+    """
+    Opens a collection with the backend recorded for it in db_path, falling
+    back to default_backend for new collections. Returns (chroma_client, collection);
+    the client is None for flat collections.
+    """
+    db_path = Path(db_path)
+    backend = read_backend_choice(db_path, collection_name)
+    if backend is None:
+        # DBs created before backends were selectable are Chroma DBs.
+        backend = "chroma" if (db_path / "chroma.sqlite3").exists() else default_backend
+        if backend not in VECTOR_BACKENDS:
+            rag_logger.warning(f"Unknown vector backend '{backend}'; using chroma for '{collection_name}'.")
+            backend = "chroma"
+        db_path.mkdir(parents=True, exist_ok=True)
+        write_backend_choice(db_path, collection_name, backend)
+
+    if backend == "flat":
+        return None, open_flat_collection(db_path, collection_name)
+    import chromadb
+    client = chromadb.PersistentClient(path=str(db_path))
+    return client, client.get_or_create_collection(name=collection_name)
+
+
+def migrate_collection(db_path: Path, collection_name: str, to_backend: str, batch_size: int = 2048) -> int:
+    """
+    Copies a collection between Chroma and the flat index inside db_path,
+    including stored embeddings (nothing is re-encoded), then records the
+    target backend so the server opens the migrated copy. The source is left
+    in place so the migration can be rolled back by migrating again.
+    """
+    import chromadb
+
+    if to_backend not in VECTOR_BACKENDS:
+        raise ValueError(f"Unknown vector backend '{to_backend}'. Expected one of {VECTOR_BACKENDS}.")
+    db_path = Path(db_path)
+    client = chromadb.PersistentClient(path=str(db_path))
+    chroma_collection = client.get_or_create_collection(name=collection_name)
+    flat_collection = open_flat_collection(db_path, collection_name)
+    source, target = ((chroma_collection, flat_collection) if to_backend == "flat"
+                      else (flat_collection, chroma_collection))
+
+    copied = 0
+    total = source.count()
+    while copied < total:
+        batch = source.get(limit=batch_size, offset=copied, include=["documents", "metadatas", "embeddings"])
+        if not batch["ids"]:
+            break
+        embeddings = batch["embeddings"]
+        target.upsert(ids=batch["ids"], embeddings=[list(map(float, e)) for e in embeddings],
+                      documents=batch["documents"], metadatas=batch["metadatas"])
+        copied += len(batch["ids"])
+        rag_logger.info(f"Migrating '{collection_name}' to {to_backend}: {copied}/{total}")
+
+    flat_collection.close()
+    write_backend_choice(db_path, collection_name, to_backend)
+    return copied
+
+
+def benchmark_vector_backends(sizes: List[int], dim: int = 384, n_queries: int = 50, n_results: int = 10,
+                              batch_size: int = 2048) -> List[Dict[str, Any]]:
+    """
+    Compares Chroma and the flat index on synthetic normalized vectors:
+    ingest throughput, query latency percentiles and on-disk size.
+    """
+    import chromadb
+
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((n_queries, dim)).astype(np.float32)
+    report = []
+    for size in sizes:
+        vectors = rng.standard_normal((size, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        ids = [f"chunk_{i}" for i in range(size)]
+        documents = [f"document {i}" for i in range(size)]
+        metadatas = [{"source": f"file_{i % 100}.py"} for i in range(size)]
+
+        for backend in VECTOR_BACKENDS:
+            work_dir = Path(tempfile.mkdtemp(prefix=f"rag_bench_{backend}_"))
+            try:
+                if backend == "flat":
+                    collection = open_flat_collection(work_dir, "bench")
+                else:
+                    collection = chromadb.PersistentClient(path=str(work_dir)).get_or_create_collection(name="bench")
+
+                started = time.perf_counter()
+                for start in range(0, size, batch_size):
+                    end = min(start + batch_size, size)
+                    collection.add(ids=ids[start:end], embeddings=vectors[start:end].tolist(),
+                                   documents=documents[start:end], metadatas=metadatas[start:end])
+                ingest_seconds = time.perf_counter() - started
+
+                latencies = []
+                for query in queries:
+                    started = time.perf_counter()
+                    collection.query(query_embeddings=[query.tolist()], n_results=n_results)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                latencies.sort()
+
+                if backend == "flat":
+                    collection.close()
+                disk_bytes = sum(p.stat().st_size for p in work_dir.rglob("*") if p.is_file())
+                report.append({
+                    "backend": backend,
+                    "chunks": size,
+                    "ingest_chunks_per_second": round(size / ingest_seconds, 1),
+                    "query_p50_ms": round(latencies[len(latencies) // 2], 2),
+                    "query_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 2),
+                    "disk_mb": round(disk_bytes / (1024 * 1024), 2),
+                })
+                rag_logger.info(f"Vector benchmark: {report[-1]}")
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+    return report
@@ -1,12 +1,19 @@
 # rag_server.py
 
 import os
+import gc
 import sys
+import json
+import time
+import hashlib
 import logging
+import threading
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from contextlib import asynccontextmanager
-from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Union
 
 # --- Setup Logging First ---
 log_file_path = Path(sys.executable).parent / "rag_server_debug.log" if getattr(sys, 'frozen', False) else Path(
@@ -41,9 +48,13 @@ rag_logger.info(f"RAG Server logging initialized. Log file: {log_file_path}")
 try:
     from fastapi import FastAPI, HTTPException
     from pydantic import BaseModel, Field
-    import chromadb
-    from sentence_transformers import SentenceTransformer
     import uvicorn
+    # Sibling module; the server runs as a script from its own directory.
+    from rag_embeddings import create_embedding_backend, benchmark_backends, plan_worker_count, ParallelEncoder
+    from rag_flat_index import (VECTOR_BACKENDS, FlatVectorCollection, open_collection, migrate_collection,
+                                benchmark_vector_backends)
+    from rag_shards import ShardedCollection, open_global_collection, reshard_collection
+    from rag_snapshots import export_snapshot, import_snapshot, SnapshotError, SnapshotModelMismatch
     # PIL and io are not directly used in this version but kept for potential future image handling in RAG
     # from PIL import Image
     # import io
@@ -54,22 +65,72 @@ except ImportError as e:
 # --- Configuration ---
 PERSIST_DIRECTORY_NAME = "rag_db"  # For project-specific DBs within the project folder
 MODEL_NAME = 'all-miniLM-L6-v2'  # Embedding model
+EMBEDDING_BACKEND = os.getenv("RAG_EMBEDDING_BACKEND", "torch")  # 'torch' (fp32 PyTorch) or 'onnx' (int8 ONNX Runtime)
+EMBEDDING_THREADS = int(os.getenv("RAG_EMBEDDING_THREADS", "0"))  # 0 = library default
+ONNX_SELF_CHECK = os.getenv("RAG_ONNX_SELF_CHECK", "1") != "0"
+ONNX_DRIFT_TOLERANCE = float(os.getenv("RAG_ONNX_DRIFT_TOLERANCE", "0.02"))  # Max cosine distance vs. torch
+READINESS_WAIT_SECONDS = float(os.getenv("RAG_READINESS_WAIT_SECONDS", "20"))  # How long requests wait for startup
+IDLE_UNLOAD_MINUTES = float(os.getenv("RAG_IDLE_UNLOAD_MINUTES", "30"))  # Unload the model after this idle time; 0 = never
+IDLE_CLOSE_COLLECTIONS = os.getenv("RAG_IDLE_CLOSE_COLLECTIONS", "0") == "1"  # Also drop idle project collections
+IDLE_CHECK_INTERVAL_SECONDS = 30
+BULK_WORKERS = int(os.getenv("RAG_BULK_WORKERS", "0"))  # 0 = one per core, capped by the memory limit
+BULK_MEMORY_LIMIT_MB = int(os.getenv("RAG_BULK_MEMORY_LIMIT_MB", "0"))  # 0 = 75% of available memory
+BULK_WORKER_MEMORY_MB = int(os.getenv("RAG_BULK_WORKER_MEMORY_MB", "600"))  # Estimated footprint of one worker
+BULK_SHARD_SIZE = 512  # Chunks encoded per worker task
+BULK_COMMIT_BATCH_SIZE = 4096  # Chunks per Chroma write; stays under Chroma's max batch size
+# Storage backend for newly created collections: 'chroma' or 'flat' (memory-mapped float16, exact search).
+# A collection that already exists keeps the backend recorded in its DB directory.
+PROJECT_VECTOR_BACKEND = os.getenv("RAG_PROJECT_VECTOR_BACKEND", "chroma")
+GLOBAL_VECTOR_BACKEND = os.getenv("RAG_GLOBAL_VECTOR_BACKEND", "chroma")
+# Hash partitions of the global KB, each searched by its own worker process. 1 = a single in-process collection.
+GLOBAL_SHARDS = max(1, int(os.getenv("RAG_GLOBAL_SHARDS", "1")))
 PROJECT_COLLECTION_NAME = "kintsugi_project_kb"  # Name for project-specific collections
 GLOBAL_COLLECTION_NAME = "kintsugi_global_python_kb"  # Name for the global collection
 HOST = "127.0.0.1"
 PORT = 8001
+RRF_K = 60  # Reciprocal-rank fusion constant; larger values flatten the rank contribution
+VALID_TARGETS = ("project", "global")
+PATH_DIR_KEY_PREFIX = "dir:"  # Must match ChunkingService; chunks flag each ancestor directory as 'dir:<path>'
+QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "256"))  # 0 disables the query-result cache
 
 
 # --- Data Models for FastAPI ---
 class QueryRequest(BaseModel):
     query_text: str
     n_results: int = 5
-    target_collection: Optional[str] = "project"  # 'project' or 'global' or 'both' (future)
+    # 'project', 'global', 'both', or a list of those. Multiple targets are embedded once,
+    # queried in parallel and merged with reciprocal-rank fusion.
+    target_collection: Optional[Union[str, List[str]]] = "project"
+    source_quotas: Optional[Dict[str, int]] = None  # Max hits per source in a fused result, e.g. {"global": 2}
+    deduplicate: bool = True  # Merge identical snippets that appear in several sources
+    rrf_k: int = RRF_K
+    # Explicit project scoping. Either one overrides the /set_collection default for this request only.
+    project_path: Optional[str] = None
+    collection_handle: Optional[str] = None
+    # Chroma-style metadata filter applied to every target, e.g. {"language": "python"}.
+    where: Optional[Dict[str, Any]] = None
+    # Project-relative files or directories (e.g. "src/ui/" or "main.py"); restricts the project target only.
+    path_prefixes: Optional[List[str]] = None
+    return_hits: bool = False  # Also return the structured hit list, for client-side context packing
+
+
+class QueryHit(BaseModel):
+    id: str
+    text: str
+    score: float  # Fused rank score for multi-target queries, higher is better
+    distance: Optional[float] = None
+    source: str
+    source_collection: str
+    start_line: Optional[int] = None
+    end_line: Optional[int] = None
+    metadata: Dict[str, Any] = Field(default_factory=dict)
 
 
 class QueryResponse(BaseModel):
     context: str
     source_collection: str  # To indicate where the context came from
+    hits: Optional[List[QueryHit]] = None
+    skipped_sources: Dict[str, str] = Field(default_factory=dict)  # Fused queries: source -> why it was left out
 
 
 class Document(BaseModel):
@@ -81,6 +142,35 @@ class Document(BaseModel):
 class AddRequest(BaseModel):
     documents: List[Document]
     target_collection: Optional[str] = "project"  # To specify where to add: 'project' or 'global'
+    project_path: Optional[str] = None
+    collection_handle: Optional[str] = None
+    # For content-addressed chunk IDs: IDs already stored are not re-embedded, and with
+    # replace_sources, stored chunks of the same files ('full_path') that are absent here are removed.
+    skip_existing: bool = False
+    replace_sources: bool = False
+
+
+class DeleteRequest(BaseModel):
+    ids: Optional[List[str]] = None
+    where: Optional[Dict[str, Any]] = None  # Chroma-style metadata filter, e.g. {"full_path": "..."}
+    target_collection: Optional[str] = "project"
+    project_path: Optional[str] = None
+    collection_handle: Optional[str] = None
+
+
+class ExportRequest(BaseModel):
+    output_path: str  # Snapshot file to write on the server's filesystem
+    target_collection: Optional[str] = "global"
+    project_path: Optional[str] = None
+    collection_handle: Optional[str] = None
+
+
+class ImportRequest(BaseModel):
+    snapshot_path: str
+    target_collection: Optional[str] = "global"
+    project_path: Optional[str] = None
+    collection_handle: Optional[str] = None
+    reembed: bool = False  # Re-encode texts locally if the snapshot was built with another model
 
 
 class SetCollectionRequest(BaseModel):
@@ -89,69 +179,474 @@ class SetCollectionRequest(BaseModel):
 
 # --- Global State ---
 app_state = {
+    "phase": "starting",  # starting -> model_loading -> ready (or failed); ready <-> unloaded when idle
+    "startup_error": None,
+    "time_to_ready_seconds": None,
     "embedding_model": None,
+    "model_last_used": None,  # time.monotonic() of the last request that needed the model
+    "model_unload_count": 0,
     "project_collection": None,
+    "default_project_path": None,  # Default project (set via /set_collection); lets it reopen after an idle close
     "global_collection": None,
-    "chroma_client_project": None,  # ChromaDB client for the current project's DB
-    "chroma_client_global": None  # ChromaDB client for the global DB
+    "chroma_client_project": None,  # ChromaDB client for the default project's DB
+    "chroma_client_global": None,  # ChromaDB client for the global DB
+    "project_collections": {},  # handle -> {"path", "client", "collection"}; client and collection are None while idle-closed
+    "bulk_encoder": None
 }
+# Guards the project collection registry. Sync endpoints run in FastAPI's threadpool,
+# so requests for different projects can be served concurrently.
+project_collections_lock = threading.Lock()
+# Set once background startup finishes, successfully or not.
+model_ready = threading.Event()
+# Serializes idle unloads against on-demand reloads.
+model_lock = threading.Lock()
+# The bulk-ingest worker pool is started on first use and reused; one bulk job runs at a time.
+bulk_encoder_lock = threading.Lock()
+# Fans a fused query out to its collections in parallel.
+query_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-query")
 
 
-# --- Lifespan Event Handler ---
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    rag_logger.info("--- RAG Server Startup (Lifespan) ---")
-    rag_logger.info(f"Loading embedding model: '{MODEL_NAME}' into memory...")
+# --- Query Result Cache ---
+class QueryResultCache:
+    """
+    Bounded LRU cache of query results. Keys include the version of every
+    collection searched, and versions bump on each write, so a stale entry
+    can never be returned; it simply ages out.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, List[Dict[str, Any]]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def collection_version(self, collection_key: str) -> int:
+        with self._lock:
+            return self._versions.get(collection_key, 0)
+
+    def bump_version(self, collection_key: str):
+        with self._lock:
+            self._versions[collection_key] = self._versions.get(collection_key, 0) + 1
+
+    def get(self, key: tuple) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, value: List[Dict[str, Any]]):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+query_cache = QueryResultCache(QUERY_CACHE_SIZE)
+
+
+def _collection_key(collection) -> str:
+    """Identifies a collection across requests (Chroma collections carry a stable UUID)."""
+    return str(getattr(collection, "id", None) or id(collection))
+
+
+def _close_collection(collection):
+    """
+    Flat collections flush their memory map and sharded collections stop their
+    worker processes; Chroma manages its own resources.
+    """
+    if isinstance(collection, (FlatVectorCollection, ShardedCollection)):
+        collection.close()
+
+
+# --- Project Collection Registry ---
+def _project_handle(project_root_path: Path) -> str:
+    """Derives a stable, opaque handle for a project's collection from its resolved path."""
+    return hashlib.sha1(str(project_root_path.resolve()).encode("utf-8")).hexdigest()[:16]
+
+
+def _open_project_collection(project_path_str: str) -> Dict[str, Any]:
+    """
+    Returns the registry entry for a project's collection, opening its ChromaDB
+    client on first use or after an idle close. Raises HTTPException for invalid paths or DB failures.
+    """
+    if not project_path_str:
+        raise HTTPException(status_code=400, detail="Project path cannot be empty.")
+
+    project_root_path = Path(project_path_str)
+    if not project_root_path.is_dir():
+        rag_logger.error(f"Invalid project path provided: {project_path_str}")
+        raise HTTPException(status_code=400,
+                            detail=f"Invalid or non-existent project path provided: {project_path_str}")
+
+    handle = _project_handle(project_root_path)
+    with project_collections_lock:
+        entry = app_state["project_collections"].get(handle)
+        if entry and entry["collection"] is not None:
+            entry["last_used"] = time.monotonic()
+            return entry
+
+        project_db_persist_path = project_root_path / PERSIST_DIRECTORY_NAME
+        rag_logger.info(f"Opening PROJECT collection for '{project_root_path.name}'. DB path: '{project_db_persist_path}'")
+        try:
+            project_db_persist_path.mkdir(parents=True, exist_ok=True)
+            client, collection = open_collection(project_db_persist_path, PROJECT_COLLECTION_NAME,
+                                                  PROJECT_VECTOR_BACKEND)
+        except Exception as e:
+            rag_logger.error(f"Could not connect/create PROJECT ChromaDB at '{project_db_persist_path}'. Error: {e}",
+                             exc_info=True)
+            raise HTTPException(status_code=500,
+                                detail=f"Failed to initialize PROJECT ChromaDB collection at {project_db_persist_path}: {e}")
+
+        if entry:
+            # Reopened after an idle close; the handle stays valid throughout.
+            entry.update(client=client, collection=collection, last_used=time.monotonic())
+            return entry
+        entry = {"handle": handle, "path": project_root_path.resolve(), "client": client, "collection": collection,
+                 "last_used": time.monotonic()}
+        app_state["project_collections"][handle] = entry
+        return entry
+
+
+def _resolve_project_collection(project_path: Optional[str], collection_handle: Optional[str]):
+    """
+    Picks the project collection for a request: an explicit project path wins,
+    then an explicit handle, then the /set_collection default. Returns None if
+    no project collection is available.
+    """
+    if project_path:
+        return _open_project_collection(project_path)["collection"]
+    if collection_handle:
+        with project_collections_lock:
+            entry = app_state["project_collections"].get(collection_handle)
+        if not entry:
+            raise HTTPException(status_code=404,
+                                detail=f"Unknown collection handle '{collection_handle}'. Call /set_collection or pass project_path.")
+        if entry["collection"] is None:
+            return _open_project_collection(str(entry["path"]))["collection"]
+        entry["last_used"] = time.monotonic()
+        return entry["collection"]
+    default_path = app_state.get("default_project_path")
+    if app_state.get("project_collection") is None and default_path:
+        # The default collection was closed while idle; reopen it.
+        entry = _open_project_collection(default_path)
+        app_state["chroma_client_project"] = entry["client"]
+        app_state["project_collection"] = entry["collection"]
+    elif default_path:
+        # Keeps the default collection from looking idle while requests use it.
+        with project_collections_lock:
+            entry = app_state["project_collections"].get(_project_handle(Path(default_path)))
+            if entry:
+                entry["last_used"] = time.monotonic()
+    return app_state.get("project_collection")
+
+
+def _resolve_target_collection(target_collection: Optional[str], project_path: Optional[str] = None,
+                               collection_handle: Optional[str] = None):
+    """Maps a request's target ('project' or 'global') to a collection, or None if it is not active."""
+    if target_collection == "global":
+        # The global collection is opened during background startup.
+        model_ready.wait(timeout=READINESS_WAIT_SECONDS)
+        return app_state.get("global_collection")
+    if target_collection == "project":
+        return _resolve_project_collection(project_path, collection_handle)
+    raise HTTPException(status_code=400,
+                        detail=f"Invalid target_collection: '{target_collection}'. Must be 'project' or 'global'.")
+
+
+# --- Background Startup ---
+def _load_global_collection():
+    global_db_path_str = os.getenv("GLOBAL_RAG_DB_PATH")
+    if not global_db_path_str:
+        rag_logger.info(
+            "GLOBAL_RAG_DB_PATH environment variable not set. Global knowledge base will not be loaded/created by default.")
+        return
+
+    global_db_path = Path(global_db_path_str)
+    # Important: The path from GLOBAL_RAG_DB_PATH should be the *directory* where ChromaDB stores its files.
+    if not global_db_path.exists():
+        rag_logger.info(
+            f"Global DB path '{global_db_path}' does not exist. Will attempt to create if documents are added to global collection.")
+        global_db_path.mkdir(parents=True, exist_ok=True)  # Ensure it exists for PersistentClient
+
+    if not global_db_path.is_dir():
+        rag_logger.warning(
+            f"GLOBAL_RAG_DB_PATH '{global_db_path_str}' is not a valid directory. Global KB not loaded.")
+        return
+
+    try:
+        rag_logger.info(f"Attempting to load/create GLOBAL knowledge base from: {global_db_path}")
+        app_state["chroma_client_global"], app_state["global_collection"] = open_global_collection(
+            global_db_path, GLOBAL_COLLECTION_NAME, GLOBAL_VECTOR_BACKEND, GLOBAL_SHARDS)
+        rag_logger.info(
+            f"Successfully loaded/created GLOBAL knowledge base. Collection: '{GLOBAL_COLLECTION_NAME}'")
+    except Exception as e:
+        rag_logger.error(f"Failed to load/create GLOBAL knowledge base from {global_db_path}: {e}",
+                         exc_info=True)
+
+
+def _load_resources_in_background(started_at: float):
+    """Loads the embedding model and global collection while the server already answers requests."""
+    app_state["phase"] = "model_loading"
+    rag_logger.info(f"Loading embedding model: '{MODEL_NAME}' into memory (backend: {EMBEDDING_BACKEND})...")
     try:
-        app_state["embedding_model"] = SentenceTransformer(MODEL_NAME)
-        rag_logger.info("Embedding model loaded successfully.")
+        app_state["embedding_model"] = _create_configured_backend()
+        app_state["model_last_used"] = time.monotonic()
+        rag_logger.info(f"Embedding model loaded successfully (backend: {app_state['embedding_model'].name}).")
+        _load_global_collection()
+        app_state["phase"] = "ready"
+        app_state["time_to_ready_seconds"] = round(time.perf_counter() - started_at, 2)
+        rag_logger.info(f"--- RAG Server is ready (time to ready: {app_state['time_to_ready_seconds']}s) ---")
     except Exception as e:
+        # The server stays up so clients get a clear 503 instead of a refused connection.
         rag_logger.critical(f"FATAL: Could not load embedding model. Error: {e}", exc_info=True)
-        # Exit if embedding model fails to load, as server is non-functional
-        # Consider raising the exception to let FastAPI handle graceful shutdown if possible
-        # For now, direct exit to ensure it doesn't run in a broken state.
-        sys.exit("RAG Server: Embedding model failed to load.")
+        app_state["phase"] = "failed"
+        app_state["startup_error"] = str(e)
+    finally:
+        model_ready.set()
 
-    # Load Global Collection
-    global_db_path_str = os.getenv("GLOBAL_RAG_DB_PATH")
-    if global_db_path_str:
-        global_db_path = Path(global_db_path_str)
-        # Important: The path from GLOBAL_RAG_DB_PATH should be the *directory* where ChromaDB stores its files.
-        if not global_db_path.exists():
-            rag_logger.info(
-                f"Global DB path '{global_db_path}' does not exist. Will attempt to create if documents are added to global collection.")
-            global_db_path.mkdir(parents=True, exist_ok=True)  # Ensure it exists for PersistentClient
-
-        if global_db_path.is_dir():
-            try:
-                rag_logger.info(f"Attempting to load/create GLOBAL knowledge base from: {global_db_path}")
-                app_state["chroma_client_global"] = chromadb.PersistentClient(path=str(global_db_path))
-                # get_or_create_collection is idempotent
-                app_state["global_collection"] = app_state["chroma_client_global"].get_or_create_collection(
-                    name=GLOBAL_COLLECTION_NAME,
-                    # Optionally, specify embedding function if not using default
-                    # embedding_function=chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction(model_name=MODEL_NAME)
-                )
-                rag_logger.info(
-                    f"Successfully loaded/created GLOBAL knowledge base. Collection: '{GLOBAL_COLLECTION_NAME}'")
-            except Exception as e:
-                rag_logger.error(f"Failed to load/create GLOBAL knowledge base from {global_db_path}: {e}",
-                                 exc_info=True)
-        else:
-            rag_logger.warning(
-                f"GLOBAL_RAG_DB_PATH '{global_db_path_str}' is not a valid directory. Global KB not loaded.")
+
+def _require_embedding_model(endpoint: str):
+    """
+    Returns the embedding model, waiting up to READINESS_WAIT_SECONDS for
+    background startup instead of failing requests that arrive early.
+    """
+    if not model_ready.wait(timeout=READINESS_WAIT_SECONDS):
+        rag_logger.warning(f"{endpoint} timed out waiting for startup (phase: {app_state.get('phase')}).")
+        raise HTTPException(status_code=503,
+                            detail=f"RAG server is still starting (phase: {app_state.get('phase')}). Retry shortly.")
+    with model_lock:
+        if app_state.get("phase") == "unloaded":
+            _reload_embedding_model()
+        embedding_model = app_state.get("embedding_model")
+        app_state["model_last_used"] = time.monotonic()
+    if not embedding_model:
+        rag_logger.error(f"{endpoint} called but embedding model not loaded.")
+        raise HTTPException(status_code=503,
+                            detail=f"Embedding model not loaded: {app_state.get('startup_error') or 'unknown error'}")
+    return embedding_model
+
+
+# --- Idle Policy ---
+def _create_configured_backend(self_check: bool = ONNX_SELF_CHECK):
+    backend = create_embedding_backend(EMBEDDING_BACKEND, MODEL_NAME, threads=EMBEDDING_THREADS,
+                                       self_check=self_check, drift_tolerance=ONNX_DRIFT_TOLERANCE)
+    if backend.name != EMBEDDING_BACKEND:
+        rag_logger.critical("!" * 72)
+        rag_logger.critical(f"RAG_EMBEDDING_BACKEND={EMBEDDING_BACKEND} was requested, but the '{backend.name}' "
+                            f"backend is in use. See the errors above for why.")
+        rag_logger.critical("!" * 72)
+    return backend
+
+
+def _release_memory():
+    """Returns freed model memory to the OS where the allocator allows it."""
+    gc.collect()
+    torch_module = sys.modules.get("torch")
+    if torch_module is not None and torch_module.cuda.is_available():
+        torch_module.cuda.empty_cache()
+    if sys.platform.startswith("linux"):
+        try:
+            import ctypes
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except Exception:
+            pass
+
+
+def _resident_memory_mb() -> Optional[float]:
+    """Current resident set size of the server process, if it can be determined."""
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().rss / (1024 * 1024), 1)
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as statm:
+            return round(int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _unload_embedding_model():
+    """Drops the embedding model. Must be called with model_lock held."""
+    if app_state.get("embedding_model") is None:
+        return
+    rss_before = _resident_memory_mb()
+    app_state["embedding_model"] = None
+    app_state["phase"] = "unloaded"
+    app_state["model_unload_count"] = app_state.get("model_unload_count", 0) + 1
+    _release_memory()
+    rag_logger.info(f"Embedding model unloaded after {IDLE_UNLOAD_MINUTES} idle minute(s). "
+                    f"RSS: {rss_before} MB -> {_resident_memory_mb()} MB.")
+
+
+def _reload_embedding_model():
+    """Reloads the model on the first request after an idle unload. Must be called with model_lock held."""
+    started = time.perf_counter()
+    app_state["phase"] = "model_loading"
+    try:
+        # The drift self-check already passed at startup; skip it so reloads stay fast.
+        app_state["embedding_model"] = _create_configured_backend(self_check=False)
+        app_state["phase"] = "ready"
+        rag_logger.info(f"Embedding model reloaded in {time.perf_counter() - started:.2f}s.")
+    except Exception as e:
+        rag_logger.error(f"Failed to reload embedding model: {e}", exc_info=True)
+        app_state["phase"] = "unloaded"
+
+
+def _close_idle_collections(idle_seconds: float) -> int:
+    """
+    Closes project collections nobody has used for idle_seconds. Their
+    registry entries (and so their handles) stay; they reopen on next use.
+    Returns how many were closed.
+    """
+    closed = 0
+    now = time.monotonic()
+    with project_collections_lock:
+        registry = app_state.get("project_collections", {})
+        for entry in registry.values():
+            if entry["collection"] is None or now - entry.get("last_used", now) < idle_seconds:
+                continue
+            _close_collection(entry["collection"])
+            if app_state.get("project_collection") is entry["collection"]:
+                app_state["project_collection"] = None
+                app_state["chroma_client_project"] = None
+            entry["client"] = entry["collection"] = None
+            closed += 1
+            rag_logger.info(f"Closed idle project collection for '{entry['path'].name}'.")
+    return closed
+
+
+def _idle_watcher():
+    idle_seconds = IDLE_UNLOAD_MINUTES * 60
+    while True:
+        time.sleep(IDLE_CHECK_INTERVAL_SECONDS)
+        # Collections age independently of the model, which may have been unloaded long ago.
+        if IDLE_CLOSE_COLLECTIONS and _close_idle_collections(idle_seconds):
+            _release_memory()
+        if app_state.get("phase") != "ready":
+            continue
+        last_used = app_state.get("model_last_used") or time.monotonic()
+        if time.monotonic() - last_used < idle_seconds:
+            continue
+        with model_lock:
+            # Re-check under the lock; a request may have just used the model.
+            if time.monotonic() - (app_state.get("model_last_used") or 0) >= idle_seconds:
+                _unload_embedding_model()
+
+
+# --- Bulk Ingestion ---
+def _get_bulk_encoder() -> ParallelEncoder:
+    """Returns the shared worker pool, starting it on first use. Call with bulk_encoder_lock held."""
+    if app_state.get("bulk_encoder") is None:
+        workers = plan_worker_count(BULK_WORKERS, BULK_MEMORY_LIMIT_MB, BULK_WORKER_MEMORY_MB)
+        app_state["bulk_encoder"] = ParallelEncoder(EMBEDDING_BACKEND, MODEL_NAME, workers)
+    return app_state["bulk_encoder"]
+
+
+def _bulk_write(collection, ids: List[str], contents: List[str], metadatas: List[Dict[str, Any]],
+                encoder: ParallelEncoder) -> int:
+    """
+    Encodes documents on the worker pool and upserts them in input order,
+    committing each finished shard so memory stays bounded. Upserts make an
+    interrupted overnight run safe to restart.
+    """
+    started = time.perf_counter()
+    written = 0
+    for shard_start, embeddings in encoder.encode_in_order(contents, shard_size=BULK_SHARD_SIZE):
+        shard_end = shard_start + len(embeddings)
+        for commit_start in range(shard_start, shard_end, BULK_COMMIT_BATCH_SIZE):
+            commit_end = min(commit_start + BULK_COMMIT_BATCH_SIZE, shard_end)
+            collection.upsert(
+                ids=ids[commit_start:commit_end],
+                embeddings=embeddings[commit_start - shard_start:commit_end - shard_start].tolist(),
+                documents=contents[commit_start:commit_end],
+                metadatas=metadatas[commit_start:commit_end]
+            )
+            written += commit_end - commit_start
+    query_cache.bump_version(_collection_key(collection))
+    elapsed = time.perf_counter() - started
+    rag_logger.info(f"Bulk-wrote {written} chunks in {elapsed:.1f}s ({written / max(elapsed, 1e-9):.0f} chunks/s).")
+    return written
+
+
+def run_bulk_ingest(jsonl_path: Path, target_collection: str, project_path: Optional[str] = None,
+                    read_block_size: int = 50_000) -> int:
+    """
+    Offline bulk-ingest mode: reads {"id", "content", "metadata"} lines from a
+    JSONL file and writes them to the target collection without the server.
+    """
+    if target_collection == "global":
+        _load_global_collection()
+        collection = app_state.get("global_collection")
     else:
-        rag_logger.info(
-            "GLOBAL_RAG_DB_PATH environment variable not set. Global knowledge base will not be loaded/created by default.")
+        collection = _open_project_collection(project_path)["collection"]
+    if collection is None:
+        raise RuntimeError(f"The '{target_collection}' collection could not be opened.")
+
+    encoder = ParallelEncoder(EMBEDDING_BACKEND, MODEL_NAME,
+                              plan_worker_count(BULK_WORKERS, BULK_MEMORY_LIMIT_MB, BULK_WORKER_MEMORY_MB))
+    total = 0
+    try:
+        with open(jsonl_path, "r", encoding="utf-8") as handle:
+            ids, contents, metadatas = [], [], []
+            for line in handle:
+                if not line.strip():
+                    continue
+                doc = json.loads(line)
+                ids.append(doc["id"])
+                contents.append(doc["content"])
+                metadatas.append(doc.get("metadata") or {})
+                if len(ids) >= read_block_size:
+                    total += _bulk_write(collection, ids, contents, metadatas, encoder)
+                    ids, contents, metadatas = [], [], []
+            if ids:
+                total += _bulk_write(collection, ids, contents, metadatas, encoder)
+    finally:
+        encoder.close()
+    return total
 
+
+# --- Lifespan Event Handler ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    rag_logger.info("--- RAG Server Startup (Lifespan) ---")
     # Project collection will be set via /set_collection
     app_state["project_collection"] = None
     app_state["chroma_client_project"] = None
 
-    rag_logger.info("--- RAG Server is now ready and listening ---")
+    # Bind immediately; the model loads on a daemon thread so shutdown never waits on it.
+    threading.Thread(target=_load_resources_in_background, args=(time.perf_counter(),),
+                     name="rag-startup", daemon=True).start()
+    if IDLE_UNLOAD_MINUTES > 0:
+        threading.Thread(target=_idle_watcher, name="rag-idle-watcher", daemon=True).start()
+    rag_logger.info("--- RAG Server is listening; loading model in the background ---")
     yield
     rag_logger.info("--- RAG Server Shutdown (Lifespan) ---")
-    # ChromaDB persistent clients manage their own resources. No explicit close needed.
+    if app_state.get("bulk_encoder") is not None:
+        app_state["bulk_encoder"].close()
+    # ChromaDB persistent clients manage their own resources; flat indexes flush their memory maps.
+    for entry in app_state.get("project_collections", {}).values():
+        _close_collection(entry["collection"])
+    _close_collection(app_state.get("global_collection"))
     app_state.clear()
     rag_logger.info("Cleaned up RAG server resources.")
 
@@ -163,36 +658,23 @@ rag_app = FastAPI(title="Kintsugi AvA RAG Service", lifespan=lifespan)
 # --- API Endpoints ---
 @rag_app.post("/set_collection")
 def set_project_collection(request: SetCollectionRequest):
+    """
+    Sets the DEFAULT project collection, used by requests that do not pass an
+    explicit project_path or collection_handle. Kept for backward compatibility.
+    """
     project_path_str = request.project_path
     if not project_path_str:
         rag_logger.error("/set_collection called with empty project path.")
         raise HTTPException(status_code=400, detail="Project path cannot be empty.")
 
-    project_root_path = Path(project_path_str)
-    if not project_root_path.is_dir():
-        rag_logger.error(f"/set_collection called with invalid project path: {project_path_str}")
-        raise HTTPException(status_code=400,
-                            detail=f"Invalid or non-existent project path provided: {project_path_str}")
-
-    project_db_persist_path = project_root_path / PERSIST_DIRECTORY_NAME
-    rag_logger.info(f"Setting PROJECT-SPECIFIC RAG context. DB path: '{project_db_persist_path}'")
-    try:
-        project_db_persist_path.mkdir(parents=True, exist_ok=True)
-        # Each project gets its own client and collection instance
-        app_state["chroma_client_project"] = chromadb.PersistentClient(path=str(project_db_persist_path))
-        app_state["project_collection"] = app_state["chroma_client_project"].get_or_create_collection(
-            name=PROJECT_COLLECTION_NAME
-        )
-        rag_logger.info(
-            f"ChromaDB PROJECT collection set. Active project: {project_root_path.name}, Collection: '{PROJECT_COLLECTION_NAME}'")
-        return {"status": "success", "message": f"Project collection set to: {project_root_path.name}"}
-    except Exception as e:
-        rag_logger.error(f"FATAL: Could not connect/create PROJECT ChromaDB at '{project_db_persist_path}'. Error: {e}",
-                         exc_info=True)
-        app_state["project_collection"] = None
-        app_state["chroma_client_project"] = None
-        raise HTTPException(status_code=500,
-                            detail=f"Failed to initialize PROJECT ChromaDB collection at {project_db_persist_path}: {e}")
+    entry = _open_project_collection(project_path_str)
+    app_state["chroma_client_project"] = entry["client"]
+    app_state["project_collection"] = entry["collection"]
+    app_state["default_project_path"] = str(entry["path"])
+    rag_logger.info(
+        f"Default PROJECT collection set. Active project: {entry['path'].name}, Collection: '{PROJECT_COLLECTION_NAME}'")
+    return {"status": "success", "message": f"Project collection set to: {entry['path'].name}",
+            "collection_handle": entry["handle"]}
 
 
 @rag_app.get("/")
@@ -201,118 +683,509 @@ def read_root():
     status_global = "Active" if app_state.get("global_collection") else "Inactive - Set GLOBAL_RAG_DB_PATH & add docs"
     return {
         "status": "Kintsugi RAG Server is running",
+        "phase": app_state.get("phase"),
+        "ready": app_state.get("phase") == "ready",
+        "time_to_ready_seconds": app_state.get("time_to_ready_seconds"),
+        "startup_error": app_state.get("startup_error"),
         "project_collection_status": status_project,
         "global_collection_status": status_global,
-        "embedding_model_status": "Loaded" if app_state.get("embedding_model") else "Not Loaded"
+        "open_project_collections": sum(1 for entry in app_state.get("project_collections", {}).values()
+                                        if entry["collection"] is not None),
+        "global_vector_backend": "flat" if isinstance(app_state.get("global_collection"), FlatVectorCollection) else "chroma",
+        "global_shards": getattr(app_state.get("global_collection"), "shard_count", 1),
+        "query_cache": query_cache.stats(),
+        "embedding_model_status": "Loaded" if app_state.get("embedding_model") else "Not Loaded",
+        "embedding_backend": app_state["embedding_model"].name if app_state.get("embedding_model") else None,
+        "embedding_backend_requested": EMBEDDING_BACKEND,
+        "model_unload_count": app_state.get("model_unload_count", 0),
+        "idle_unload_minutes": IDLE_UNLOAD_MINUTES,
+        "resident_memory_mb": _resident_memory_mb()
     }
 
 
-@rag_app.post("/add")
-def add_documents(request: AddRequest):
-    embedding_model = app_state.get("embedding_model")
-    if not embedding_model:
-        rag_logger.error("/add called but embedding model not loaded.")
-        raise HTTPException(status_code=503, detail="Embedding model not loaded.")
+def _write_documents(request: AddRequest, operation: str):
+    """Encodes and writes documents with the given collection operation ('add' or 'upsert')."""
+    embedding_model = _require_embedding_model(f"/{operation}")
 
-    collection_to_use = None
     collection_name_log = request.target_collection or "default (project)"
-
-    if request.target_collection == "global":
-        collection_to_use = app_state.get("global_collection")
-        if not collection_to_use:
-            rag_logger.error("/add target 'global' but global collection not loaded/initialized.")
+    collection_to_use = _resolve_target_collection(request.target_collection, request.project_path,
+                                                   request.collection_handle)
+    if not collection_to_use:
+        if request.target_collection == "global":
+            rag_logger.error(f"/{operation} target 'global' but global collection not loaded/initialized.")
             raise HTTPException(status_code=503,
                                 detail="Global RAG collection is not active. Ensure GLOBAL_RAG_DB_PATH is set and valid, then try adding documents to it.")
-    elif request.target_collection == "project":
-        collection_to_use = app_state.get("project_collection")
-        if not collection_to_use:
-            rag_logger.error("/add target 'project' but project collection not set. Use /set_collection first.")
-            raise HTTPException(status_code=503,
-                                detail="No active PROJECT RAG collection. Please use /set_collection for a project first.")
-    else:
-        raise HTTPException(status_code=400,
-                            detail=f"Invalid target_collection: '{request.target_collection}'. Must be 'project' or 'global'.")
+        rag_logger.error(f"/{operation} target 'project' but no project collection given. Use /set_collection or pass project_path.")
+        raise HTTPException(status_code=503,
+                            detail="No active PROJECT RAG collection. Please use /set_collection for a project first.")
 
     docs = request.documents
     if not docs:
         return {"status": "success", "message": "No documents provided to add."}
 
     try:
+        pruned = _prune_replaced_sources(collection_to_use, docs) if request.replace_sources else 0
+        skipped = 0
+        if request.skip_existing:
+            existing = set(collection_to_use.get(ids=[doc.id for doc in docs], include=[])["ids"])
+            skipped = sum(1 for doc in docs if doc.id in existing)
+            docs = [doc for doc in docs if doc.id not in existing]
+
         ids = [doc.id for doc in docs]
         contents = [doc.content for doc in docs]
         metadatas = [doc.metadata for doc in docs]
 
-        rag_logger.info(f"Encoding {len(contents)} documents for '{collection_name_log}' collection...")
-        embeddings = embedding_model.encode(contents, show_progress_bar=False).tolist()  # Batch encode
+        if docs:
+            rag_logger.info(f"Encoding {len(contents)} documents for '{collection_name_log}' collection...")
+            embeddings = embedding_model.encode(contents, show_progress_bar=False).tolist()  # Batch encode
 
-        rag_logger.info(f"Adding {len(docs)} documents to '{collection_name_log}' collection in ChromaDB...")
-        collection_to_use.add(embeddings=embeddings, documents=contents, metadatas=metadatas, ids=ids)
-        rag_logger.info(f"Successfully added {len(docs)} chunks to the '{collection_name_log}' collection.")
-        return {"status": "success", "message": f"Added {len(docs)} documents to '{collection_name_log}' collection."}
+            rag_logger.info(f"Writing ({operation}) {len(docs)} documents to '{collection_name_log}' collection in ChromaDB...")
+            getattr(collection_to_use, operation)(embeddings=embeddings, documents=contents, metadatas=metadatas, ids=ids)
+        if docs or pruned:
+            query_cache.bump_version(_collection_key(collection_to_use))
+        rag_logger.info(f"Successfully wrote {len(docs)} chunks to the '{collection_name_log}' collection "
+                        f"(unchanged: {skipped}, removed stale: {pruned}).")
+        verb = "Added" if operation == "add" else "Upserted"
+        message = f"{verb} {len(docs)} documents to '{collection_name_log}' collection."
+        if skipped or pruned:
+            message += f" {skipped} unchanged chunk(s) kept, {pruned} stale chunk(s) removed."
+        return {"status": "success", "message": message, "written": len(docs), "skipped": skipped, "pruned": pruned}
     except Exception as e:
-        rag_logger.error(f"ERROR during document addition to '{collection_name_log}': {e}", exc_info=True)
+        rag_logger.error(f"ERROR during document {operation} to '{collection_name_log}': {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred during document addition: {str(e)}")
 
 
+def _prune_replaced_sources(collection, docs: List[Document]) -> int:
+    """Deletes stored chunks of the files in docs whose IDs are not among the new chunk IDs."""
+    new_ids = {doc.id for doc in docs}
+    stale_ids = []
+    for full_path in {doc.metadata.get("full_path") for doc in docs if doc.metadata.get("full_path")}:
+        stored = collection.get(where={"full_path": full_path}, include=[])["ids"]
+        stale_ids.extend(doc_id for doc_id in stored if doc_id not in new_ids)
+    if stale_ids:
+        collection.delete(ids=stale_ids)
+    return len(stale_ids)
+
+
+@rag_app.post("/add")
+def add_documents(request: AddRequest):
+    return _write_documents(request, "add")
+
+
+@rag_app.post("/upsert")
+def upsert_documents(request: AddRequest):
+    """Like /add, but replaces documents whose IDs already exist instead of failing."""
+    return _write_documents(request, "upsert")
+
+
+@rag_app.post("/bulk_add")
+def bulk_add_documents(request: AddRequest):
+    """
+    Bulk variant of /add for large ingests (e.g. a global code-example library):
+    chunks are encoded on a pool of worker processes and upserted in order.
+    """
+    collection_name_log = request.target_collection or "default (project)"
+    collection_to_use = _resolve_target_collection(request.target_collection, request.project_path,
+                                                   request.collection_handle)
+    if not collection_to_use:
+        raise HTTPException(status_code=503, detail=f"The '{collection_name_log}' RAG collection is not active.")
+    docs = request.documents
+    if not docs:
+        return {"status": "success", "message": "No documents provided to add."}
+
+    try:
+        with bulk_encoder_lock:
+            written = _bulk_write(collection_to_use, [doc.id for doc in docs], [doc.content for doc in docs],
+                                  [doc.metadata for doc in docs], _get_bulk_encoder())
+        return {"status": "success", "message": f"Bulk-added {written} documents to '{collection_name_log}' collection."}
+    except Exception as e:
+        rag_logger.error(f"ERROR during bulk addition to '{collection_name_log}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred during bulk addition: {str(e)}")
+
+
+@rag_app.post("/delete")
+def delete_documents(request: DeleteRequest):
+    if not request.ids and not request.where:
+        raise HTTPException(status_code=400, detail="Provide 'ids' and/or a 'where' filter to delete documents.")
+
+    collection_name_log = request.target_collection or "default (project)"
+    collection_to_use = _resolve_target_collection(request.target_collection, request.project_path,
+                                                   request.collection_handle)
+    if not collection_to_use:
+        raise HTTPException(status_code=503, detail=f"The '{collection_name_log}' RAG collection is not active.")
+
+    try:
+        collection_to_use.delete(ids=request.ids, where=request.where)
+        query_cache.bump_version(_collection_key(collection_to_use))
+        rag_logger.info(f"Deleted documents from '{collection_name_log}' (ids={len(request.ids or [])}, where={request.where}).")
+        return {"status": "success", "message": f"Deleted matching documents from '{collection_name_log}' collection."}
+    except Exception as e:
+        rag_logger.error(f"ERROR during document deletion from '{collection_name_log}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred during document deletion: {str(e)}")
+
+
+@rag_app.post("/export")
+def export_collection(request: ExportRequest):
+    """Packs a collection's ids, texts, metadata and float16 embeddings into one snapshot file."""
+    collection_name_log = request.target_collection or "default (project)"
+    collection_to_use = _resolve_target_collection(request.target_collection, request.project_path,
+                                                   request.collection_handle)
+    if not collection_to_use:
+        raise HTTPException(status_code=503, detail=f"The '{collection_name_log}' RAG collection is not active.")
+    try:
+        header = export_snapshot(collection_to_use, Path(request.output_path), MODEL_NAME)
+        return {"status": "success", "output_path": request.output_path, **header}
+    except Exception as e:
+        rag_logger.error(f"ERROR exporting '{collection_name_log}' to {request.output_path}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred during export: {str(e)}")
+
+
+@rag_app.post("/import")
+def import_collection(request: ImportRequest):
+    """
+    Bulk-loads a snapshot using its stored embeddings. A snapshot embedded
+    with a different model is refused (409) unless reembed is set.
+    """
+    collection_name_log = request.target_collection or "default (project)"
+    if not Path(request.snapshot_path).is_file():
+        raise HTTPException(status_code=400, detail=f"Snapshot file not found: {request.snapshot_path}")
+    collection_to_use = _resolve_target_collection(request.target_collection, request.project_path,
+                                                   request.collection_handle)
+    if not collection_to_use:
+        raise HTTPException(status_code=503, detail=f"The '{collection_name_log}' RAG collection is not active.")
+
+    reembed = None
+    if request.reembed:
+        embedding_model = _require_embedding_model("/import")
+        reembed = lambda texts: embedding_model.encode(texts, show_progress_bar=False)
+    try:
+        header = import_snapshot(collection_to_use, Path(request.snapshot_path), MODEL_NAME, reembed=reembed)
+    except SnapshotModelMismatch as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except SnapshotError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        rag_logger.error(f"ERROR importing {request.snapshot_path} into '{collection_name_log}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred during import: {str(e)}")
+    finally:
+        query_cache.bump_version(_collection_key(collection_to_use))
+    rag_logger.info(f"Imported {header['count']} records into '{collection_name_log}' from {request.snapshot_path}.")
+    return {"status": "success", **header}
+
+
+def _resolve_query_targets(target_collection: Optional[Union[str, List[str]]]) -> List[str]:
+    """Normalizes a query's target into a de-duplicated list of 'project' / 'global'."""
+    if isinstance(target_collection, list):
+        targets = target_collection
+    elif target_collection == "both":
+        targets = list(VALID_TARGETS)
+    else:
+        targets = [target_collection or "project"]
+
+    resolved = []
+    for target in targets:
+        if target not in VALID_TARGETS:
+            raise HTTPException(status_code=400,
+                                detail=f"Invalid target_collection: '{target}'. Must be 'project', 'global' or 'both'.")
+        if target not in resolved:
+            resolved.append(target)
+    if not resolved:
+        raise HTTPException(status_code=400, detail="target_collection list cannot be empty.")
+    return resolved
+
+
+def _path_prefix_filter(path_prefixes: List[str]) -> Dict[str, Any]:
+    """
+    Builds a metadata filter for project-relative path prefixes. Chunks carry
+    'rel_path' plus a 'dir:<ancestor>' flag per ancestor directory, so both
+    exact files and whole directories can be matched without a prefix operator.
+    """
+    clauses = []
+    for prefix in path_prefixes:
+        normalized = prefix.replace("\\", "/").strip().strip("/")
+        if normalized.startswith("./"):
+            normalized = normalized[2:]
+        if normalized:
+            clauses.extend([{"rel_path": normalized}, {f"{PATH_DIR_KEY_PREFIX}{normalized}": True}])
+    if not clauses:
+        return {}
+    return {"$or": clauses}
+
+
+def _combine_filters(*filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    active = [f for f in filters if f]
+    if not active:
+        return None
+    return active[0] if len(active) == 1 else {"$and": active}
+
+
+def _query_collection(collection, query_embedding: List[float], n_results: int, source: str,
+                      where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Runs one similarity search and returns its hits in rank order, labelled with their source."""
+    query_kwargs: Dict[str, Any] = {}
+    if where:
+        query_kwargs["where"] = where
+    results = collection.query(
+        query_embeddings=[query_embedding],
+        n_results=n_results,
+        include=['documents', 'metadatas', 'distances'],
+        **query_kwargs
+    )
+    ids = results.get('ids', [[]])[0]
+    documents = results.get('documents', [[]])[0]
+    metadatas_list = results.get('metadatas', [[]])[0] if results.get('metadatas') else []
+    distances = results.get('distances', [[]])[0] if results.get('distances') else []
+
+    hits = []
+    for i, doc_content in enumerate(documents):
+        hits.append({
+            "id": ids[i] if i < len(ids) else f"{source}_{i}",
+            "text": doc_content,
+            "metadata": (metadatas_list[i] if i < len(metadatas_list) else None) or {},
+            "distance": distances[i] if i < len(distances) else None,
+            "source_collection": source,
+        })
+    return hits
+
+
+def _reciprocal_rank_fusion(ranked_lists: Dict[str, List[Dict[str, Any]]], n_results: int, rrf_k: int,
+                            source_quotas: Optional[Dict[str, int]], deduplicate: bool) -> List[Dict[str, Any]]:
+    """
+    Merges per-source rankings with reciprocal-rank fusion: each hit scores
+    sum(1 / (rrf_k + rank)) over the lists it appears in. Distances from
+    different collections are not comparable, ranks are.
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for source, hits in ranked_lists.items():
+        for rank, hit in enumerate(hits, start=1):
+            key = hashlib.sha1(hit["text"].strip().encode("utf-8")).hexdigest() if deduplicate else (source, hit["id"])
+            entry = fused.get(key)
+            if entry is None:
+                entry = dict(hit, score=0.0, sources=[])
+                fused[key] = entry
+            entry["score"] += 1.0 / (rrf_k + rank)
+            if source not in entry["sources"]:
+                entry["sources"].append(source)
+
+    quotas = source_quotas or {}
+    taken_per_source: Dict[str, int] = {}
+    merged = []
+    for entry in sorted(fused.values(), key=lambda e: e["score"], reverse=True):
+        primary_source = entry["source_collection"]
+        quota = quotas.get(primary_source)
+        if quota is not None and taken_per_source.get(primary_source, 0) >= quota:
+            continue
+        taken_per_source[primary_source] = taken_per_source.get(primary_source, 0) + 1
+        merged.append(entry)
+        if len(merged) >= n_results:
+            break
+    return merged
+
+
+def _to_query_hits(hits: List[Dict[str, Any]], rrf_k: int) -> List[QueryHit]:
+    query_hits = []
+    for rank, hit in enumerate(hits, start=1):
+        metadata = hit["metadata"]
+        query_hits.append(QueryHit(
+            id=hit["id"],
+            text=hit["text"],
+            score=hit.get("score", 1.0 / (rrf_k + rank)),
+            distance=hit.get("distance"),
+            source=metadata.get("full_path") or metadata.get("source", "Unknown Source"),
+            source_collection="+".join(hit.get("sources") or [hit["source_collection"]]),
+            start_line=metadata.get("start_line"),
+            end_line=metadata.get("end_line"),
+            metadata=metadata,
+        ))
+    return query_hits
+
+
+def _format_context(hits: List[Dict[str, Any]], label_sources: bool) -> str:
+    context_parts = []
+    for i, hit in enumerate(hits):
+        source_file = hit["metadata"].get("source", "Unknown Source")
+        origin = f", source: {'+'.join(hit.get('sources') or [hit['source_collection']])}" if label_sources else ""
+        context_parts.append(f"--- Relevant Snippet {i + 1} (from: {source_file}{origin}) ---\n{hit['text']}")
+    return "\n\n".join(context_parts).strip()
+
+
+def _search_collections(request: QueryRequest, collections: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Embeds the query once and searches every collection, fusing results when there are several."""
+    embedding_model = app_state["embedding_model"]
+    query_embedding = embedding_model.encode(request.query_text).tolist()
+    path_filter = _path_prefix_filter(request.path_prefixes) if request.path_prefixes else None
+    filters = {source: _combine_filters(request.where, path_filter if source == "project" else None)
+               for source in collections}
+    if len(collections) == 1:
+        source, collection = next(iter(collections.items()))
+        return _query_collection(collection, query_embedding, request.n_results, source, filters[source])
+
+    quotas = request.source_quotas or {}
+    futures = {
+        source: query_executor.submit(_query_collection, collection, query_embedding,
+                                      max(request.n_results, quotas.get(source, 0)), source, filters[source])
+        for source, collection in collections.items()
+    }
+    ranked_lists = {source: future.result() for source, future in futures.items()}
+    return _reciprocal_rank_fusion(ranked_lists, request.n_results, request.rrf_k,
+                                   request.source_quotas, request.deduplicate)
+
+
 @rag_app.post("/query", response_model=QueryResponse)
 def query_rag(request: QueryRequest) -> QueryResponse:
-    embedding_model = app_state.get("embedding_model")
-    if not embedding_model:
-        rag_logger.error("/query called but embedding model not loaded.")
-        raise HTTPException(status_code=503, detail="Embedding model not loaded.")
+    _require_embedding_model("/query")
 
-    collection_to_query = None
-    collection_name_for_log = request.target_collection or "default (project)"
+    targets = _resolve_query_targets(request.target_collection)
+    collection_name_for_log = "+".join(targets)
+    collections = {}
+    skipped_sources: Dict[str, str] = {}
+    for target in targets:
+        try:
+            collection = _resolve_target_collection(target, request.project_path, request.collection_handle)
+        except HTTPException as e:
+            if len(targets) == 1:
+                raise
+            # A fused query degrades to the sources that resolve instead of failing outright.
+            rag_logger.warning(f"Fused query skipped the '{target}' collection: {e.detail}")
+            skipped_sources[target] = str(e.detail)
+            continue
+        if collection:
+            collections[target] = collection
+        else:
+            rag_logger.warning(f"Query targeted '{target}' collection, but it's not active.")
+            if len(targets) > 1:
+                skipped_sources[target] = "not active"
 
-    if request.target_collection == "global":
-        collection_to_query = app_state.get("global_collection")
-        if not collection_to_query:
-            rag_logger.warning("Query targeted 'global' collection, but it's not loaded.")
+    if not collections:
+        if targets == ["global"]:
             return QueryResponse(context="Global knowledge base is not active.", source_collection="global")
-    elif request.target_collection == "project":
-        collection_to_query = app_state.get("project_collection")
-        if not collection_to_query:
-            rag_logger.warning("Query targeted 'project' collection, but no project context is set.")
+        if targets == ["project"]:
             return QueryResponse(context="No knowledge base is active for the current project.",
                                  source_collection="project")
-    else:
-        raise HTTPException(status_code=400,
-                            detail=f"Invalid target_collection: '{request.target_collection}'. Must be 'project' or 'global'.")
+        return QueryResponse(context="No knowledge base is active for the requested collections.",
+                             source_collection=collection_name_for_log, skipped_sources=skipped_sources)
+
+    if skipped_sources:
+        collection_name_for_log = "+".join(collections)
 
     try:
-        query_embedding = embedding_model.encode(request.query_text).tolist()
-        results = collection_to_query.query(
-            query_embeddings=[query_embedding],
-            n_results=request.n_results,
-            include=['documents', 'metadatas']  # Ensure metadatas are included
+        cache_key = (
+            tuple((source, _collection_key(c), query_cache.collection_version(_collection_key(c)))
+                  for source, c in collections.items()),
+            hashlib.sha1(request.query_text.encode("utf-8")).hexdigest(),
+            request.n_results,
+            json.dumps({"quotas": request.source_quotas, "dedup": request.deduplicate, "rrf_k": request.rrf_k,
+                        "where": request.where, "paths": request.path_prefixes}, sort_keys=True)
         )
+        hits = query_cache.get(cache_key)
+        if hits is None:
+            hits = _search_collections(request, collections)
+            query_cache.put(cache_key, hits)
+        else:
+            rag_logger.debug(f"Query cache hit for '{collection_name_for_log}'.")
 
-        documents = results.get('documents', [[]])[0]
-        metadatas_list = results.get('metadatas', [[]])[0] if results.get('metadatas') else [{} for _ in documents]
-
-        if not documents:
+        if not hits:
             return QueryResponse(
                 context=f"No relevant documents found in the {collection_name_for_log} knowledge base for this query.",
-                source_collection=collection_name_for_log
+                source_collection=collection_name_for_log,
+                hits=[] if request.return_hits else None,
+                skipped_sources=skipped_sources
             )
 
-        context_parts = []
-        for i, doc_content in enumerate(documents):
-            source_file = "Unknown Source"
-            # Ensure metadatas_list[i] is not None before accessing
-            if i < len(metadatas_list) and metadatas_list[i] is not None and 'source' in metadatas_list[i]:
-                source_file = metadatas_list[i]['source']
-            context_parts.append(f"--- Relevant Snippet {i + 1} (from: {source_file}) ---\n{doc_content}")
-
-        context_str = "\n\n".join(context_parts)
-        rag_logger.info(f"Query to '{collection_name_for_log}' collection returned {len(documents)} results.")
-        return QueryResponse(context=context_str.strip(), source_collection=collection_name_for_log)
+        context_str = _format_context(hits, label_sources=len(targets) > 1)
+        rag_logger.info(f"Query to '{collection_name_for_log}' collection(s) returned {len(hits)} results.")
+        return QueryResponse(context=context_str, source_collection=collection_name_for_log,
+                             hits=_to_query_hits(hits, request.rrf_k) if request.return_hits else None,
+                             skipped_sources=skipped_sources)
     except Exception as e:
         rag_logger.error(f"ERROR during query of '{collection_name_for_log}': {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred during the query: {str(e)}")
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Kintsugi AvA RAG server")
+    parser.add_argument("--benchmark-embeddings", action="store_true",
+                        help="Report sentences/second for each embedding backend and exit.")
+    parser.add_argument("--benchmark-sentences", type=int, default=2000)
+    parser.add_argument("--backends", default="torch,onnx", help="Comma-separated backends to benchmark.")
+    parser.add_argument("--bulk-ingest", metavar="JSONL",
+                        help="Encode documents from a JSONL file on a worker pool and write them, then exit.")
+    parser.add_argument("--target", default="global", choices=["project", "global"])
+    parser.add_argument("--migrate-collection", metavar="DB_PATH",
+                        help="Copy the --target collection in DB_PATH to the --to backend and switch to it, then exit.")
+    parser.add_argument("--to", choices=list(VECTOR_BACKENDS), default="flat")
+    parser.add_argument("--export-snapshot", metavar="FILE",
+                        help="Write the --target collection to a snapshot file, then exit.")
+    parser.add_argument("--import-snapshot", metavar="FILE",
+                        help="Load a snapshot file into the --target collection, then exit.")
+    parser.add_argument("--reembed", action="store_true",
+                        help="With --import-snapshot: re-encode texts if the snapshot used another model.")
+    parser.add_argument("--reshard-global", type=int, metavar="N",
+                        help="Rebuild the global KB at GLOBAL_RAG_DB_PATH as N hash shards, then exit.")
+    parser.add_argument("--benchmark-vector-backends", action="store_true",
+                        help="Compare Chroma and the flat index on synthetic collections and exit.")
+    parser.add_argument("--vector-sizes", default="1000,10000,100000",
+                        help="Comma-separated collection sizes for --benchmark-vector-backends.")
+    parser.add_argument("--project-path", help="Project directory when --target is 'project'.")
+    args = parser.parse_args()
+
+    if args.bulk_ingest:
+        count = run_bulk_ingest(Path(args.bulk_ingest), args.target, args.project_path)
+        rag_logger.info(f"Bulk ingest complete: {count} documents written to '{args.target}'.")
+        sys.exit(0)
+
+    if args.migrate_collection:
+        name = GLOBAL_COLLECTION_NAME if args.target == "global" else PROJECT_COLLECTION_NAME
+        count = migrate_collection(Path(args.migrate_collection), name, args.to)
+        rag_logger.info(f"Migrated {count} documents of '{name}' to the {args.to} backend.")
+        sys.exit(0)
+
+    if args.export_snapshot or args.import_snapshot:
+        if args.target == "global":
+            _load_global_collection()
+            snapshot_collection = app_state.get("global_collection")
+        else:
+            snapshot_collection = _open_project_collection(args.project_path)["collection"]
+        if snapshot_collection is None:
+            rag_logger.error(f"The '{args.target}' collection could not be opened.")
+            sys.exit(1)
+        try:
+            if args.export_snapshot:
+                print(json.dumps(export_snapshot(snapshot_collection, Path(args.export_snapshot), MODEL_NAME), indent=2))
+            else:
+                backend = _create_configured_backend() if args.reembed else None
+                reembed = (lambda texts: backend.encode(texts, show_progress_bar=False)) if backend else None
+                print(json.dumps(import_snapshot(snapshot_collection, Path(args.import_snapshot), MODEL_NAME,
+                                                 reembed=reembed), indent=2))
+        except SnapshotError as e:
+            rag_logger.error(str(e))
+            sys.exit(1)
+        finally:
+            _close_collection(snapshot_collection)
+        sys.exit(0)
+
+    if args.reshard_global:
+        if not os.getenv("GLOBAL_RAG_DB_PATH"):
+            rag_logger.error("--reshard-global needs GLOBAL_RAG_DB_PATH to be set.")
+            sys.exit(1)
+        count = reshard_collection(Path(os.environ["GLOBAL_RAG_DB_PATH"]), GLOBAL_COLLECTION_NAME,
+                                   GLOBAL_VECTOR_BACKEND, args.reshard_global)
+        rag_logger.info(f"Resharded {count} global documents into {args.reshard_global} shard(s).")
+        sys.exit(0)
+
+    if args.benchmark_vector_backends:
+        sizes = [int(size) for size in args.vector_sizes.split(",") if size.strip()]
+        print(json.dumps(benchmark_vector_backends(sizes), indent=2))
+        sys.exit(0)
+
+    if args.benchmark_embeddings:
+        report = benchmark_backends(MODEL_NAME, [b.strip() for b in args.backends.split(",") if b.strip()],
+                                    n_sentences=args.benchmark_sentences, threads=EMBEDDING_THREADS)
+        print(json.dumps(report, indent=2))
+        sys.exit(0)
+
     # Example for testing: Ensure GLOBAL_RAG_DB_PATH points to a directory.
     # The directory will be created by ChromaDB if it doesn't exist.
     # global_db_test_path = Path(__file__).parent.parent / "test_global_rag_db" # Example path
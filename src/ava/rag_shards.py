@@ -0,0 +1,277 @@
+# rag_shards.py
+# Hash-partitioned global knowledge base. Each shard is an ordinary collection
+# (Chroma or flat) owned by its own worker process; ShardedCollection routes
+# writes by document ID and fans queries out to every shard, merging the
+# partial top-k lists by distance. It exposes the same collection API as a
+# single collection, so the server treats both alike.
+
+import json
+import zlib
+import logging
+import threading
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+
+from rag_flat_index import open_collection
+
+rag_logger = logging.getLogger("RAGServer")
+
+SHARD_LAYOUT_FILE = "shards.json"  # Records the shard count a global DB directory was built with
+
+
+def shard_for_id(doc_id: str, shard_count: int) -> int:
+    """Stable across processes and runs, unlike hash() on str."""
+    return zlib.crc32(doc_id.encode("utf-8")) % shard_count
+
+
+def read_shard_count(db_path: Path) -> Optional[int]:
+    layout_file = Path(db_path) / SHARD_LAYOUT_FILE
+    if not layout_file.exists():
+        return None
+    return int(json.loads(layout_file.read_text(encoding="utf-8"))["shards"])
+
+
+def write_shard_count(db_path: Path, shard_count: int):
+    (Path(db_path) / SHARD_LAYOUT_FILE).write_text(json.dumps({"shards": shard_count}), encoding="utf-8")
+
+
+def _shard_directory(db_path: Path, shard_count: int, index: int) -> Path:
+    return Path(db_path) / f"shards_{shard_count}" / f"shard_{index:02d}"
+
+
+def _shard_worker(conn, db_path: str, collection_name: str, default_backend: str):
+    """Owns one shard's collection and executes (method, kwargs) requests from the parent."""
+    _, collection = open_collection(Path(db_path), collection_name, default_backend)
+    while True:
+        try:
+            method, kwargs = conn.recv()
+        except EOFError:
+            break
+        if method == "close":
+            if hasattr(collection, "close"):
+                collection.close()
+            conn.send(("ok", None))
+            break
+        try:
+            conn.send(("ok", getattr(collection, method)(**kwargs)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class ShardedCollection:
+    """
+    A collection split into shard_count hash partitions, each served by a
+    worker process so searches run on several cores at once.
+    """
+
+    def __init__(self, db_path: Path, collection_name: str, shard_count: int, default_backend: str = "chroma"):
+        self.db_path = Path(db_path)
+        self.name = collection_name
+        self.shard_count = shard_count
+        self.id = f"{collection_name}:sharded:{shard_count}:{self.db_path.resolve()}"
+        context = multiprocessing.get_context("spawn")
+        self._connections = []
+        self._processes = []
+        self._locks = []
+        for index in range(shard_count):
+            shard_dir = _shard_directory(self.db_path, shard_count, index)
+            shard_dir.mkdir(parents=True, exist_ok=True)
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_shard_worker, name=f"rag-shard-{index}", daemon=True,
+                                      args=(child_conn, str(shard_dir), collection_name, default_backend))
+            process.start()
+            self._connections.append(parent_conn)
+            self._processes.append(process)
+            self._locks.append(threading.Lock())
+        self._executor = ThreadPoolExecutor(max_workers=shard_count, thread_name_prefix="rag-shard")
+        rag_logger.info(f"Started {shard_count} shard workers for '{collection_name}' in {self.db_path}.")
+
+    def _call(self, index: int, method: str, **kwargs) -> Any:
+        with self._locks[index]:
+            self._connections[index].send((method, kwargs))
+            status, payload = self._connections[index].recv()
+        if status == "error":
+            raise RuntimeError(f"Shard {index} failed on {method}: {payload}")
+        return payload
+
+    def _fan_out(self, method: str, **kwargs) -> List[Any]:
+        futures = [self._executor.submit(self._call, index, method, **kwargs) for index in range(self.shard_count)]
+        return [future.result() for future in futures]
+
+    def _route(self, ids: List[str]) -> Dict[int, List[int]]:
+        """Groups positions in ids by the shard each ID belongs to."""
+        positions: Dict[int, List[int]] = {}
+        for position, doc_id in enumerate(ids):
+            positions.setdefault(shard_for_id(doc_id, self.shard_count), []).append(position)
+        return positions
+
+    def _write(self, method: str, ids: List[str], embeddings, documents: Optional[List[str]],
+               metadatas: Optional[List[Dict[str, Any]]]):
+        futures = []
+        for index, positions in self._route(ids).items():
+            futures.append(self._executor.submit(
+                self._call, index, method,
+                ids=[ids[p] for p in positions],
+                embeddings=[embeddings[p] for p in positions],
+                documents=[documents[p] for p in positions] if documents else None,
+                metadatas=[metadatas[p] for p in positions] if metadatas else None))
+        for future in futures:
+            future.result()
+
+    # --- Collection API ---
+    def count(self) -> int:
+        return sum(self._fan_out("count"))
+
+    def add(self, ids: List[str], embeddings, documents: Optional[List[str]] = None,
+            metadatas: Optional[List[Dict[str, Any]]] = None):
+        self._write("add", ids, embeddings, documents, metadatas)
+
+    def upsert(self, ids: List[str], embeddings, documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Dict[str, Any]]] = None):
+        self._write("upsert", ids, embeddings, documents, metadatas)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        if ids and not where:
+            futures = [self._executor.submit(self._call, index, "delete", ids=[ids[p] for p in positions])
+                       for index, positions in self._route(ids).items()]
+            for future in futures:
+                future.result()
+            return
+        self._fan_out("delete", ids=ids, where=where)
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: int = 0, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Pages through the shards in order, so offset/limit paging visits every
+        record once. With an ids or where filter, a shard's matching IDs are
+        counted first so the offset skips exactly the matches before the page.
+        """
+        include = include if include is not None else ["documents", "metadatas"]
+        result: Dict[str, Any] = {"ids": []}
+        for key in include:
+            result[key] = []
+        remaining = limit
+        for index in range(self.shard_count):
+            if remaining is not None and remaining <= 0:
+                break
+            if ids is None and where is None:
+                shard_count = self._call(index, "count")
+            elif offset:
+                shard_count = len(self._call(index, "get", ids=ids, where=where, include=[])["ids"])
+            else:
+                shard_count = None
+            if shard_count is not None and offset >= shard_count:
+                offset -= shard_count
+                continue
+            part = self._call(index, "get", ids=ids, where=where, limit=remaining, offset=offset, include=include)
+            offset = 0
+            result["ids"].extend(part["ids"])
+            for key in include:
+                if part.get(key) is not None:  # Embeddings come back as an array; avoid its truthiness
+                    result[key].extend(list(part[key]))
+            if remaining is not None:
+                remaining -= len(part["ids"])
+        return result
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None, include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Asks every shard for its top n_results and keeps the n_results closest overall."""
+        include = include or ["documents", "metadatas", "distances"]
+        shard_include = sorted(set(include) | {"distances"})
+        kwargs: Dict[str, Any] = {"query_embeddings": query_embeddings, "n_results": n_results,
+                                  "include": shard_include}
+        if where:
+            kwargs["where"] = where
+        partials = self._fan_out("query", **kwargs)
+
+        result: Dict[str, Any] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query_index in range(len(query_embeddings)):
+            merged: List[Tuple[float, str, Any, Any]] = []
+            for partial in partials:
+                ids = partial["ids"][query_index]
+                distances = partial["distances"][query_index]
+                documents = (partial.get("documents") or [[None] * len(ids)] * len(query_embeddings))[query_index]
+                metadatas = (partial.get("metadatas") or [[None] * len(ids)] * len(query_embeddings))[query_index]
+                merged.extend(zip(distances, ids, documents, metadatas))
+            merged.sort(key=lambda item: item[0])
+            top = merged[:n_results]
+            result["distances"].append([item[0] for item in top])
+            result["ids"].append([item[1] for item in top])
+            result["documents"].append([item[2] for item in top])
+            result["metadatas"].append([item[3] for item in top])
+        for key in ("documents", "metadatas", "distances"):
+            if key not in include:
+                result[key] = None
+        return result
+
+    def close(self):
+        for index, process in enumerate(self._processes):
+            if process.is_alive():
+                try:
+                    self._call(index, "close")
+                except (OSError, EOFError, RuntimeError):
+                    pass
+            process.join(timeout=10)
+        self._executor.shutdown(wait=False)
+
+
+def open_global_collection(db_path: Path, collection_name: str, default_backend: str, shard_count: int):
+    """
+    Opens the global collection with the shard layout recorded in db_path.
+    A new DB directory takes shard_count; an existing one keeps its layout
+    until it is resharded, so a config change never hides existing data.
+    Returns (chroma_client, collection) like open_collection.
+    """
+    recorded = read_shard_count(db_path)
+    if recorded is None:
+        has_unsharded_data = any(Path(db_path).iterdir())
+        recorded = 1 if has_unsharded_data else shard_count
+        write_shard_count(db_path, recorded)
+    if recorded != shard_count:
+        rag_logger.warning(f"Global KB in {db_path} has {recorded} shard(s) but RAG_GLOBAL_SHARDS={shard_count}. "
+                           f"Keeping {recorded}; run rag_server.py --reshard-global {shard_count} to change it.")
+    if recorded == 1:
+        return open_collection(db_path, collection_name, default_backend)
+    return None, ShardedCollection(db_path, collection_name, recorded, default_backend)
+
+
+def reshard_collection(db_path: Path, collection_name: str, default_backend: str, new_count: int,
+                       batch_size: int = 2048) -> int:
+    """
+    Copies the global collection, with its stored embeddings, into a layout
+    of new_count shards and switches the DB directory to it. The old layout is
+    left on disk until removed by hand.
+    """
+    db_path = Path(db_path)
+    _, source = open_global_collection(db_path, collection_name, default_backend,
+                                       read_shard_count(db_path) or 1)
+    if new_count == 1:
+        target_dir = db_path / "shards_1"
+        target_dir.mkdir(parents=True, exist_ok=True)
+        _, target = open_collection(target_dir, collection_name, default_backend)
+    else:
+        target = ShardedCollection(db_path, collection_name, new_count, default_backend)
+
+    copied = 0
+    total = source.count()
+    try:
+        while copied < total:
+            batch = source.get(limit=batch_size, offset=copied, include=["documents", "metadatas", "embeddings"])
+            if not batch["ids"]:
+                break
+            target.upsert(ids=batch["ids"], embeddings=[list(map(float, e)) for e in batch["embeddings"]],
+                          documents=batch["documents"], metadatas=batch["metadatas"])
+            copied += len(batch["ids"])
+            rag_logger.info(f"Resharding '{collection_name}' into {new_count}: {copied}/{total}")
+    finally:
+        for collection in (source, target):
+            if hasattr(collection, "close"):
+                collection.close()
+
+    if new_count == 1:
+        rag_logger.warning(f"Single-shard copy written to {db_path / 'shards_1'}; point GLOBAL_RAG_DB_PATH there.")
+    else:
+        write_shard_count(db_path, new_count)
+    return copied
@@ -0,0 +1,149 @@
+# rag_snapshots.py
+# Portable knowledge-base snapshots: a collection's ids, texts, metadata and
+# float16 embeddings packed into one compressed NPZ file, so a shared library
+# is embedded once and loaded everywhere else without re-encoding.
+
+import json
+import hashlib
+import logging
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+import numpy as np
+
+rag_logger = logging.getLogger("RAGServer")
+
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_ARRAYS = ("ids_data", "ids_offsets", "texts_data", "texts_offsets", "metadata_data", "metadata_offsets",
+                   "embeddings")
+
+
+class SnapshotError(ValueError):
+    """Raised for unreadable, corrupted or incompatible snapshot files."""
+
+
+class SnapshotModelMismatch(SnapshotError):
+    """Raised when a snapshot was embedded with a different model and re-embedding was not requested."""
+
+
+def _pack_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Stores strings as one UTF-8 byte buffer plus offsets; avoids pickled object arrays."""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(e) for e in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    raw = data.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+def _checksum(arrays: Dict[str, np.ndarray]) -> str:
+    digest = hashlib.sha256()
+    for name in SNAPSHOT_ARRAYS:
+        digest.update(name.encode("utf-8"))
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    return digest.hexdigest()
+
+
+def export_snapshot(collection, output_path: Path, model_name: str, batch_size: int = 5000) -> Dict[str, Any]:
+    """
+    Writes every record of collection to output_path. Returns the snapshot
+    header (format version, model, count, dimension, checksum).
+    """
+    ids: List[str] = []
+    texts: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    embedding_blocks: List[np.ndarray] = []
+    total = collection.count()
+    while len(ids) < total:
+        batch = collection.get(limit=batch_size, offset=len(ids), include=["documents", "metadatas", "embeddings"])
+        if not batch["ids"]:
+            break
+        ids.extend(batch["ids"])
+        texts.extend(text or "" for text in batch["documents"])
+        metadatas.extend(metadata or {} for metadata in batch["metadatas"])
+        embedding_blocks.append(np.asarray(batch["embeddings"], dtype=np.float16))
+        rag_logger.info(f"Exporting snapshot: {len(ids)}/{total}")
+
+    embeddings = np.concatenate(embedding_blocks) if embedding_blocks else np.zeros((0, 0), dtype=np.float16)
+    arrays: Dict[str, np.ndarray] = {}
+    arrays["ids_data"], arrays["ids_offsets"] = _pack_strings(ids)
+    arrays["texts_data"], arrays["texts_offsets"] = _pack_strings(texts)
+    arrays["metadata_data"], arrays["metadata_offsets"] = _pack_strings([json.dumps(m) for m in metadatas])
+    arrays["embeddings"] = embeddings
+
+    header = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "model_name": model_name,
+        "count": len(ids),
+        "dim": int(embeddings.shape[1]) if embeddings.size else 0,
+        "checksum": _checksum(arrays),
+    }
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "wb") as handle:
+        np.savez_compressed(handle, header=np.frombuffer(json.dumps(header).encode("utf-8"), dtype=np.uint8), **arrays)
+    rag_logger.info(f"Exported {len(ids)} records to snapshot {output_path}.")
+    return header
+
+
+def read_snapshot_header(snapshot_path: Path) -> Dict[str, Any]:
+    with np.load(snapshot_path, allow_pickle=False) as snapshot:
+        return json.loads(snapshot["header"].tobytes().decode("utf-8"))
+
+
+def import_snapshot(collection, snapshot_path: Path, model_name: str,
+                    reembed: Optional[Callable[[List[str]], np.ndarray]] = None,
+                    batch_size: int = 4096) -> Dict[str, Any]:
+    """
+    Upserts a snapshot into collection using its stored embeddings.
+
+    Args:
+        collection: Target collection (Chroma, flat or sharded).
+        snapshot_path: File written by export_snapshot.
+        model_name: Embedding model the target collection is queried with.
+        reembed: Encoder used when the snapshot's model differs from model_name.
+            Without it, a mismatch raises SnapshotModelMismatch.
+
+    Returns:
+        The snapshot header, plus 'reembedded'.
+    """
+    try:
+        snapshot = np.load(snapshot_path, allow_pickle=False)
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"Cannot read snapshot {snapshot_path}: {e}")
+
+    with snapshot:
+        header = json.loads(snapshot["header"].tobytes().decode("utf-8"))
+        if header.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot format version {header.get('format_version')}.")
+        arrays = {name: snapshot[name] for name in SNAPSHOT_ARRAYS}
+
+    if _checksum(arrays) != header.get("checksum"):
+        raise SnapshotError(f"Checksum mismatch in {snapshot_path}; the file is corrupted or incomplete.")
+
+    reembedded = header.get("model_name") != model_name
+    if reembedded and reembed is None:
+        raise SnapshotModelMismatch(
+            f"Snapshot was embedded with '{header.get('model_name')}' but this server uses '{model_name}'. "
+            f"Import with re-embedding enabled to encode the texts with the local model.")
+
+    ids = _unpack_strings(arrays["ids_data"], arrays["ids_offsets"])
+    texts = _unpack_strings(arrays["texts_data"], arrays["texts_offsets"])
+    metadatas = [json.loads(m) for m in _unpack_strings(arrays["metadata_data"], arrays["metadata_offsets"])]
+    embeddings = arrays["embeddings"]
+
+    for start in range(0, len(ids), batch_size):
+        end = min(start + batch_size, len(ids))
+        if reembedded:
+            batch_embeddings = np.asarray(reembed(texts[start:end]), dtype=np.float32)
+        else:
+            batch_embeddings = embeddings[start:end].astype(np.float32)
+        collection.upsert(ids=ids[start:end], embeddings=batch_embeddings.tolist(),
+                          documents=texts[start:end], metadatas=metadatas[start:end])
+        rag_logger.info(f"Importing snapshot: {end}/{len(ids)}{' (re-embedded)' if reembedded else ''}")
+
+    header["reembedded"] = reembedded
+    return header
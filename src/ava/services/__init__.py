@@ -8,6 +8,7 @@ from .dependency_planner import DependencyPlanner
 from .directory_scanner_service import DirectoryScannerService
 from .generation_coordinator import GenerationCoordinator
 from .import_fixer_service import ImportFixerService
+from .ingestion_pipeline import IngestionPipeline
 from .integration_validator import IntegrationValidator
 from .lsp_client_service import LSPClientService # <-- NEW
 from .project_analyzer import ProjectAnalyzer
@@ -28,6 +29,7 @@ __all__ = [
     "DirectoryScannerService",
     "GenerationCoordinator",
     "ImportFixerService",
+    "IngestionPipeline",
     "IntegrationValidator",
     "LSPClientService", # <-- NEW
     "ProjectAnalyzer",
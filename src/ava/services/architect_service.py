@@ -4,8 +4,9 @@ import asyncio
 import json
 import re
 import os
+import time
 from pathlib import Path
-from typing import TYPE_CHECKING, Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, List, Mapping, Optional
 
 from src.ava.core.event_bus import EventBus
 from src.ava.core.llm_client import LLMClient
@@ -22,7 +23,9 @@ from src.ava.services.generation_coordinator import GenerationCoordinator
 from src.ava.services.context_manager import ContextManager
 from src.ava.services.dependency_planner import DependencyPlanner
 from src.ava.services.integration_validator import IntegrationValidator
-from src.ava.utils.code_summarizer import CodeSummarizer
+from src.ava.services.relevance_index import RelevanceIndex
+from src.ava.utils.code_summarizer import summarize_sources
+from src.ava.utils.rag_context_packer import RAGContextPacker
 
 if TYPE_CHECKING:
     from src.ava.core.managers import ServiceManager
@@ -40,6 +43,12 @@ class ArchitectService:
         self.rag_service = rag_service
         self.project_indexer = project_indexer
         self.import_fixer = import_fixer
+        self.context_packer = RAGContextPacker()
+        self.rag_token_budget = 2000  # Estimated tokens of RAG context sent to the planner
+        self.code_context_token_budget = 12000  # Estimated tokens of project code sent to the modification planner
+        self.always_include_files = ("main.py",)  # Always among the files ranked relevant, when present
+        self.relevance_index = RelevanceIndex()
+        self._relevance_root: Optional[Path] = None
         self.context_manager = ContextManager(service_manager)
         self.dependency_planner = DependencyPlanner(service_manager)
         self.integration_validator = IntegrationValidator(service_manager)
@@ -48,32 +57,44 @@ class ArchitectService:
             self.dependency_planner, self.integration_validator
         )
 
-    async def _get_combined_rag_context(self, prompt: str, is_godot_project: bool = False) -> str:
-        project_rag_context = await self.rag_service.query(prompt, target_collection="project")
+    async def _get_combined_rag_context(self, prompt: str, is_godot_project: bool = False,
+                                        path_prefixes: Optional[List[str]] = None) -> str:
+        """
+        Retrieves and packs RAG context for a prompt. path_prefixes scopes the
+        project collection to the given project-relative files; if that finds
+        nothing (e.g. the files were never ingested) the query is repeated unscoped.
+        """
+        project_path = self.project_manager.active_project_path
+        project_path_str = str(project_path) if project_path else None
 
-        global_rag_context = ""
         # FIX: Also skip global RAG for Unreal C++ projects
         if not is_godot_project and "unreal" not in prompt.lower():
-            self.log("info", "Python project detected. Querying global RAG for Python examples.")
-            global_rag_context = await self.rag_service.query(prompt, target_collection="global")
+            self.log("info", "Python project detected. Querying project and global RAG in one fused request.")
+            query_kwargs = dict(n_results=12, target_collection="both", project_path=project_path_str,
+                                source_quotas={"project": 8, "global": 6})
+            header = ("KNOWLEDGE BASE CONTEXT (each snippet is labelled with its source: 'project' for GDD and "
+                      "existing project files, 'global' for general Python examples & best practices):")
         else:
             self.log("info", "Non-Python project detected. Skipping global (Python) RAG database to avoid confusion.")
-
-        valid_project_context = project_rag_context if "no relevant documents found" not in project_rag_context.lower() and "not running or is unreachable" not in project_rag_context.lower() else ""
-        valid_global_context = global_rag_context if "no relevant documents found" not in global_rag_context.lower() and "not running or is unreachable" not in global_rag_context.lower() else ""
-
-        combined_context_parts = []
-        if valid_project_context:
-            combined_context_parts.append(
-                f"PROJECT-SPECIFIC CONTEXT (e.g., GDD, existing project files):\n{valid_project_context}")
-        if valid_global_context:
-            combined_context_parts.append(
-                f"GENERAL PYTHON EXAMPLES & BEST PRACTICES (GLOBAL CONTEXT):\n{valid_global_context}")
-
-        if not combined_context_parts:
+            query_kwargs = dict(n_results=10, target_collection="project", project_path=project_path_str)
+            header = "PROJECT-SPECIFIC CONTEXT (e.g., GDD, existing project files):"
+
+        hits = []
+        if path_prefixes:
+            hits = await self.rag_service.query_hits(prompt, path_prefixes=path_prefixes, **query_kwargs)
+            if any(hit.get("source_collection", "").startswith("project") for hit in hits):
+                self.log("info", f"RAG retrieval scoped to {len(path_prefixes)} relevant file(s).")
+            else:
+                hits = []
+        if not hits:
+            hits = await self.rag_service.query_hits(prompt, **query_kwargs)
+
+        packed_hits = self.context_packer.pack(hits, self.rag_token_budget)
+        if not packed_hits:
             return "No specific RAG context found for this query."
 
-        return "\n\n---\n\n".join(combined_context_parts)
+        self.log("info", f"Packed {len(packed_hits)}/{len(hits)} RAG hits into a {self.rag_token_budget}-token budget.")
+        return f"{header}\n{self.context_packer.format(packed_hits)}"
 
     async def generate_or_modify(self, prompt: str, existing_files: dict | None,
                                  custom_prompts: Optional[Dict[str, str]] = None) -> bool:
@@ -85,8 +106,12 @@ class ArchitectService:
 
         is_non_python_project = custom_architect_prompt is not None
 
+        # When modifying, retrieval is scoped to the files most relevant to the request.
+        relevant_files = self._rank_relevant_files(prompt, existing_files) if existing_files else None
+
         self.log("info", "Fetching combined RAG context...")
-        combined_rag_context = await self._get_combined_rag_context(prompt, is_godot_project=is_non_python_project)
+        combined_rag_context = await self._get_combined_rag_context(prompt, is_godot_project=is_non_python_project,
+                                                                    path_prefixes=relevant_files)
         self.log("info", f"Combined RAG context length: {len(combined_rag_context)} chars.")
 
         if not existing_files:
@@ -94,7 +119,8 @@ class ArchitectService:
             plan = await self._generate_hierarchical_plan(prompt, combined_rag_context, custom_architect_prompt)
         else:
             self.log("info", "Existing project detected. Using default modification plan...")
-            plan = await self._generate_modification_plan(prompt, existing_files, combined_rag_context)
+            plan = await self._generate_modification_plan(prompt, existing_files, combined_rag_context,
+                                                          relevant_files)
 
         if plan:
             # Pass the custom prompts down to the coordinator
@@ -124,11 +150,17 @@ class ArchitectService:
         plan_prompt = prompt_template.format(prompt=final_user_prompt, rag_context=rag_context)
         return await self._get_plan_from_llm(plan_prompt)
 
-    async def _generate_modification_plan(self, prompt: str, existing_files: dict, rag_context: str) -> dict | None:
+    async def _generate_modification_plan(self, prompt: str, existing_files: dict, rag_context: str,
+                                          relevant_files: Optional[List[str]] = None) -> dict | None:
         self.log("info", "Analyzing existing files to create a modification plan...")
         prompt_template = MODIFICATION_PLANNER_PROMPT
         try:
-            full_code_context_str = self._find_relevant_files(prompt, existing_files)
+            if relevant_files is None:
+                relevant_files = self._rank_relevant_files(prompt, existing_files)
+            # Reading and summarizing many files would stall the GUI thread the event loop runs on.
+            summaries = await asyncio.get_running_loop().run_in_executor(
+                None, self._summarize_other_files, relevant_files, existing_files)
+            full_code_context_str = self._build_code_context(relevant_files, existing_files, summaries)
             enhanced_prompt_for_llm = f"{prompt}\n\nADDITIONAL CONTEXT FROM KNOWLEDGE BASE:\n{rag_context}"
             plan_prompt = prompt_template.format(
                 prompt=enhanced_prompt_for_llm,
@@ -187,8 +219,10 @@ class ArchitectService:
                 self.log("error", "Generation coordinator returned no files.")
                 return False
 
-            self.project_manager.save_files(generated_files)
-            self.log("success", "Project files saved successfully.")
+            changes = self.project_manager.save_files(generated_files)
+            if changes.failed:
+                self.log("warning", f"Could not save: {', '.join(changes.failed)}")
+            self.log("success", f"Project files saved successfully ({changes.summary()}).")
             self.event_bus.emit("code_generation_complete", generated_files)
             return True
         except Exception as e:
@@ -197,32 +231,68 @@ class ArchitectService:
             traceback.print_exc()
             return False
 
-    def _find_relevant_files(self, prompt: str, existing_files: Dict[str, str], top_n: int = 5) -> str:
-        prompt_keywords = set(re.findall(r'\b\w+\b', prompt.lower()))
-        if not prompt_keywords:
-            relevant_files = list(existing_files.items())[:top_n]
-            return "\n\n".join([f"--- File: {fn} ---\n```python\n{co}\n```" for fn, co in relevant_files])
-
-        scored_files = []
-        for filename, content in existing_files.items():
-            score = 0
-            if any(keyword in filename.lower() for keyword in prompt_keywords):
-                score += 10
-            content_lower = content.lower()
-            for keyword in prompt_keywords:
-                score += content_lower.count(keyword)
-            scored_files.append((score, filename, content))
-
-        scored_files.sort(key=lambda x: x[0], reverse=True)
-
-        if 'main.py' in existing_files and not any(f[1] == 'main.py' for f in scored_files[:top_n]):
-            main_content = existing_files['main.py']
-            scored_files.insert(0, (999, 'main.py', main_content))
-
-        top_files = scored_files[:top_n]
-        self.log("info", f"Identified most relevant files for context: {[f[1] for f in top_files]}")
-        return "\n\n".join(
-            [f"--- File: {filename} ---\n```python\n{content}\n```" for score, filename, content in top_files])
+    @staticmethod
+    def _summarize_other_files(relevant_files: List[str], existing_files: Dict[str, str]) -> Dict[str, str]:
+        """Structural summaries of the Python files not in relevant_files. Safe to run off the event loop."""
+        return summarize_sources({filename: existing_files[filename] for filename in existing_files
+                                  if filename not in relevant_files and filename.endswith(".py")})
+
+    def _build_code_context(self, relevant_files: List[str], existing_files: Dict[str, str],
+                            summaries: Dict[str, str]) -> str:
+        """
+        Full source for the files most likely to be edited, structural
+        summaries (from _summarize_other_files) for the other Python files
+        while code_context_token_budget lasts, and just the names of whatever
+        does not fit.
+        """
+        sections = [f"--- File: {filename} ---\n```python\n{existing_files[filename]}\n```"
+                    for filename in relevant_files]
+        used_tokens = sum(self.context_packer.estimate_tokens(section) for section in sections)
+
+        other_files = [filename for filename in existing_files if filename not in relevant_files]
+        omitted = []
+        for filename in other_files:
+            summary = summaries.get(filename)
+            section = f"--- File: {filename} (summary, bodies omitted) ---\n```python\n{summary}\n```" if summary else ""
+            cost = self.context_packer.estimate_tokens(section)
+            if summary and used_tokens + cost <= self.code_context_token_budget:
+                sections.append(section)
+                used_tokens += cost
+            else:
+                omitted.append(filename)
+        if omitted:
+            sections.append("--- Other project files (not shown) ---\n" + "\n".join(omitted))
+
+        self.log("info", f"Code context: {len(relevant_files)} full file(s), {len(other_files) - len(omitted)} "
+                         f"summaries, {len(omitted)} listed by name (~{used_tokens} tokens).")
+        return "\n\n".join(sections)
+
+    def _rank_relevant_files(self, prompt: str, existing_files: Mapping[str, str], top_n: int = 5) -> List[str]:
+        """Returns the names of the top_n files most relevant to the prompt, by BM25 over the relevance index."""
+        started = time.perf_counter()
+        project_root = self.project_manager.active_project_path
+        if project_root != self._relevance_root:
+            self.relevance_index, self._relevance_root = RelevanceIndex(), project_root
+
+        def stamp_for(filename: str):
+            # A fresh stat: in-place saves from the editor do not update the inventory's stamps.
+            if not project_root:
+                return None
+            try:
+                stat = os.stat(project_root / filename)
+            except OSError:
+                return None
+            return stat.st_size, stat.st_mtime_ns
+
+        updated, removed = self.relevance_index.sync(existing_files, stamp_for)
+        top_files = self.relevance_index.top_k(prompt, top_n, always_include=self.always_include_files)
+        if not any(filename not in self.always_include_files for filename in top_files):
+            # Nothing in the project matches the prompt's terms.
+            top_files = (top_files + [f for f in existing_files if f not in top_files])[:top_n]
+
+        self.log("info", f"Identified most relevant files for context: {top_files} "
+                         f"({updated} re-indexed, {removed} removed, {(time.perf_counter() - started) * 1000:.1f} ms)")
+        return top_files
 
     def _sanitize_plan_paths(self, plan: dict) -> dict:
         if not plan or 'files' not in plan: return plan
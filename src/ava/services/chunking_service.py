@@ -1,27 +1,55 @@
 # src/ava/services/chunking_service.py
 import re
+import ast
+import hashlib
+from collections import defaultdict
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, Optional
+
+from src.ava.utils.embedding_tokenizer import EmbeddingTokenizer
+
+# Must match the RAG server's embedding model; chunks are sized with its tokenizer.
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_MAX_TOKENS = 256  # The model truncates input beyond this many word-pieces
+REPORT_TOKEN_BUCKETS = (64, 128, 192, 254)
+# Each chunk gets a 'dir:<ancestor>' flag per ancestor directory of its rel_path, which lets
+# the RAG server filter by path prefix using plain equality filters.
+PATH_DIR_KEY_PREFIX = "dir:"
+LANGUAGE_BY_EXTENSION = {
+    '.py': 'python', '.js': 'javascript', '.ts': 'typescript', '.html': 'html', '.css': 'css',
+    '.md': 'markdown', '.txt': 'text', '.rst': 'restructuredtext', '.json': 'json', '.toml': 'toml',
+    '.java': 'java', '.c': 'c', '.cpp': 'cpp', '.cs': 'csharp', '.go': 'go', '.rb': 'ruby',
+    '.gd': 'gdscript', '.yaml': 'yaml', '.yml': 'yaml',
+}
 
 
 class ChunkingService:
     """
     Smart chunking service for breaking documents into optimal pieces for RAG.
     Handles Python code, text files, and other document types with specific logic.
+    Sizes are measured in embedding-model tokens, so chunks fill the model's
+    input window instead of being silently truncated.
     """
 
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 150):
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
-        print("[ChunkingService] Initialized.")
+    def __init__(self, max_tokens: int = EMBEDDING_MAX_TOKENS, fill_ratio: float = 0.9, overlap_tokens: int = 32,
+                 model_name: str = EMBEDDING_MODEL_NAME):
+        # [CLS] and [SEP] take two positions of the window.
+        self.model_window = max_tokens - 2
+        self.target_tokens = max(16, int(self.model_window * fill_ratio))
+        self.overlap_tokens = overlap_tokens
+        self.tokenizer = EmbeddingTokenizer.get(model_name)
+        self._report_token_counts: Dict[str, List[int]] = defaultdict(list)
+        print(f"[ChunkingService] Initialized. Target {self.target_tokens} tokens per chunk "
+              f"(window {self.model_window}, overlap {self.overlap_tokens}).")
 
-    def chunk_document(self, content: str, file_path_str: str) -> List[Dict[str, Any]]:
+    def chunk_document(self, content: str, file_path_str: str, base_path: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Chunks a document into optimal pieces based on file type.
 
         Args:
             content: The document content as a string.
             file_path_str: The string path to the file, used to determine file type.
+            base_path: Root the file's 'rel_path' metadata is relative to (e.g. the project root).
 
         Returns:
             A list of chunk dictionaries, ready for embedding.
@@ -40,9 +68,41 @@ class ChunkingService:
         else:
             chunks = self._chunk_generic_text(content, file_path)
 
+        self._enrich_metadata(chunks, content, file_path, base_path)
         print(f"[ChunkingService] Chunked '{file_path.name}' into {len(chunks)} pieces.")
         return chunks
 
+    def _enrich_metadata(self, chunks: List[Dict[str, Any]], content: str, file_path: Path,
+                         base_path: Optional[str]):
+        """
+        Adds language, project-relative path, ancestor-directory flags and,
+        where the chunker did not record one, the chunk's line span.
+        """
+        rel_path = file_path.name
+        if base_path:
+            try:
+                rel_path = file_path.resolve().relative_to(Path(base_path).resolve()).as_posix()
+            except ValueError:
+                pass
+        directory_flags = {}
+        parts = rel_path.split("/")[:-1]
+        for depth in range(1, len(parts) + 1):
+            directory_flags[f"{PATH_DIR_KEY_PREFIX}{'/'.join(parts[:depth])}"] = True
+        language = LANGUAGE_BY_EXTENSION.get(file_path.suffix.lower(), file_path.suffix.lower().lstrip('.') or "text")
+
+        search_from = 0
+        for chunk in chunks:
+            metadata = chunk['metadata']
+            metadata.update({'language': language, 'rel_path': rel_path, **directory_flags})
+            if 'start_line' not in metadata:
+                # Chunks are produced in order; overlap means the next one can start before this one ends.
+                position = content.find(chunk['content'], search_from)
+                if position < 0:
+                    continue
+                metadata['start_line'] = content.count("\n", 0, position) + 1
+                metadata['end_line'] = metadata['start_line'] + chunk['content'].count("\n")
+                search_from = position + 1
+
     def _get_unique_file_prefix(self, file_path: Path) -> str:
         """Creates a sanitized, unique prefix from a file path to avoid ID collisions."""
         # Using the last 4 parts of the path is a good compromise for uniqueness and readability.
@@ -54,55 +114,218 @@ class ChunkingService:
         return sanitized_path.replace(file_path.suffix, '').replace('.', '_')
 
     def _chunk_python_code(self, content: str, file_path: Path) -> List[Dict[str, Any]]:
-        """Smart chunking for Python code files by splitting into logical blocks."""
+        """
+        Chunks Python code along its syntax tree, anchored to definitions: each
+        top-level function or class is its own chunk, and only a definition
+        larger than target_tokens is split (a class into its header and
+        members, anything else by lines). Runs of module-level statements
+        between definitions are packed together. Each chunk records its
+        qualified name and line range, and its ID is derived from the path,
+        qualified name and content, so inserting or editing one function
+        leaves the IDs of every other chunk unchanged.
+        """
+        try:
+            tree = ast.parse(content)
+        except (SyntaxError, ValueError):
+            # Unparseable files still get indexed, just without structure.
+            return self._chunk_generic_text(content, file_path)
+
+        lines = content.splitlines()
+        blocks = self._merge_module_statements(self._extract_python_blocks(tree, lines))
         chunks = []
-        code_blocks = self._extract_python_blocks(content)
-        current_chunk_content = ""
-        current_chunk_id_counter = 0
-        file_prefix = self._get_unique_file_prefix(file_path)
+        seen_ids: Dict[str, int] = {}
+        for block in blocks:
+            chunk = self._create_python_chunk(block, lines, file_path)
+            # Identical redefinitions would share an ID; later copies get a suffix.
+            occurrence = seen_ids.get(chunk['id'], 0)
+            seen_ids[chunk['id']] = occurrence + 1
+            if occurrence:
+                chunk['id'] += f"_{occurrence + 1}"
+            chunks.append(chunk)
+        return chunks
 
-        for block in code_blocks:
-            # If adding the next block would exceed the chunk size, process the current chunk
-            if len(current_chunk_content) + len(block['content']) > self.chunk_size and current_chunk_content:
-                chunks.append(self._create_chunk(
-                    current_chunk_content,
-                    chunk_id=f"{file_prefix}_code_{current_chunk_id_counter}",
-                    file_path=file_path
-                ))
-                current_chunk_id_counter += 1
-                # Start the new chunk with an overlap from the previous one
-                current_chunk_content = self._get_overlap_content(current_chunk_content) + block['content']
+    def _merge_module_statements(self, blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Packs consecutive module-level statements (imports, constants) into
+        blocks of at most target_tokens tokens. Definitions are never merged,
+        so they always start a new block.
+        """
+        merged: List[Dict[str, Any]] = []
+        for block in blocks:
+            previous = merged[-1] if merged else None
+            if (previous and previous['qualified_name'] == block['qualified_name'] == "<module>"
+                    and 'part' not in previous and 'part' not in block
+                    and previous['tokens'] + block['tokens'] <= self.target_tokens):
+                previous['content'] += "\n" + block['content']
+                previous['tokens'] += block['tokens']
+                previous['end_line'] = block['end_line']
+                previous['type'] = "module"
             else:
-                current_chunk_content += block['content'] + '\n\n'  # Add separation
+                merged.append(dict(block))
+        return merged
 
-        # Add the final remaining chunk
-        if current_chunk_content.strip():
-            chunks.append(self._create_chunk(
-                current_chunk_content.strip(),
-                chunk_id=f"{file_prefix}_code_{current_chunk_id_counter}",
-                file_path=file_path
-            ))
+    def _extract_python_blocks(self, tree: ast.Module, lines: List[str]) -> List[Dict[str, Any]]:
+        """
+        Turns a module's syntax tree into source-ordered blocks of whole
+        statements. Decorators and the comments directly above a definition stay
+        with it. Classes larger than target_tokens are split into their header and
+        one block per member; any block still too large is split by lines.
+        """
+        blocks = []
+        previous_end = 0
+        for node in tree.body:
+            start, end = self._node_line_span(node, previous_end, lines)
+            blocks.extend(self._blocks_for_node(node, start, end, lines, prefix=""))
+            previous_end = end
+        if previous_end < len(lines) and "\n".join(lines[previous_end:]).strip():
+            blocks.append(self._make_block(lines, previous_end + 1, len(lines), "<module>", "module"))
+        return blocks
 
-        return chunks
+    def _blocks_for_node(self, node: ast.AST, start: int, end: int, lines: List[str],
+                         prefix: str) -> List[Dict[str, Any]]:
+        name = getattr(node, 'name', None)
+        qualified_name = f"{prefix}{name}" if name else (prefix.rstrip('.') or "<module>")
+        if isinstance(node, ast.ClassDef):
+            block_type = "class"
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            block_type = "method" if prefix else "function"
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            block_type = "import"
+        else:
+            block_type = "statement"
+
+        block = self._make_block(lines, start, end, qualified_name, block_type)
+        if block['tokens'] <= self.target_tokens:
+            return [block]
+
+        if isinstance(node, ast.ClassDef) and node.body:
+            # Header (signature, docstring, class attributes before the first method), then each member.
+            members = []
+            previous_end = start - 1
+            first_member = True
+            for child in node.body:
+                child_start, child_end = self._node_line_span(child, previous_end, lines)
+                if first_member:
+                    child_start = start
+                    first_member = False
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    members.extend(self._blocks_for_node(child, child_start, child_end, lines,
+                                                         prefix=f"{qualified_name}."))
+                else:
+                    members.append(self._make_block(lines, child_start, child_end, qualified_name, "class"))
+                previous_end = child_end
+            return self._merge_adjacent(members)
+
+        return self._split_block_by_lines(block, lines)
+
+    @staticmethod
+    def _node_line_span(node: ast.AST, previous_end: int, lines: List[str]) -> tuple:
+        """
+        Returns the 1-based (start, end) lines of a statement, starting at its
+        first decorator and including the comment lines directly above it.
+        """
+        start = node.lineno
+        for decorator in getattr(node, 'decorator_list', []):
+            start = min(start, decorator.lineno)
+        end = getattr(node, 'end_lineno', None) or node.lineno
+
+        first = start - 1
+        while first > previous_end and (not lines[first - 1].strip() or lines[first - 1].lstrip().startswith('#')):
+            first -= 1
+        first += 1
+        while first < start and not lines[first - 1].strip():
+            first += 1
+        return first, end
+
+    def _make_block(self, lines: List[str], start: int, end: int, qualified_name: str,
+                    block_type: str) -> Dict[str, Any]:
+        content = "\n".join(lines[start - 1:end])
+        return {
+            "content": content,
+            "tokens": self.tokenizer.count(content),
+            "start_line": start,
+            "end_line": end,
+            "qualified_name": qualified_name,
+            "type": block_type,
+        }
+
+    def _merge_adjacent(self, blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Joins consecutive non-definition blocks of a class so its header stays in one block."""
+        merged: List[Dict[str, Any]] = []
+        for block in blocks:
+            previous = merged[-1] if merged else None
+            if (previous and previous['type'] == "class" and block['type'] == "class"
+                    and previous['qualified_name'] == block['qualified_name']
+                    and previous['end_line'] + 1 >= block['start_line']):
+                previous['content'] += "\n" + block['content']
+                previous['tokens'] += block['tokens']
+                previous['end_line'] = block['end_line']
+            else:
+                merged.append(dict(block))
+        return merged
+
+    def _split_block_by_lines(self, block: Dict[str, Any], lines: List[str]) -> List[Dict[str, Any]]:
+        """Splits an oversized block on line boundaries, repeating overlap_tokens worth of lines between parts."""
+        first, last = block['start_line'], block['end_line']
+        line_tokens = [self.tokenizer.count(line) for line in lines[first - 1:last]]
+        parts = []
+        for window_start, window_end in self._pack_line_windows(line_tokens):
+            part = self._make_block(lines, first + window_start, first + window_end, block['qualified_name'],
+                                    block['type'])
+            part['part'] = len(parts)
+            parts.append(part)
+        return parts
+
+    def _pack_line_windows(self, line_tokens: List[int]) -> List[Tuple[int, int]]:
+        """
+        Groups consecutive lines into inclusive (start, end) index windows of at
+        most target_tokens tokens. Each window after the first repeats the
+        trailing lines of the previous one, up to overlap_tokens.
+        """
+        windows = []
+        start = 0
+        while start < len(line_tokens):
+            end, size = start, line_tokens[start]
+            while end + 1 < len(line_tokens) and size + line_tokens[end + 1] <= self.target_tokens:
+                end += 1
+                size += line_tokens[end]
+            windows.append((start, end))
+            if end + 1 >= len(line_tokens):
+                break
+            back, overlap = end, 0
+            while back > start and overlap + line_tokens[back] <= self.overlap_tokens:
+                overlap += line_tokens[back]
+                back -= 1
+            start = max(start + 1, back + 1)
+        return windows
+
+    def _create_python_chunk(self, block: Dict[str, Any], lines: List[str], file_path: Path) -> Dict[str, Any]:
+        start_line, end_line = block['start_line'], block['end_line']
+        qualified_name = block['qualified_name']
+        if 'part' in block:
+            qualified_name += f" (part {block['part'] + 1})"
+        chunk_content = "\n".join(lines[start_line - 1:end_line])
+
+        chunk = self._create_chunk(chunk_content,
+                                   chunk_id=self._stable_chunk_id(file_path, qualified_name, chunk_content),
+                                   file_path=file_path)
+        chunk['metadata'].update({
+            'qualified_name': qualified_name,
+            'start_line': start_line,
+            'end_line': end_line,
+            'chunk_type': block['type'],
+        })
+        return chunk
 
-    def _extract_python_blocks(self, content: str) -> List[Dict[str, Any]]:
-        """Extracts logical Python code blocks (classes, functions, standalone code)."""
-        # Split by class or function definitions
-        # This regex looks for 'class' or 'def' at the beginning of a line
-        block_delimiters = re.compile(r'\n(?=class |def )', re.MULTILINE)
-        raw_blocks = block_delimiters.split(content)
-
-        structured_blocks = []
-        for block in raw_blocks:
-            if block.strip():
-                block_type = "unknown"
-                if block.strip().startswith("class"):
-                    block_type = "class"
-                elif block.strip().startswith("def"):
-                    block_type = "function"
-                structured_blocks.append({"content": block, "type": block_type})
-
-        return structured_blocks
+    def _stable_chunk_id(self, file_path: Path, qualified_name: str, content: str) -> str:
+        """
+        Content-addressed chunk ID from (path, qualified name, content hash).
+        Unchanged code keeps its ID across edits elsewhere in the file, so it
+        does not need to be re-embedded.
+        """
+        content_hash = hashlib.sha1(content.strip().encode("utf-8")).hexdigest()
+        digest = hashlib.sha1(f"{file_path}\0{qualified_name}\0{content_hash}".encode("utf-8")).hexdigest()
+        return f"{self._get_unique_file_prefix(file_path)}_{digest[:16]}"
 
     def _chunk_markdown_text(self, content: str, file_path: Path) -> List[Dict[str, Any]]:
         """Smart chunking for Markdown by splitting on headers."""
@@ -117,7 +340,7 @@ class ChunkingService:
                 continue
 
             # If a section is small enough, treat it as a single chunk
-            if len(section) <= self.chunk_size:
+            if self.tokenizer.count(section) <= self.target_tokens:
                 chunks.append(self._create_chunk(
                     section,
                     chunk_id=f"{file_prefix}_section_{section_id_counter}",
@@ -150,29 +373,87 @@ class ChunkingService:
         return chunks
 
     def _split_text_by_size(self, text: str) -> List[str]:
-        """Splits text into chunks of a specified size with overlap."""
-        chunks = []
-        start = 0
-        while start < len(text):
-            end = start + self.chunk_size
-            chunk = text[start:end]
-            chunks.append(chunk)
-            start = end - self.chunk_overlap
-        return chunks
+        """Splits text on line boundaries into chunks of at most target_tokens tokens, with token overlap."""
+        pieces: List[str] = []
+        piece_tokens: List[int] = []
+        for line in text.split("\n"):
+            tokens = self.tokenizer.count(line)
+            # A single line longer than a chunk (minified code, long paragraphs) is cut by characters.
+            while tokens > self.target_tokens:
+                cut = self.tokenizer.chars_for_tokens(line, self.target_tokens)
+                pieces.append(line[:cut])
+                piece_tokens.append(self.tokenizer.count(line[:cut]))
+                line = line[cut:]
+                tokens = self.tokenizer.count(line)
+            pieces.append(line)
+            piece_tokens.append(tokens)
 
-    def _get_overlap_content(self, content: str) -> str:
-        """Gets the last part of a string to use as overlap."""
-        if len(content) <= self.chunk_overlap:
-            return content
-        return content[-self.chunk_overlap:]
+        return ["\n".join(pieces[start:end + 1]) for start, end in self._pack_line_windows(piece_tokens)]
 
     def _create_chunk(self, content: str, chunk_id: str, file_path: Path) -> Dict[str, Any]:
-        """Creates a standardized chunk dictionary."""
+        """Creates a standardized chunk dictionary and records its size for the chunking report."""
+        content = content.strip()
+        token_count = self.tokenizer.count(content)
+        self._record_size(file_path, token_count)
         return {
             'id': chunk_id,
-            'content': content.strip(),
+            'content': content,
             'metadata': {
                 'source': file_path.name,
-                'full_path': str(file_path)
+                'full_path': str(file_path),
+                'token_count': token_count
+            }
+        }
+
+    def _record_size(self, file_path: Path, token_count: int):
+        self._report_token_counts[file_path.suffix.lower() or "(none)"].append(token_count)
+
+    def record_chunk_sizes(self, chunks: List[Dict[str, Any]]):
+        """Adds chunks produced by another ChunkingService (e.g. in a worker process) to this report."""
+        for chunk in chunks:
+            metadata = chunk.get('metadata', {})
+            if 'token_count' in metadata:
+                self._record_size(Path(metadata.get('full_path', '')), metadata['token_count'])
+
+    def get_chunking_report(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Token statistics per file type for the chunks produced since the last
+        reset: distribution, and how many tokens fall beyond the model window
+        and are therefore never embedded.
+        """
+        report = {}
+        for extension, counts in sorted(self._report_token_counts.items()):
+            ordered = sorted(counts)
+            total_tokens = sum(ordered)
+            truncated_tokens = sum(max(0, c - self.model_window) for c in ordered)
+            histogram = {}
+            lower = 0
+            for upper in REPORT_TOKEN_BUCKETS:
+                histogram[f"{lower}-{upper}"] = sum(1 for c in ordered if lower <= c < upper)
+                lower = upper
+            histogram[f"{lower}+"] = sum(1 for c in ordered if c >= lower)
+            report[extension] = {
+                "chunks": len(ordered),
+                "mean_tokens": round(total_tokens / len(ordered), 1),
+                "p50_tokens": ordered[len(ordered) // 2],
+                "p95_tokens": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                "max_tokens": ordered[-1],
+                "mean_fill_ratio": round(total_tokens / (len(ordered) * self.model_window), 2),
+                "truncated_chunks": sum(1 for c in ordered if c > self.model_window),
+                "truncated_token_fraction": round(truncated_tokens / total_tokens, 3) if total_tokens else 0.0,
+                "histogram": histogram,
             }
-        }
\ No newline at end of file
+        return report
+
+    def format_chunking_report(self) -> str:
+        lines = [f"Chunking report (window {self.model_window} tokens, "
+                 f"{'model tokenizer' if self.tokenizer.available else 'estimated tokens'}):"]
+        for extension, stats in self.get_chunking_report().items():
+            lines.append(f"  {extension}: {stats['chunks']} chunks, mean {stats['mean_tokens']} / "
+                         f"p95 {stats['p95_tokens']} / max {stats['max_tokens']} tokens, "
+                         f"fill {stats['mean_fill_ratio']:.0%}, {stats['truncated_chunks']} truncated "
+                         f"({stats['truncated_token_fraction']:.1%} of tokens lost)")
+        return "\n".join(lines)
+
+    def reset_chunking_report(self):
+        self._report_token_counts.clear()
\ No newline at end of file
@@ -5,6 +5,8 @@ from pathlib import Path
 from typing import Dict, List, Any, Optional, Set
 from dataclasses import dataclass
 
+from src.ava.utils.rag_context_packer import RAGContextPacker
+
 
 @dataclass
 class GenerationContext:
@@ -24,8 +26,10 @@ class ContextManager:
     Manages comprehensive context for coordinated generation.
     """
 
-    def __init__(self, service_manager):
+    def __init__(self, service_manager, rag_token_budget_per_file: int = 600):
         self.service_manager = service_manager
+        self.context_packer = RAGContextPacker()
+        self.rag_token_budget_per_file = rag_token_budget_per_file
 
     async def build_generation_context(self, plan: Dict[str, Any], rag_context: str,
                                        existing_files: Optional[Dict[str, str]]) -> GenerationContext:
@@ -33,17 +37,8 @@ class ContextManager:
         project_manager = self.service_manager.get_project_manager()
 
         initial_project_index = {}
-        if project_manager and project_manager.active_project_path and existing_files:
-            # Build index from existing files on disk at the start of the session
-            for rel_path, content in existing_files.items():
-                if rel_path.endswith(".py"):
-                    module_path_str = rel_path.replace('.py', '').replace('/', '.')
-                    symbols_in_file = project_indexer.get_symbols_from_content(content, module_path_str)
-                    initial_project_index.update(symbols_in_file)
-
-        # If it's a completely new project, the indexer might run on an empty dir
-        # or we can rely on the rolling update. Let's ensure indexer is called if path exists.
-        elif project_manager and project_manager.active_project_path:
+        if project_manager and project_manager.active_project_path:
+            # The existing files are the ones on disk; the persisted index only re-parses those that changed.
             initial_project_index = project_indexer.build_index(project_manager.active_project_path)
 
         living_design_context = {}  # Placeholder for now
@@ -143,11 +138,9 @@ class ContextManager:
                 score = self._calculate_text_relevance(module_content, plan_keywords)
                 relevance_scores[f"project_index:{module_name}"] = score
             if rag_context:
-                rag_chunks = rag_context.split("--- Relevant Document Snippet")
-                for i, chunk in enumerate(rag_chunks):
-                    if chunk.strip():
-                        score = self._calculate_text_relevance(chunk, plan_keywords)
-                        relevance_scores[f"rag_chunk:{i}"] = score
+                for i, hit in enumerate(self.context_packer.split_context(rag_context)):
+                    score = self._calculate_text_relevance(hit["text"], plan_keywords)
+                    relevance_scores[f"rag_chunk:{i}"] = score
             return relevance_scores
         except Exception:
             return {}
@@ -287,17 +280,19 @@ class ContextManager:
     def _filter_rag_context(self, filename: str, rag_context: str) -> str:
         try:
             if not rag_context: return ""
-            chunks = rag_context.split("--- Relevant Document Snippet")
-            relevant_chunks = []
+            hits = self.context_packer.split_context(rag_context)
+            if not hits:
+                return rag_context[:1000] + "..." if len(rag_context) > 1000 else rag_context
             file_stem = Path(filename).stem.lower()
-            for chunk in chunks:
-                chunk_lower = chunk.lower()
-                if (file_stem in chunk_lower or filename.lower() in chunk_lower or
-                        any(word in chunk_lower for word in ['class', 'function', 'method', 'import'])):
-                    relevant_chunks.append(chunk.strip())
-            if not relevant_chunks and chunks: relevant_chunks = chunks[:2]
-            result = "\n\n".join(relevant_chunks)
-            return result[:1000] + "..." if len(result) > 1000 else result
+            for hit in hits:
+                # Boost snippets that mention this file; keep the server's rank as the tie-breaker.
+                text_lower = hit["text"].lower()
+                if file_stem in text_lower or filename.lower() in text_lower or file_stem in hit["source"].lower():
+                    hit["score"] += 1.0
+                elif any(word in text_lower for word in ['class', 'function', 'method', 'import']):
+                    hit["score"] += 0.5
+            packed_hits = self.context_packer.pack(hits, self.rag_token_budget_per_file)
+            return self.context_packer.format(packed_hits)
         except Exception:
             return rag_context[:500] + "..." if len(rag_context) > 500 else rag_context
 
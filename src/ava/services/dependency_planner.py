@@ -61,6 +61,8 @@ class DependencyPlanner:
         graph = {}
         file_purposes = {f["filename"]: f["purpose"] for f in files_to_generate}
 
+        import_graph = self._get_import_graph()
+
         for file_info in files_to_generate:
             filename = file_info["filename"]
             purpose = file_info["purpose"]
@@ -69,7 +71,11 @@ class DependencyPlanner:
             dependents = set()
 
             # Analyze purpose text for dependency clues
-            dependencies.update(self._extract_dependencies_from_purpose(purpose, file_purposes))
+            dependencies.update(self._extract_dependencies_from_purpose(filename, purpose, file_purposes))
+
+            # Files that already exist declare their real dependencies through their imports
+            if import_graph and filename in import_graph:
+                dependencies.update(dep for dep in import_graph.dependencies(filename) if dep in file_purposes)
 
             # Use living design context for additional dependency info
             if context.living_design_context:
@@ -91,7 +97,16 @@ class DependencyPlanner:
 
         return graph
 
-    def _extract_dependencies_from_purpose(self, purpose: str,
+    def _get_import_graph(self):
+        """The project's import graph, brought up to date, or None without an active project."""
+        project_manager = self.service_manager.get_project_manager()
+        project_indexer = self.service_manager.get_project_indexer_service()
+        if not project_manager or not project_manager.active_project_path or not project_indexer:
+            return None
+        project_indexer.build_index(project_manager.active_project_path)
+        return project_indexer.import_graph
+
+    def _extract_dependencies_from_purpose(self, current_filename: str, purpose: str,
                                            file_purposes: Dict[str, str]) -> Set[str]:
         """Extract dependencies by analyzing purpose text."""
         dependencies = set()
@@ -100,12 +115,12 @@ class DependencyPlanner:
         # Look for mentions of other files in the purpose
         for filename, other_purpose in file_purposes.items():
             file_stem = Path(filename).stem
-            if file_stem.lower() in purpose_lower and filename != filename:
+            if file_stem.lower() in purpose_lower and filename != current_filename:
                 dependencies.add(filename)
 
         # Common dependency patterns
         if "main" in purpose_lower and "main.py" in file_purposes:
-            if purpose != file_purposes["main.py"]:  # Don't self-depend
+            if current_filename != "main.py":  # Don't self-depend
                 dependencies.add("main.py")
 
         return dependencies
@@ -1,12 +1,14 @@
-import os
 from pathlib import Path
 from typing import List
 
+from src.ava.core.workspace_inventory import WorkspaceInventory
+
 
 class DirectoryScannerService:
     """
     A service dedicated to scanning directories and finding files
-    that are suitable for RAG processing, respecting common ignore patterns.
+    that are suitable for RAG processing. Ignore rules come from the shared
+    workspace inventory, so scans agree with the rest of the application.
     """
 
     def __init__(self):
@@ -15,11 +17,6 @@ class DirectoryScannerService:
             '.py', '.js', '.ts', '.html', '.css', '.md', '.txt', '.json',
             '.toml', '.rst', '.java', '.c', '.cpp', '.cs', '.go', '.rb',
         }
-        # Directories to completely ignore during scanning
-        self.ignore_dirs = {
-            '.git', '__pycache__', '.venv', 'venv', 'node_modules',
-            'build', 'dist', '.idea', '.vscode', 'rag_db'
-        }
         print("[DirectoryScanner] Initialized.")
 
     def scan(self, directory_path_str: str) -> List[Path]:
@@ -38,16 +35,9 @@ class DirectoryScannerService:
             return []
 
         print(f"[DirectoryScanner] Starting scan of: {directory_path}")
-        found_files = []
-
-        for root, dirs, files in os.walk(directory_path, topdown=True):
-            # Modify dirs in-place to prevent os.walk from descending into ignored directories
-            dirs[:] = [d for d in dirs if d not in self.ignore_dirs]
-
-            for file_name in files:
-                if Path(file_name).suffix.lower() in self.supported_extensions:
-                    file_path = Path(root) / file_name
-                    found_files.append(file_path)
+        inventory = WorkspaceInventory.for_root(directory_path)
+        found_files = [inventory.absolute(relative_path)
+                       for relative_path in inventory.by_extension(*self.supported_extensions)]
 
         print(f"[DirectoryScanner] Scan complete. Found {len(found_files)} supported files.")
         return found_files
\ No newline at end of file
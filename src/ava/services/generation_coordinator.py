@@ -9,6 +9,9 @@ from src.ava.core.event_bus import EventBus
 from src.ava.prompts import CODER_PROMPT, SIMPLE_FILE_PROMPT
 from src.ava.prompts.godot import GODOT_GDSCRIPT_CODER_PROMPT, GODOT_GENERIC_FILE_PROMPT
 
+# Above this many symbols, the coder prompt gets the relevant subset of the index instead of all of it.
+PROMPT_SYMBOL_LIMIT = 200
+
 
 def create_tscn_content(node_type: str, script_path: str) -> str:
     """
@@ -169,10 +172,32 @@ class GenerationCoordinator:
             purpose=file_info["purpose"],
             original_code_section=original_code_section,
             file_plan_json=json.dumps(context.plan, indent=2),
-            symbol_index_json=json.dumps(context.project_index, indent=2),
+            symbol_index_json=json.dumps(self._symbol_index_for_prompt(file_info, context), indent=2),
             generated_files_code_json=json.dumps(python_files_this_session, indent=2),
         )
 
+    def _symbol_index_for_prompt(self, file_info: Dict[str, str], context: Any) -> Dict[str, str]:
+        """
+        The whole index for small projects. For large ones: symbols from files
+        in this plan, plus symbols the symbol store matches against the file's
+        name, purpose and planned dependencies.
+        """
+        index = context.project_index
+        if len(index) <= PROMPT_SYMBOL_LIMIT:
+            return index
+        planned_modules = {f["filename"][:-3].replace("/", ".") for f in context.plan.get("files", [])
+                           if f["filename"].endswith(".py")}
+        selected = {name: module for name, module in index.items() if module in planned_modules}
+        indexer = self.service_manager.get_project_indexer_service()
+        if indexer:
+            session = context.generation_session.get(file_info["filename"], {})
+            query = " ".join([file_info["filename"], file_info.get("purpose", "")] + session.get("dependencies", []))
+            for name, module in indexer.symbols_for_prompt(query, PROMPT_SYMBOL_LIMIT).items():
+                if len(selected) >= PROMPT_SYMBOL_LIMIT:
+                    break
+                selected.setdefault(name, index.get(name, module))
+        return selected
+
     def _build_gdscript_coder_prompt(self, file_info: Dict[str, str], context: Any) -> str:
         return GODOT_GDSCRIPT_CODER_PROMPT.format(
             filename=file_info["filename"],
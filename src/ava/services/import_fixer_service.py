@@ -1,100 +1,23 @@
-import ast
 from collections import defaultdict
-from typing import Dict, Set, List, Tuple
+from typing import Dict, Set, Optional, TYPE_CHECKING
 
+from src.ava.utils.code_analysis import analyze_code
 
-class ScopeAwareVisitor(ast.NodeVisitor):
-    """
-    An AST visitor that tracks defined names within their proper scopes
-    to accurately identify genuinely undefined names.
-    """
-
-    def __init__(self):
-        # The core of our scope tracking: a stack of sets.
-        # The first item is the global scope. We push new scopes for functions/classes.
-        self.scopes: List[Set[str]] = [set()]
-        # A list to store all names that are used (read) in the code.
-        self.used_names: List[Tuple[str, ast.AST]] = []
-        # Python's built-in functions and keywords.
-        self.builtins = set(dir(__builtins__))
-
-    def visit_FunctionDef(self, node: ast.FunctionDef):
-        # A function defines its own name in the *parent* scope.
-        self.scopes[-1].add(node.name)
-        # Then, it creates a *new* scope for its body.
-        new_scope = {arg.arg for arg in node.args.args}
-        self.scopes.append(new_scope)
-        self.generic_visit(node)
-        self.scopes.pop()
-
-    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef):
-        # Treat async functions the same as regular functions for scope.
-        self.visit_FunctionDef(node)
-
-    def visit_ClassDef(self, node: ast.ClassDef):
-        # A class defines its name in the parent scope.
-        self.scopes[-1].add(node.name)
-        # Then creates a new scope for its methods and class variables.
-        self.scopes.append(set())
-        self.generic_visit(node)
-        self.scopes.pop()
-
-    def visit_Assign(self, node: ast.Assign):
-        # Handle variable assignments (e.g., x = 5).
-        for target in node.targets:
-            if isinstance(target, ast.Name):
-                self.scopes[-1].add(target.id)
-        self.generic_visit(node)
-
-    def visit_Import(self, node: ast.Import):
-        # Imports add names to the current scope.
-        for alias in node.names:
-            self.scopes[-1].add(alias.asname or alias.name)
-        self.generic_visit(node)
-
-    def visit_ImportFrom(self, node: ast.ImportFrom):
-        # `from x import y` adds 'y' to the current scope.
-        for alias in node.names:
-            self.scopes[-1].add(alias.asname or alias.name)
-        self.generic_visit(node)
-
-    def visit_Name(self, node: ast.Name):
-        # This is where we track when a name is *used*.
-        if isinstance(node.ctx, ast.Load):
-            self.used_names.append((node.id, node))
-        self.generic_visit(node)
-
-    def visit_ExceptHandler(self, node: ast.ExceptHandler):
-        # Handle `except Exception as e`. 'e' is defined within this handler.
-        if node.name:
-            self.scopes[-1].add(node.name)
-        self.generic_visit(node)
-
-    def get_undefined_names(self) -> Set[str]:
-        """
-        After visiting the whole tree, this method calculates which used
-        names were never defined in any accessible scope.
-        """
-        undefined = set()
-        for name, node in self.used_names:
-            # Check if the name is a builtin
-            if name in self.builtins:
-                continue
-
-            # Check if the name exists in the current scope or any parent scope.
-            found = any(name in scope for scope in self.scopes)
-            if not found:
-                undefined.add(name)
-        return undefined
+if TYPE_CHECKING:
+    from src.ava.services.project_indexer_service import ProjectIndexerService
 
 
 class ImportFixerService:
     """
     Analyzes a string of Python code and adds missing import statements
-    based on a pre-built project index, now using scope-aware analysis.
+    based on a pre-built project index, using the scope-aware undefined
+    names from the shared code analysis.
+    Names missing from the index passed in are looked up in the project
+    indexer's symbol store, when one is available.
     """
 
-    def __init__(self):
+    def __init__(self, project_indexer: Optional["ProjectIndexerService"] = None):
+        self.project_indexer = project_indexer
         print("[ImportFixer] Initialized.")
 
     def fix_imports(self, code: str, project_index: Dict[str, str], current_module: str) -> str:
@@ -103,12 +26,12 @@ class ImportFixerService:
         import statements if they exist in the project index.
         """
         try:
-            tree = ast.parse(code)
-
-            visitor = ScopeAwareVisitor()
-            visitor.visit(tree)
-            undefined_names = visitor.get_undefined_names()
+            analysis = analyze_code(code)
+            if analysis.syntax_error:
+                print(f"[ImportFixer] Could not process file for import fixing: {analysis.syntax_error}")
+                return code
 
+            undefined_names = analysis.undefined_names
             if not undefined_names:
                 return code  # No changes needed
 
@@ -129,10 +52,15 @@ class ImportFixerService:
         """Groups required imports by the module they come from."""
         imports = defaultdict(set)
         for name in names_to_find:
+            # The passed index wins: it includes files generated this session that are not on disk yet.
             if name in project_index:
                 module_path = project_index[name]
-                if module_path != current_module:
-                    imports[module_path].add(name)
+            elif self.project_indexer:
+                module_path = self.project_indexer.resolve_import(name, current_module)
+            else:
+                module_path = None
+            if module_path and module_path != current_module:
+                imports[module_path].add(name)
         return imports
 
     def _add_imports_to_code(self, code: str, imports: Dict[str, Set[str]]) -> str:
@@ -0,0 +1,152 @@
+# src/ava/services/import_graph.py
+import threading
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+from src.ava.utils.symbol_extractor import module_path_for, package_module_name
+
+
+class ImportGraph:
+    """
+    Which project files import which, as relative file paths. Edges come
+    from each file's import candidates (see extract_import_candidates),
+    resolved to the most specific candidate that is a project module;
+    imports of anything outside the project are dropped.
+
+    The graph is updated per changed file. Transitive closures are cached
+    and only the cached answers a change can affect are invalidated. Adding
+    or removing a file can change how other files' imports resolve, so that
+    re-resolves every edge, which is cheap next to parsing.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._candidates: Dict[str, List[List[str]]] = {}
+        self._module_to_path: Dict[str, str] = {}
+        self._forward: Dict[str, Set[str]] = {}
+        self._reverse: Dict[str, Set[str]] = {}
+        self._closure_cache: Dict[str, FrozenSet[str]] = {}
+        self._reverse_closure_cache: Dict[str, FrozenSet[str]] = {}
+        self.loaded = False
+
+    # --- Maintenance ---
+
+    def load(self, imports_by_path: Dict[str, List[List[str]]]):
+        """Replaces the whole graph, e.g. from the symbol store on a warm start."""
+        with self._lock:
+            self._candidates = dict(imports_by_path)
+            self._rebuild()
+            self.loaded = True
+
+    def update(self, changed: Dict[str, List[List[str]]], removed: Iterable[str] = ()):
+        """Applies re-parsed files (path -> import candidates) and deleted files."""
+        removed = [path for path in removed if path in self._candidates]
+        if not changed and not removed:
+            return
+        with self._lock:
+            module_set_changed = bool(removed) or any(path not in self._candidates for path in changed)
+            for path in removed:
+                del self._candidates[path]
+            self._candidates.update(changed)
+            if module_set_changed:
+                self._rebuild()
+                return
+            for path in changed:
+                old_targets = self._forward.get(path, set())
+                new_targets = self._resolve(path)
+                if new_targets == old_targets:
+                    continue
+                self._invalidate(path, old_targets | new_targets)
+                for target in old_targets - new_targets:
+                    self._reverse.get(target, set()).discard(path)
+                for target in new_targets - old_targets:
+                    self._reverse.setdefault(target, set()).add(path)
+                self._forward[path] = new_targets
+
+    def _rebuild(self):
+        self._module_to_path = {package_module_name(module_path_for(path)): path for path in self._candidates}
+        self._forward = {path: self._resolve(path) for path in self._candidates}
+        self._reverse = {path: set() for path in self._candidates}
+        for path, targets in self._forward.items():
+            for target in targets:
+                self._reverse[target].add(path)
+        self._closure_cache.clear()
+        self._reverse_closure_cache.clear()
+
+    def _resolve(self, path: str) -> Set[str]:
+        targets = set()
+        for candidates in self._candidates.get(path, []):
+            for module in candidates:
+                target = self._module_to_path.get(module)
+                if target:
+                    if target != path:
+                        targets.add(target)
+                    break
+        return targets
+
+    def _invalidate(self, path: str, affected_targets: Set[str]):
+        """
+        A change to path's edges alters the forward closure of path and of
+        everything that reaches path, and the reverse closure of everything
+        path reaches (before or after the change).
+        """
+        for node in [n for n, closure in self._closure_cache.items() if n == path or path in closure]:
+            del self._closure_cache[node]
+        reachable = set(affected_targets)
+        for target in affected_targets:
+            reachable |= self._closure_cache.get(target) or self._walk(target, self._forward)
+        for node in reachable | {path}:
+            self._reverse_closure_cache.pop(node, None)
+
+    @staticmethod
+    def _walk(start: str, edges: Dict[str, Set[str]]) -> Set[str]:
+        seen: Set[str] = set()
+        stack = [start]
+        while stack:
+            for neighbour in edges.get(stack.pop(), ()):
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    stack.append(neighbour)
+        seen.discard(start)
+        return seen
+
+    # --- Queries (all paths are relative POSIX paths) ---
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._candidates
+
+    def path_for_module(self, module: str) -> Optional[str]:
+        return self._module_to_path.get(module)
+
+    def dependencies(self, path: str) -> Set[str]:
+        """Project files path imports directly."""
+        with self._lock:
+            return set(self._forward.get(path, ()))
+
+    def dependents(self, path: str) -> Set[str]:
+        """Project files that import path directly."""
+        with self._lock:
+            return set(self._reverse.get(path, ()))
+
+    def transitive_dependencies(self, path: str) -> FrozenSet[str]:
+        """Everything path imports, directly or indirectly."""
+        with self._lock:
+            if path not in self._closure_cache:
+                self._closure_cache[path] = frozenset(self._walk(path, self._forward))
+            return self._closure_cache[path]
+
+    def transitive_dependents(self, path: str) -> FrozenSet[str]:
+        """Everything that imports path, directly or indirectly; i.e. what a change to path can break."""
+        with self._lock:
+            if path not in self._reverse_closure_cache:
+                self._reverse_closure_cache[path] = frozenset(self._walk(path, self._reverse))
+            return self._reverse_closure_cache[path]
+
+    def related_files(self, paths: Iterable[str]) -> Set[str]:
+        """paths, everything they depend on, and their direct dependents: the context needed to change them."""
+        related: Set[str] = set()
+        for path in paths:
+            if path in self._candidates:
+                related.add(path)
+                related |= self.transitive_dependencies(path)
+                related |= self.dependents(path)
+        return related
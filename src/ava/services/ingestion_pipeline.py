@@ -0,0 +1,130 @@
+# src/ava/services/ingestion_pipeline.py
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
+
+from src.ava.services.chunking_service import ChunkingService
+
+BINARY_SNIFF_BYTES = 8192
+
+# One chunker per worker process, so its tokenizer is loaded once per worker rather than per file.
+_worker_chunker: Optional[ChunkingService] = None
+
+
+def _init_chunk_worker():
+    global _worker_chunker
+    _worker_chunker = ChunkingService()
+
+
+def _read_and_chunk(path_str: str, max_file_bytes: int,
+                    base_path: Optional[str]) -> Tuple[str, List[Dict[str, Any]], Optional[str]]:
+    """
+    Runs in a worker process. Returns (path, chunks, skip_reason); skip_reason
+    is None when the file was chunked.
+    """
+    path = Path(path_str)
+    try:
+        size = path.stat().st_size
+        if size > max_file_bytes:
+            return path_str, [], f"larger than {max_file_bytes // 1024} KB"
+        raw = path.read_bytes()
+    except OSError as e:
+        return path_str, [], f"unreadable ({e})"
+    if b"\0" in raw[:BINARY_SNIFF_BYTES]:
+        return path_str, [], "binary"
+    content = raw.decode("utf-8", errors="ignore")
+    return path_str, _worker_chunker.chunk_document(content, path_str, base_path), None
+
+
+class IngestionPipeline:
+    """
+    Reads, decodes and chunks files on a bounded process pool and streams the
+    results back as they complete, so the Qt event loop only handles progress
+    and uploads. Chunks are handed to on_batch in batches of at least
+    batch_size; a file's chunks never straddle two batches, so per-file
+    replacement on the server sees every chunk of a file at once.
+    """
+
+    def __init__(self, max_workers: int = 0, max_file_bytes: int = 2 * 1024 * 1024, batch_size: int = 500,
+                 max_in_flight_per_worker: int = 4):
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_file_bytes = max_file_bytes
+        self.batch_size = batch_size
+        self.max_in_flight_per_worker = max_in_flight_per_worker
+
+    async def run(self, file_paths: List[Path],
+                  on_batch: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+                  on_progress: Optional[Callable[[int, int, int], None]] = None,
+                  on_chunked: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                  base_path: Optional[Path] = None) -> Dict[str, Any]:
+        """
+        Chunks file_paths in worker processes.
+
+        Args:
+            file_paths: Files to ingest.
+            on_batch: Coroutine receiving each full batch of chunks (and the final partial one).
+            on_progress: Called with (files_done, files_total, chunks_so_far) as files complete.
+            on_chunked: Called with each file's chunks as they arrive (e.g. for the chunking report).
+            base_path: Root for the chunks' relative-path metadata.
+
+        Returns:
+            Totals: files, chunks, and skipped files with their reasons.
+        """
+        if not file_paths:
+            return {"files": 0, "chunks": 0, "skipped": {}}
+        loop = asyncio.get_running_loop()
+        workers = max(1, min(self.max_workers, len(file_paths)))
+        max_in_flight = workers * self.max_in_flight_per_worker
+        pending_chunks: List[Dict[str, Any]] = []
+        skipped: Dict[str, str] = {}
+        total_chunks = 0
+        done = 0
+
+        # 'spawn' everywhere, so workers never inherit a forked Qt application state.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_chunk_worker) as executor:
+            remaining = iter(file_paths)
+            in_flight: Dict[asyncio.Future, Path] = {}
+
+            def submit_next() -> bool:
+                path = next(remaining, None)
+                if path is None:
+                    return False
+                in_flight[loop.run_in_executor(executor, _read_and_chunk, str(path), self.max_file_bytes,
+                                               str(base_path) if base_path else None)] = path
+                return True
+
+            while len(in_flight) < max_in_flight and submit_next():
+                pass
+
+            while in_flight:
+                finished, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for future in finished:
+                    path = in_flight.pop(future)
+                    submit_next()
+                    done += 1
+                    try:
+                        path_str, chunks, skip_reason = future.result()
+                    except Exception as e:
+                        skipped[str(path)] = f"chunking failed ({e})"
+                        continue
+                    if skip_reason:
+                        skipped[path_str] = skip_reason
+                        continue
+                    if on_chunked:
+                        on_chunked(chunks)
+                    pending_chunks.extend(chunks)
+                    total_chunks += len(chunks)
+
+                if len(pending_chunks) >= self.batch_size:
+                    batch, pending_chunks = pending_chunks, []
+                    await on_batch(batch)
+                if on_progress:
+                    on_progress(done, len(file_paths), total_chunks)
+
+        if pending_chunks:
+            await on_batch(pending_chunks)
+        return {"files": len(file_paths), "chunks": total_chunks, "skipped": skipped}
@@ -1,10 +1,13 @@
-import ast
 import json
 import textwrap
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
 from dataclasses import dataclass
+from src.ava.core.module_availability import ModuleAvailabilityIndex
+from src.ava.core.workspace_inventory import WorkspaceInventory
 from src.ava.services.context_manager import GenerationContext
+from src.ava.utils.code_analysis import analyze_code
+from src.ava.utils.symbol_extractor import module_path_for, package_module_name
 
 
 @dataclass
@@ -82,20 +85,21 @@ class IntegrationValidator:
         """Validate that all imports can be resolved."""
         issues = []
 
-        try:
-            tree = ast.parse(code)
-
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Import):
-                    for alias in node.names:
-                        if not self._can_resolve_import(alias.name, previously_generated, context):
-                            issues.append(f"Cannot resolve import: {alias.name}")
-                elif isinstance(node, ast.ImportFrom):
-                    if node.module and not self._can_resolve_import(node.module, previously_generated, context):
-                        issues.append(f"Cannot resolve import: from {node.module}")
-
-        except SyntaxError as e:
-            issues.append(f"Syntax error in code: {e}")
+        analysis = analyze_code(code)
+        if analysis.syntax_error:
+            issues.append(f"Syntax error in code: {analysis.syntax_error}")
+            return issues
+
+        module_index = self._get_module_index()
+        project_modules = self._get_project_modules()
+        for imported in analysis.imports:
+            if not imported.is_from:
+                if not self._can_resolve_import(imported.module, previously_generated, context,
+                                                module_index, project_modules):
+                    issues.append(f"Cannot resolve import: {imported.module}")
+            elif imported.module and not self._can_resolve_import(imported.module, previously_generated, context,
+                                                                  module_index, project_modules):
+                issues.append(f"Cannot resolve import: from {imported.module}")
 
         return issues
 
@@ -112,15 +116,36 @@ class IntegrationValidator:
         # This would be expanded with interface contract validation
         return []
 
+    def _get_module_index(self) -> Optional[ModuleAvailabilityIndex]:
+        project_manager = self.service_manager.get_project_manager()
+        if not project_manager or not project_manager.active_project_path:
+            return None
+        return ModuleAvailabilityIndex.for_project(project_manager.active_project_path,
+                                                   project_manager.venv_python_path)
+
+    def _get_project_modules(self) -> Set[str]:
+        """Every module and package path of the project on disk, e.g. {'game', 'game.player', 'main'}."""
+        project_manager = self.service_manager.get_project_manager()
+        if not project_manager or not project_manager.active_project_path:
+            return set()
+        modules = set()
+        for relative_path in WorkspaceInventory.for_root(project_manager.active_project_path).by_extension(".py"):
+            parts = package_module_name(module_path_for(relative_path)).split(".")
+            modules.update(".".join(parts[:i]) for i in range(1, len(parts) + 1))
+        return modules
+
     def _can_resolve_import(self, import_name: str, previously_generated: Dict[str, str],
-                            context: GenerationContext) -> bool:
+                            context: GenerationContext,
+                            module_index: Optional[ModuleAvailabilityIndex] = None,
+                            project_modules: Optional[Set[str]] = None) -> bool:
         """Check if an import can be resolved."""
-        # Check if it's a standard library import
-        try:
-            __import__(import_name.split('.')[0])
+        # Check if it's a standard library or installed module, without importing it
+        if module_index and module_index.is_available(import_name):
+            return True
+
+        # Check if it's a module of the project on disk
+        if project_modules and import_name in project_modules:
             return True
-        except ImportError:
-            pass
 
         # Check if it's in previously generated files
         for filename in previously_generated:
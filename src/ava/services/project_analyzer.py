@@ -1,6 +1,7 @@
-import os
 from pathlib import Path
 
+from src.ava.core.workspace_inventory import WorkspaceInventory
+
 
 class ProjectAnalyzer:
     """
@@ -29,27 +30,16 @@ class ProjectAnalyzer:
         print(f"[ProjectAnalyzer] Analyzing project at: {project_path}")
         project_files = {}
 
-        # Define files/folders to ignore during analysis
-        ignore_list = ['.git', 'venv', '.venv', '__pycache__', 'node_modules', 'build', 'dist', '.idea', '.vscode',
-                       'rag_db']
-
-        # Walk through the directory and read files
-        for root, dirs, files in os.walk(project_path, topdown=True):
-            # Modify dirs in-place to skip ignored directories
-            dirs[:] = [d for d in dirs if d not in ignore_list]
-
-            for file in files:
-                try:
-                    file_path = Path(root) / file
-                    relative_path = file_path.relative_to(project_path)
-
-                    # Simple check to avoid trying to read binary files
-                    if file_path.suffix.lower() in ['.py', '.js', '.html', '.css', '.md', '.txt', '.json', '.toml',
-                                                    '.pyc', '.gitignore', '.env']:
-                        project_files[str(relative_path)] = file_path.read_text(encoding='utf-8')
-                except Exception:
-                    print(f"[ProjectAnalyzer] Warning: Could not read file {file_path}")
-                    pass  # Ignore files that can't be read
+        # Simple extension check to avoid trying to read binary files
+        inventory = WorkspaceInventory.for_root(project_path)
+        for relative_path in inventory.by_extension('.py', '.js', '.html', '.css', '.md', '.txt', '.json', '.toml',
+                                                    '.gitignore', '.env'):
+            file_path = inventory.absolute(relative_path)
+            try:
+                project_files[str(Path(relative_path))] = file_path.read_text(encoding='utf-8')
+            except Exception:
+                print(f"[ProjectAnalyzer] Warning: Could not read file {file_path}")
+                pass  # Ignore files that can't be read
 
         print(f"[ProjectAnalyzer] Analysis complete. Found {len(project_files)} readable files.")
         return project_files
\ No newline at end of file
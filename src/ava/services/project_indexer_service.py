@@ -1,22 +1,60 @@
 # src/ava/services/project_indexer_service.py
-import ast
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.ava.core.workspace_inventory import WorkspaceInventory
+from src.ava.services.import_graph import ImportGraph
+from src.ava.services.symbol_store import SymbolStore
+from src.ava.utils.code_analysis import analyze_code
+from src.ava.utils.symbol_extractor import INDEXED_KINDS, module_path_for, parse_file_symbols
+
+# Below this many files to parse, a process pool costs more to start than it saves.
+PARALLEL_PARSE_MIN_FILES = 64
 
 
 class ProjectIndexerService:
     """
     Scans a Python project directory and builds an index of all globally
-    defined classes and functions.
+    defined classes, functions and constants. build_index returns the flat
+    name -> module map; the underlying SymbolStore also keeps methods,
+    signatures and locations, and answers lookup/search queries. The
+    import_graph is kept in step with the index.
+
+    The index is persisted in the project's .ava_cache/symbols.db. A file is
+    re-parsed only when its content hash changed since it was last indexed;
+    unchanged (mtime, size) pairs skip even the hash. Cold builds parse on a
+    process pool.
     """
 
-    def __init__(self):
+    def __init__(self, max_workers: int = 0):
         self.index: Dict[str, str] = {}
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self._store: Optional[SymbolStore] = None
+        self._store_root: Optional[Path] = None
+        self.import_graph = ImportGraph()
         print("[ProjectIndexer] Initialized.")
 
+    def _get_store(self, project_root: Path) -> Optional[SymbolStore]:
+        project_root = project_root.resolve()
+        if self._store_root != project_root:
+            if self._store:
+                self._store.close()
+            self._store, self._store_root = None, project_root
+            self.import_graph = ImportGraph()
+            try:
+                self._store = SymbolStore(project_root)
+            except Exception as e:
+                print(f"[ProjectIndexer] Warning: Symbol cache unavailable, indexing in memory only: {e}")
+        return self._store
+
     def build_index(self, project_root: Path) -> Dict[str, str]:
         """
-        Scans all Python files in a project root and builds the definition index.
+        Brings the persisted index up to date with the project and returns it.
 
         Args:
             project_root: The root path of the project to scan.
@@ -28,20 +66,128 @@ class ProjectIndexerService:
         if not project_root.is_dir():
             return {}
 
-        print(f"[ProjectIndexer] Starting scan of project: {project_root}")
-        for py_file in project_root.rglob("*.py"):
-            # Exclude files in virtual environments
-            if ".venv" in py_file.parts or "venv" in py_file.parts:
+        started = time.perf_counter()
+        inventory = WorkspaceInventory.for_root(project_root)
+        store = self._get_store(project_root)
+        known = store.file_states() if store else {}
+
+        # Stat each file afresh: in-place saves raise no directory event, so the inventory's stamps can be stale.
+        current: Dict[str, Tuple[int, int]] = {}
+        for relative_path in inventory.by_extension(".py"):
+            try:
+                stat = os.stat(inventory.absolute(relative_path))
+            except OSError:
                 continue
+            current[relative_path] = (stat.st_mtime_ns, stat.st_size)
 
+        touched: List[Tuple[str, int, int]] = []
+        to_parse: Dict[str, Tuple[int, int, str]] = {}
+        for relative_path, (mtime_ns, size) in current.items():
+            previous = known.get(relative_path)
+            if previous and previous[0] == mtime_ns and previous[1] == size:
+                continue
             try:
-                self._parse_file(py_file, project_root)
-            except Exception as e:
-                print(f"[ProjectIndexer] Warning: Could not parse {py_file.name}: {e}")
+                sha1 = hashlib.sha1(inventory.absolute(relative_path).read_bytes()).hexdigest()
+            except OSError as e:
+                print(f"[ProjectIndexer] Warning: Could not read {relative_path}: {e}")
+                continue
+            if previous and previous[2] == sha1:
+                touched.append((relative_path, mtime_ns, size))
+            else:
+                to_parse[relative_path] = (mtime_ns, size, sha1)
+
+        parsed = []
+        for relative_path, symbols, imports, error in self._parse_files(inventory, list(to_parse)):
+            if error:
+                print(f"[ProjectIndexer] Warning: Could not parse {Path(relative_path).name}: {error}")
+            mtime_ns, size, sha1 = to_parse[relative_path]
+            parsed.append((relative_path, module_path_for(relative_path), mtime_ns, size, sha1, symbols, imports))
+
+        removed = [path for path in known if path not in current]
+        if store:
+            store.touch_files(touched)
+            store.replace_files(parsed)
+            store.remove_files(removed)
+            definitions = store.definitions()
+        else:
+            definitions = [(record["name"], module, path) for path, module, _, _, _, records, _ in sorted(parsed)
+                           for record in records if record["top_level"] and record["kind"] in INDEXED_KINDS]
+
+        if store and not self.import_graph.loaded:
+            self.import_graph.load(store.file_imports())
+        else:
+            self.import_graph.update({entry[0]: entry[6] for entry in parsed}, removed)
 
-        print(f"[ProjectIndexer] Scan complete. Found {len(self.index)} definitions.")
+        for name, module_path, _ in definitions:
+            if name in self.index and self.index[name] != module_path:
+                print(f"[ProjectIndexer] Warning: Duplicate definition found for '{name}'. Overwriting.")
+            self.index[name] = module_path
+
+        print(f"[ProjectIndexer] Index up to date: {len(self.index)} definitions from {len(current)} files "
+              f"({len(parsed)} parsed, {len(removed)} removed) in {(time.perf_counter() - started) * 1000:.0f} ms.")
         return self.index.copy()
 
+    def _parse_files(self, inventory: WorkspaceInventory, relative_paths: List[str]):
+        if not relative_paths:
+            return []
+        jobs = [(relative_path, str(inventory.absolute(relative_path))) for relative_path in relative_paths]
+        workers = min(self.max_workers, len(jobs))
+        if len(jobs) < PARALLEL_PARSE_MIN_FILES or workers < 2:
+            return [parse_file_symbols(*job) for job in jobs]
+        print(f"[ProjectIndexer] Parsing {len(jobs)} files on {workers} worker processes...")
+        # 'spawn' everywhere, so workers never inherit a forked Qt application state.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            chunksize = max(1, len(jobs) // (workers * 4))
+            return list(executor.map(parse_file_symbols, *zip(*jobs), chunksize=chunksize))
+
+    # --- Symbol queries (valid after build_index) ---
+
+    def lookup(self, name: str) -> List[Dict[str, Any]]:
+        """Every indexed symbol named name (or with that qualified name), exported top-level ones first."""
+        return self._store.lookup(name) if self._store else []
+
+    def search(self, query: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Fuzzy search over qualified names and docstrings."""
+        return self._store.search(query, limit) if self._store else []
+
+    def search_prefix(self, prefix: str, limit: int = 50) -> List[Dict[str, Any]]:
+        return self._store.search_prefix(prefix, limit) if self._store else []
+
+    def resolve_import(self, name: str, current_module: str) -> Optional[str]:
+        """
+        The module to import name from, or None. When several modules define
+        it, exported definitions win, then the module sharing the longest
+        package prefix with current_module, then the shortest module path.
+        """
+        candidates = [r for r in (self._store.lookup(name, top_level_only=True) if self._store else [])
+                      if r["kind"] in INDEXED_KINDS and r["module"] != current_module]
+        if not candidates:
+            return None
+        current_parts = current_module.split(".")
+
+        def shared_prefix(module: str) -> int:
+            shared = 0
+            for a, b in zip(module.split("."), current_parts):
+                if a != b:
+                    break
+                shared += 1
+            return shared
+
+        best = min(candidates, key=lambda r: (not r["exported"], -shared_prefix(r["module"]),
+                                              len(r["module"]), r["module"]))
+        return best["module"]
+
+    def symbols_for_prompt(self, query: str, limit: int = 150) -> Dict[str, str]:
+        """A name -> module map of the indexed top-level symbols most relevant to query."""
+        selected: Dict[str, str] = {}
+        for term in dict.fromkeys(w for w in query.replace("/", " ").replace("_", " ").split() if len(w) >= 3):
+            for record in self.search(term, limit):
+                if record["top_level"] and record["kind"] in INDEXED_KINDS:
+                    selected.setdefault(record["name"], record["module"])
+                if len(selected) >= limit:
+                    return selected
+        return selected
+
     def get_symbols_from_content(self, content: str, module_path: str) -> Dict[str, str]:
         """
         Parses Python code content and returns a dictionary of its top-level symbols.
@@ -53,29 +199,9 @@ class ProjectIndexerService:
         Returns:
             A dictionary mapping symbol names to the provided module_path.
         """
-        symbols = {}
-        try:
-            tree = ast.parse(content)
-            for node in ast.walk(tree):
-                if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
-                    # A simple way to check for top-level is to check the column offset
-                    if hasattr(node, 'col_offset') and node.col_offset == 0:
-                        symbols[node.name] = module_path
-        except Exception as e:
-            print(f"[ProjectIndexer] Warning: Could not parse content for module '{module_path}': {e}")
-        return symbols
-
-    def _parse_file(self, file_path: Path, project_root: Path):
-        """Parses a single Python file and adds its symbols to the index."""
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-
-        # Calculate the Python module path (e.g., 'game_logic.player')
-        relative_path = file_path.relative_to(project_root)
-        module_path = str(relative_path.with_suffix('')).replace('\\', '/').replace('/', '.')
-
-        new_symbols = self.get_symbols_from_content(content, module_path)
-        for symbol, mod_path in new_symbols.items():
-            if symbol in self.index:
-                print(f"[ProjectIndexer] Warning: Duplicate definition found for '{symbol}'. Overwriting.")
-            self.index[symbol] = mod_path
\ No newline at end of file
+        analysis = analyze_code(content)
+        if analysis.syntax_error:
+            print(f"[ProjectIndexer] Warning: Could not parse content for module '{module_path}': {analysis.syntax_error}")
+            return {}
+        return {record["name"]: module_path for record in analysis.symbols
+                if record["top_level"] and record["kind"] in INDEXED_KINDS}
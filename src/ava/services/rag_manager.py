@@ -1,7 +1,7 @@
 # src/ava/services/rag_manager.py
 import asyncio
 from pathlib import Path
-from typing import List, Dict, Any  # Added for type hinting
+from typing import List, Dict, Any, Optional  # Added for type hinting
 
 from PySide6.QtCore import QObject, Signal
 from PySide6.QtWidgets import QFileDialog, QMessageBox
@@ -9,6 +9,7 @@ from PySide6.QtWidgets import QFileDialog, QMessageBox
 from src.ava.services.rag_service import RAGService
 from src.ava.services.directory_scanner_service import DirectoryScannerService
 from src.ava.services.chunking_service import ChunkingService
+from src.ava.services.ingestion_pipeline import IngestionPipeline
 from src.ava.core.event_bus import EventBus  # Added EventBus import
 
 
@@ -17,6 +18,7 @@ class RAGManager(QObject):
     Manages RAG pipeline interactions. Process lifecycle is now handled by ServiceManager.
     """
     log_message = Signal(str, str, str)
+    PROGRESS_EVERY_N_FILES = 25
 
     def __init__(self, event_bus: EventBus, project_root: Path):  # Added EventBus type hint
         super().__init__()
@@ -25,7 +27,8 @@ class RAGManager(QObject):
         self.project_manager = None  # Should be type hinted: Optional[ProjectManager]
         self.rag_service = RAGService()
         self.scanner = DirectoryScannerService()
-        self.chunker = ChunkingService()
+        self.chunker = ChunkingService()  # Aggregates the chunking report; workers chunk with their own
+        self.pipeline = IngestionPipeline()
 
         self.log_message.connect(
             lambda src, type, msg: self.event_bus.emit("log_message_received", src, type, msg)
@@ -81,41 +84,75 @@ class RAGManager(QObject):
         else:
             self.log_message.emit("RAGManager", "warning", "No supported source files found in the project to ingest.")
 
-    async def ingest_files(self, file_paths: List[Path], target_collection: str):
+    async def ingest_files(self, file_paths: List[Path], target_collection: str, base_path: Optional[Path] = None):
         """
         Chunks and ingests a list of files into the specified RAG collection.
+        Reading and chunking run on the ingestion pipeline's process pool;
+        this coroutine only uploads finished batches and reports progress.
 
         Args:
             file_paths: List of Path objects for the files to ingest.
             target_collection: "project" or "global".
+            base_path: Directory the chunks' 'rel_path' metadata is relative to. Defaults
+                to the active project root for project ingestion.
         """
         try:
             self.log_message.emit("RAGManager", "info",
                                   f"Starting ingestion for {len(file_paths)} file(s) into '{target_collection}' KB...")
-            all_chunks: List[Dict[str, Any]] = []  # Ensure all_chunks is typed
-            for file_path in file_paths:
-                try:
-                    content = file_path.read_text(encoding='utf-8', errors='ignore')
-                    chunks = self.chunker.chunk_document(content, str(file_path))
-                    all_chunks.extend(chunks)
-                except Exception as e:
-                    self.log_message.emit("RAGManager", "warning",
-                                          f"Failed to chunk {file_path.name} for '{target_collection}' KB: {e}")
-
-            if not all_chunks:
+            project_path = None
+            if target_collection == "project" and self.project_manager and self.project_manager.active_project_path:
+                # Scope explicitly so a concurrent project switch can't redirect this ingest.
+                project_path = str(self.project_manager.active_project_path)
+                base_path = base_path or self.project_manager.active_project_path
+
+            upload_errors: List[str] = []
+            uploaded = 0
+
+            async def upload_batch(batch: List[Dict[str, Any]]):
+                nonlocal uploaded
+                if target_collection == "global":
+                    # Global libraries can be huge; the bulk path encodes on the server's worker pool.
+                    success, message = await self.rag_service.bulk_add(batch, target_collection=target_collection)
+                else:
+                    # Chunk IDs are content-addressed: unchanged code is not re-embedded, and chunks
+                    # of re-ingested files that no longer exist are dropped.
+                    success, message = await self.rag_service.add(batch, target_collection=target_collection,
+                                                                  project_path=project_path, skip_existing=True,
+                                                                  replace_sources=True)
+                if success:
+                    uploaded += len(batch)
+                else:
+                    upload_errors.append(message)
+
+            def report_progress(files_done: int, files_total: int, chunks_so_far: int):
+                if files_done == files_total or files_done % self.PROGRESS_EVERY_N_FILES == 0:
+                    self.log_message.emit("RAGManager", "info",
+                                          f"Ingesting into '{target_collection}' KB: {files_done}/{files_total} "
+                                          f"files, {chunks_so_far} chunks...")
+
+            summary = await self.pipeline.run(file_paths, on_batch=upload_batch, on_progress=report_progress,
+                                              on_chunked=self.chunker.record_chunk_sizes, base_path=base_path)
+
+            if self.chunker.get_chunking_report():
+                self.log_message.emit("RAGManager", "info", self.chunker.format_chunking_report())
+            self.chunker.reset_chunking_report()
+            if summary["skipped"]:
+                reasons = ", ".join(f"{Path(p).name} ({r})" for p, r in list(summary["skipped"].items())[:10])
+                self.log_message.emit("RAGManager", "warning",
+                                      f"Skipped {len(summary['skipped'])} file(s) for '{target_collection}' KB: {reasons}")
+
+            if not summary["chunks"]:
                 self.log_message.emit("RAGManager", "warning",
                                       f"No content to ingest for '{target_collection}' KB after chunking.")
                 return
-
-            self.log_message.emit("RAGManager", "info",
-                                  f"Ingesting {len(all_chunks)} chunks into '{target_collection}' knowledge base...")
-            success, message = await self.rag_service.add(all_chunks, target_collection=target_collection)
-            if success:
-                self.log_message.emit("RAGManager", "success",
-                                      f"Ingestion into '{target_collection}' KB complete. {message}")
-            else:
+            if upload_errors:
                 self.log_message.emit("RAGManager", "error",
-                                      f"Ingestion into '{target_collection}' KB failed. {message}")
+                                      f"Ingestion into '{target_collection}' KB failed for some batches "
+                                      f"({uploaded}/{summary['chunks']} chunks stored). {upload_errors[0]}")
+            else:
+                self.log_message.emit("RAGManager", "success",
+                                      f"Ingestion into '{target_collection}' KB complete. "
+                                      f"{uploaded} chunks from {summary['files'] - len(summary['skipped'])} file(s).")
         except Exception as e:
             self.log_message.emit("RAGManager", "error", f"Ingestion process for '{target_collection}' KB failed: {e}")
 
@@ -145,7 +182,8 @@ class RAGManager(QObject):
             files_to_ingest = self.scanner.scan(str(directory_path))
             if files_to_ingest:
                 # Explicitly target "global" collection
-                asyncio.create_task(self.ingest_files(files_to_ingest, target_collection="global"))
+                asyncio.create_task(self.ingest_files(files_to_ingest, target_collection="global",
+                                                      base_path=directory_path))
             else:
                 self.log_message.emit("RAGManager", "warning",
                                       f"No supported files found in '{directory_path.name}' for GLOBAL KB.")
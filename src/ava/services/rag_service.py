@@ -2,7 +2,7 @@
 import aiohttp
 import asyncio
 from pathlib import Path
-from typing import List, Dict, Any # Added List, Dict, Any for type hinting
+from typing import List, Dict, Any, Optional, Union # Added List, Dict, Any for type hinting
 
 
 class RAGService:
@@ -66,10 +66,16 @@ class RAGService:
         except Exception as e:
             return False, f"Failed to switch RAG project context: {e}"
 
-    async def add(self, chunks: List[Dict[str, Any]], target_collection: str = "project") -> tuple[bool, str]:
+    async def add(self, chunks: List[Dict[str, Any]], target_collection: str = "project",
+                  project_path: Optional[str] = None, skip_existing: bool = False,
+                  replace_sources: bool = False) -> tuple[bool, str]:
         """
         Sends a list of document chunks to the RAG server for ingestion
         into the specified target_collection ('project' or 'global').
+        If project_path is given, the server writes to that project's collection
+        instead of its /set_collection default. With skip_existing, chunks whose
+        IDs are already stored are not re-embedded; with replace_sources, stored
+        chunks of the same files that are no longer produced are removed.
         """
         if not await self.check_connection():
             return False, "RAG Service is not running or is unreachable after retries."
@@ -79,6 +85,12 @@ class RAGService:
             "documents": chunks,
             "target_collection": target_collection # Pass the target to the server
         }
+        if project_path:
+            payload["project_path"] = project_path
+        if skip_existing:
+            payload["skip_existing"] = True
+        if replace_sources:
+            payload["replace_sources"] = True
 
         try:
             async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120.0)) as session:
@@ -98,10 +110,52 @@ class RAGService:
             print(f"[RAGService] {message}")
             return False, message
 
-    async def query(self, query_text: str, n_results: int = 5, target_collection: str = "project") -> str:
+    async def bulk_add(self, chunks: List[Dict[str, Any]], target_collection: str = "global",
+                       project_path: Optional[str] = None, batch_size: int = 5000) -> tuple[bool, str]:
+        """
+        Sends a large ingest to the server's /bulk_add endpoint in batches. The
+        server encodes each batch on a pool of worker processes.
+        """
+        if not await self.check_connection():
+            return False, "RAG Service is not running or is unreachable after retries."
+
+        total_written = 0
+        try:
+            # No total timeout: a large batch can take minutes to encode.
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, sock_connect=10.0)) as session:
+                for start in range(0, len(chunks), batch_size):
+                    batch = chunks[start:start + batch_size]
+                    payload: Dict[str, Any] = {"documents": batch, "target_collection": target_collection}
+                    if project_path:
+                        payload["project_path"] = project_path
+                    async with session.post(f"{self.server_url}/bulk_add", json=payload) as response:
+                        if response.status != 200:
+                            error_detail = await response.text()
+                            return False, (f"Error: RAG server returned status {response.status} after "
+                                           f"{total_written} chunks. Details: {error_detail}")
+                    total_written += len(batch)
+                    print(f"[RAGService] Bulk ingest into '{target_collection}': {total_written}/{len(chunks)} chunks.")
+            return True, f"Bulk-added {total_written} chunks to '{target_collection}' collection."
+        except Exception as e:
+            return False, f"An unexpected error occurred during bulk ingestion into '{target_collection}': {e}"
+
+    async def query(self, query_text: str, n_results: int = 5,
+                    target_collection: Union[str, List[str]] = "project",
+                    project_path: Optional[str] = None,
+                    source_quotas: Optional[Dict[str, int]] = None,
+                    where: Optional[Dict[str, Any]] = None,
+                    path_prefixes: Optional[List[str]] = None) -> str:
         """
         Queries the external RAG server from the specified target_collection
-        and returns a formatted string of context.
+        and returns a formatted string of context. If project_path is given,
+        the query is scoped to that project rather than the server's default.
+
+        target_collection may be 'both' or a list of collections; the server then
+        embeds the query once and merges the results, labelling each snippet
+        with its source. source_quotas caps the hits taken from each source.
+        where is a Chroma-style metadata filter (e.g. {"language": "python"});
+        path_prefixes restricts the project collection to project-relative
+        files or directories.
         """
         if not await self.check_connection():
             return f"RAG Service is not running or is unreachable after retries (target: {target_collection})."
@@ -112,6 +166,14 @@ class RAGService:
             "n_results": n_results,
             "target_collection": target_collection # Pass the target to the server
         }
+        if project_path:
+            query_payload["project_path"] = project_path
+        if source_quotas:
+            query_payload["source_quotas"] = source_quotas
+        if where:
+            query_payload["where"] = where
+        if path_prefixes:
+            query_payload["path_prefixes"] = path_prefixes
 
         try:
             async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30.0)) as session:
@@ -128,4 +190,73 @@ class RAGService:
             return f"Connection Error: Could not connect to the RAG server (target: {target_collection})."
         except Exception as e:
             print(f"[RAGService] An unexpected error occurred during query (target: {target_collection}): {e}")
-            return f"An unexpected error occurred (target: {target_collection}): {e}"
\ No newline at end of file
+            return f"An unexpected error occurred (target: {target_collection}): {e}"
+
+    async def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+                     target_collection: str = "project", project_path: Optional[str] = None) -> tuple[bool, str]:
+        """
+        Deletes documents from the specified target_collection by ID and/or
+        a Chroma-style metadata filter (e.g. {"full_path": "..."}).
+        """
+        if not await self.check_connection():
+            return False, "RAG Service is not running or is unreachable after retries."
+
+        payload: Dict[str, Any] = {"ids": ids, "where": where, "target_collection": target_collection}
+        if project_path:
+            payload["project_path"] = project_path
+
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30.0)) as session:
+                async with session.post(f"{self.server_url}/delete", json=payload) as response:
+                    if response.status == 200:
+                        result = await response.json()
+                        return True, result.get("message", "Deletion successful.")
+                    error_detail = await response.text()
+                    return False, f"Error: RAG server returned status {response.status} for '{target_collection}'. Details: {error_detail}"
+        except Exception as e:
+            return False, f"An unexpected error occurred during deletion from '{target_collection}': {e}"
+
+    async def query_hits(self, query_text: str, n_results: int = 10,
+                         target_collection: Union[str, List[str]] = "project",
+                         project_path: Optional[str] = None,
+                         source_quotas: Optional[Dict[str, int]] = None,
+                         where: Optional[Dict[str, Any]] = None,
+                         path_prefixes: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Like query(), but returns the server's structured hit list (id, text, score,
+        distance, source, line span, metadata) in score order, so the caller can
+        pack context into its own token budget. Returns an empty list on failure.
+        """
+        if not await self.check_connection():
+            return []
+
+        query_payload: Dict[str, Any] = {
+            "query_text": query_text,
+            "n_results": n_results,
+            "target_collection": target_collection,
+            "return_hits": True
+        }
+        if project_path:
+            query_payload["project_path"] = project_path
+        if source_quotas:
+            query_payload["source_quotas"] = source_quotas
+        if where:
+            query_payload["where"] = where
+        if path_prefixes:
+            query_payload["path_prefixes"] = path_prefixes
+
+        try:
+            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30.0)) as session:
+                async with session.post(f"{self.server_url}/query", json=query_payload) as response:
+                    if response.status == 200:
+                        data = await response.json()
+                        return data.get("hits") or []
+                    error_detail = await response.text()
+                    print(f"[RAGService] Error from RAG server (status {response.status}, target: {target_collection}): {error_detail}")
+                    return []
+        except aiohttp.ClientConnectorError:
+            self.is_connected = False
+            return []
+        except Exception as e:
+            print(f"[RAGService] An unexpected error occurred during hit query (target: {target_collection}): {e}")
+            return []
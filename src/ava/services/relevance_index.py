@@ -0,0 +1,168 @@
+# src/ava/services/relevance_index.py
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from pathlib import PurePosixPath
+from typing import Callable, Dict, Hashable, List, Mapping, Sequence, Set, Tuple
+
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+# 'HTTPServerError2' -> 'http', 'server', 'error', '2'
+SUBWORD_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+STOP_WORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "has", "have", "i", "in",
+    "into", "is", "it", "its", "me", "my", "of", "on", "or", "please", "so", "that", "the", "then", "this",
+    "to", "we", "when", "with", "you",
+})
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Identifier-aware tokens: each identifier lowercased whole, plus its
+    snake_case and camelCase parts, so 'PlayerController' also matches a
+    prompt about the 'player' or the 'controller'.
+    """
+    tokens = []
+    for identifier in IDENTIFIER_PATTERN.findall(text):
+        lowered = identifier.lower().strip("_")
+        if len(lowered) < 2 or lowered in STOP_WORDS:
+            continue
+        tokens.append(lowered)
+        parts = [part.lower() for chunk in identifier.split("_") for part in SUBWORD_PATTERN.findall(chunk)]
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if len(part) >= 2 and part not in STOP_WORDS)
+    return tokens
+
+
+class RelevanceIndex:
+    """
+    A BM25 inverted index over one project's files, for picking the files
+    a prompt is about. Postings are kept per term, so a query only touches
+    the documents containing its terms. sync() re-tokenizes just the files
+    whose stamp (e.g. size and mtime) changed and drops deleted ones.
+    Matches in a file's path are boosted on top of its BM25 score.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, path_boost: float = 2.0):
+        self.k1 = k1
+        self.b = b
+        self.path_boost = path_boost
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._path_terms: Dict[str, Set[str]] = {}
+        self._path_postings: Dict[str, Set[str]] = {}  # path term -> paths containing it
+        self._stamps: Dict[str, Hashable] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    # --- Maintenance ---
+
+    def add(self, path: str, text: str, stamp: Hashable = None):
+        """Indexes (or re-indexes) one file."""
+        terms = Counter(tokenize(text))
+        with self._lock:
+            self._remove(path)
+            for term, count in terms.items():
+                self._postings.setdefault(term, {})[path] = count
+            self._doc_terms[path] = terms
+            length = sum(terms.values())
+            self._doc_lengths[path] = length
+            self._total_length += length
+            path_terms = set(tokenize(PurePosixPath(path).with_suffix("").as_posix().replace("/", " ")))
+            self._path_terms[path] = path_terms
+            for term in path_terms:
+                self._path_postings.setdefault(term, set()).add(path)
+            self._stamps[path] = stamp
+
+    def remove(self, path: str):
+        with self._lock:
+            self._remove(path)
+
+    def _remove(self, path: str):
+        terms = self._doc_terms.pop(path, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(path, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(path, 0)
+        for term in self._path_terms.pop(path, ()):
+            paths = self._path_postings.get(term)
+            if paths is not None:
+                paths.discard(path)
+                if not paths:
+                    del self._path_postings[term]
+        self._stamps.pop(path, None)
+
+    def sync(self, files: Mapping[str, str], stamp_for: Callable[[str], Hashable]) -> Tuple[int, int]:
+        """
+        Brings the index in line with files ({path: content}); content is
+        only read for files whose stamp_for(path) differs from the indexed
+        one. Returns (files re-indexed, files removed).
+        """
+        updated = 0
+        with self._lock:
+            removed = [path for path in self._doc_terms if path not in files]
+            for path in removed:
+                self._remove(path)
+            for path in files:
+                stamp = stamp_for(path)
+                if path in self._doc_terms and stamp is not None and self._stamps.get(path) == stamp:
+                    continue
+                try:
+                    text = files[path]
+                except KeyError:
+                    continue
+                self.add(path, text, stamp)
+                updated += 1
+        return updated, len(removed)
+
+    # --- Queries ---
+
+    def _idf(self, term: str) -> float:
+        document_frequency = len(self._postings.get(term, ()))
+        documents = len(self._doc_terms)
+        return math.log(1.0 + (documents - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def scores(self, query: str) -> Dict[str, float]:
+        """BM25 score plus path boost of every file matching at least one query term."""
+        terms = set(tokenize(query))
+        scores: Dict[str, float] = {}
+        with self._lock:
+            if not terms or not self._doc_terms:
+                return scores
+            average_length = self._total_length / len(self._doc_terms) or 1.0
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = self._idf(term)
+                for path, frequency in postings.items():
+                    norm = self.k1 * (1.0 - self.b + self.b * self._doc_lengths[path] / average_length)
+                    scores[path] = scores.get(path, 0.0) + idf * frequency * (self.k1 + 1.0) / (frequency + norm)
+            for term in terms:
+                paths = self._path_postings.get(term)
+                if paths:
+                    boost = self.path_boost * self._idf(term)
+                    for path in paths:
+                        scores[path] = scores.get(path, 0.0) + boost
+        return scores
+
+    def top_k(self, query: str, k: int, always_include: Sequence[str] = ()) -> List[str]:
+        """
+        The k best-scoring paths, best first. always_include files that are
+        indexed come first even without a match, still within k.
+        """
+        scores = self.scores(query)
+        pinned = [path for path in always_include if path in self._doc_terms]
+        best = heapq.nsmallest(k + len(pinned), scores, key=lambda path: (-scores[path], path))
+        return (pinned + [path for path in best if path not in pinned])[:k]
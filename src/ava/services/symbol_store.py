@@ -0,0 +1,219 @@
+# src/ava/services/symbol_store.py
+import difflib
+import json
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+from src.ava.utils.symbol_extractor import INDEXED_KINDS
+
+SYMBOL_DB_DIR = ".ava_cache"
+SYMBOL_DB_NAME = "symbols.db"
+SCHEMA_VERSION = 3
+
+SYMBOL_COLUMNS = ("path", "module", "name", "qualname", "kind", "signature", "decorators", "doc",
+                  "start_line", "end_line", "exported", "top_level")
+
+
+class SymbolStore:
+    """
+    The project indexer's on-disk state: one row per indexed file with the
+    (mtime_ns, size, sha1) it was parsed at, and one row per symbol with its
+    qualified name, kind, signature, decorators, docstring head, line span
+    and export status. Each file row also keeps the file's import candidates
+    for the import graph. An FTS5 table over names and docstrings backs
+    search(); when the SQLite build lacks FTS5, search falls back to LIKE.
+    A store written by a different schema version is rebuilt from scratch.
+    """
+
+    def __init__(self, project_root: Path):
+        self.db_path = Path(project_root) / SYMBOL_DB_DIR / SYMBOL_DB_NAME
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self.has_fts = False
+        self._ensure_schema()
+
+    def _ensure_schema(self):
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self._conn.executescript("""
+                DROP TRIGGER IF EXISTS symbols_fts_insert;
+                DROP TRIGGER IF EXISTS symbols_fts_delete;
+                DROP TABLE IF EXISTS symbols_fts;
+                DROP TABLE IF EXISTS symbols;
+                DROP TABLE IF EXISTS files;
+            """)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                module TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                sha1 TEXT NOT NULL,
+                imports TEXT NOT NULL DEFAULT '[]'
+            );
+            CREATE TABLE IF NOT EXISTS symbols (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                module TEXT NOT NULL,
+                name TEXT NOT NULL,
+                name_lower TEXT NOT NULL,
+                qualname TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                signature TEXT NOT NULL DEFAULT '',
+                decorators TEXT NOT NULL DEFAULT '[]',
+                doc TEXT NOT NULL DEFAULT '',
+                start_line INTEGER NOT NULL,
+                end_line INTEGER NOT NULL,
+                exported INTEGER NOT NULL,
+                top_level INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS symbols_by_path ON symbols(path);
+            CREATE INDEX IF NOT EXISTS symbols_by_name ON symbols(name);
+            CREATE INDEX IF NOT EXISTS symbols_by_name_lower ON symbols(name_lower);
+        """)
+        try:
+            # The trigram tokenizer matches any substring of three or more characters.
+            self._conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS symbols_fts USING fts5(
+                    qualname, doc, content='symbols', content_rowid='id', tokenize='trigram');
+                CREATE TRIGGER IF NOT EXISTS symbols_fts_insert AFTER INSERT ON symbols BEGIN
+                    INSERT INTO symbols_fts(rowid, qualname, doc) VALUES (new.id, new.qualname, new.doc);
+                END;
+                CREATE TRIGGER IF NOT EXISTS symbols_fts_delete AFTER DELETE ON symbols BEGIN
+                    INSERT INTO symbols_fts(symbols_fts, rowid, qualname, doc)
+                    VALUES ('delete', old.id, old.qualname, old.doc);
+                END;
+            """)
+            self.has_fts = True
+        except sqlite3.OperationalError as e:
+            print(f"[SymbolStore] Full-text search unavailable ({e}); falling back to LIKE queries.")
+        self._conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        self._conn.commit()
+
+    # --- Indexing ---
+
+    def file_states(self) -> Dict[str, Tuple[int, int, str]]:
+        """{path: (mtime_ns, size, sha1)} for every indexed file."""
+        with self._lock:
+            rows = self._conn.execute("SELECT path, mtime_ns, size, sha1 FROM files").fetchall()
+        return {row["path"]: (row["mtime_ns"], row["size"], row["sha1"]) for row in rows}
+
+    def file_imports(self) -> Dict[str, List[List[str]]]:
+        """{path: import candidates} for every indexed file."""
+        with self._lock:
+            rows = self._conn.execute("SELECT path, imports FROM files").fetchall()
+        return {row["path"]: json.loads(row["imports"]) for row in rows}
+
+    def touch_files(self, states: Iterable[Tuple[str, int, int]]):
+        """Records new (mtime_ns, size) for files whose content hash did not change."""
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE files SET mtime_ns=?, size=? WHERE path=?",
+                                   [(mtime_ns, size, path) for path, mtime_ns, size in states])
+
+    def replace_files(self, parsed: Iterable[Tuple[str, str, int, int, str, List[Dict[str, Any]], List[List[str]]]]):
+        """Replaces the rows of each (path, module, mtime_ns, size, sha1, records, imports) in one transaction."""
+        with self._lock, self._conn:
+            for path, module, mtime_ns, size, sha1, records, imports in parsed:
+                self._conn.execute("DELETE FROM symbols WHERE path=?", (path,))
+                self._conn.execute("INSERT OR REPLACE INTO files(path, module, mtime_ns, size, sha1, imports) "
+                                   "VALUES (?, ?, ?, ?, ?, ?)", (path, module, mtime_ns, size, sha1, json.dumps(imports)))
+                self._conn.executemany(
+                    "INSERT INTO symbols(path, module, name, name_lower, qualname, kind, signature, decorators, doc, "
+                    "start_line, end_line, exported, top_level) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(path, module, r["name"], r["name"].lower(), r["qualname"], r["kind"], r["signature"],
+                      json.dumps(r["decorators"]), r["doc"], r["start_line"], r["end_line"],
+                      int(r["exported"]), int(r["top_level"])) for r in records])
+
+    def remove_files(self, paths: Iterable[str]):
+        paths = [(path,) for path in paths]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM symbols WHERE path=?", paths)
+            self._conn.executemany("DELETE FROM files WHERE path=?", paths)
+
+    # --- Queries ---
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        record = {column: row[column] for column in SYMBOL_COLUMNS}
+        record["decorators"] = json.loads(record["decorators"])
+        record["exported"] = bool(record["exported"])
+        record["top_level"] = bool(record["top_level"])
+        return record
+
+    def _select(self, where: str, params: tuple, order: str = "path, start_line", limit: int = -1) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT * FROM symbols WHERE {where} ORDER BY {order} LIMIT ?",
+                                      params + (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def definitions(self) -> List[Tuple[str, str, str]]:
+        """(name, module, path) of every importable top-level symbol, ordered by path."""
+        placeholders = ",".join("?" * len(INDEXED_KINDS))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT name, module, path FROM symbols WHERE top_level=1 AND kind IN ({placeholders}) "
+                "ORDER BY path, start_line", INDEXED_KINDS).fetchall()
+        return [(row["name"], row["module"], row["path"]) for row in rows]
+
+    def lookup(self, name: str, top_level_only: bool = False) -> List[Dict[str, Any]]:
+        """Every symbol called exactly name (or with that qualified name)."""
+        where = "(name=? OR qualname=?)" + (" AND top_level=1" if top_level_only else "")
+        return self._select(where, (name, name), order="exported DESC, top_level DESC, length(module), path")
+
+    def search_prefix(self, prefix: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Symbols whose name starts with prefix, case-insensitively; uses the name_lower index."""
+        low = prefix.lower()
+        return self._select("name_lower >= ? AND name_lower < ?", (low, low + "\uffff"),
+                            order="top_level DESC, exported DESC, length(name), name", limit=limit)
+
+    def search(self, query: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Fuzzy lookup: substring matches on qualified names and docstrings,
+        ranked by BM25, then close spellings of the query for typos.
+        """
+        query = query.strip()
+        if not query:
+            return []
+        results: List[Dict[str, Any]] = []
+        terms = [t for t in re.split(r"\W+", query) if t]
+        if self.has_fts and all(len(t) >= 3 for t in terms):
+            match = " AND ".join('"' + t.replace('"', '""') + '"' for t in terms)
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT symbols.* FROM symbols_fts JOIN symbols ON symbols.id = symbols_fts.rowid "
+                    "WHERE symbols_fts MATCH ? ORDER BY bm25(symbols_fts, 5.0, 1.0), symbols.top_level DESC "
+                    "LIMIT ?", (match, limit)).fetchall()
+            results = [self._to_dict(row) for row in rows]
+        else:
+            like = "%" + query.replace("%", r"\%").replace("_", r"\_") + "%"
+            results = self._select(r"qualname LIKE ? ESCAPE '\' OR doc LIKE ? ESCAPE '\'", (like, like),
+                                   order="top_level DESC, length(name)", limit=limit)
+
+        if len(results) < limit:
+            seen = {(r["path"], r["qualname"]) for r in results}
+            with self._lock:
+                names = [row[0] for row in self._conn.execute("SELECT DISTINCT name FROM symbols").fetchall()]
+            for name in difflib.get_close_matches(query, names, n=limit - len(results), cutoff=0.75):
+                for record in self.lookup(name):
+                    if (record["path"], record["qualname"]) not in seen and len(results) < limit:
+                        seen.add((record["path"], record["qualname"]))
+                        results.append(record)
+        return results
+
+    def symbols_in_module(self, module: str) -> List[Dict[str, Any]]:
+        return self._select("module=?", (module,))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM symbols").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -3,9 +3,10 @@ import re
 import json
 import ast
 from pathlib import Path
-from typing import Set, Dict, Any, List, Tuple
+from typing import Set, Dict, Any, List, Mapping, Optional, Tuple
 from src.ava.core.event_bus import EventBus
 from src.ava.core.project_manager import ProjectManager
+from src.ava.services.project_indexer_service import ProjectIndexerService
 from src.ava.services.reviewer_service import ReviewerService
 from src.ava.prompts import INTELLIGENT_FIXER_PROMPT
 from src.ava.utils.code_summarizer import CodeSummarizer
@@ -13,10 +14,12 @@ from src.ava.utils.code_summarizer import CodeSummarizer
 
 class ValidationService:
     def __init__(self, event_bus: EventBus,
-                 project_manager: ProjectManager, reviewer_service: ReviewerService):
+                 project_manager: ProjectManager, reviewer_service: ReviewerService,
+                 project_indexer: Optional[ProjectIndexerService] = None):
         self.event_bus = event_bus
         self.project_manager = project_manager
         self.reviewer_service = reviewer_service
+        self.project_indexer = project_indexer
 
     async def review_and_fix_file(self, error_report: str) -> bool:
         """
@@ -32,13 +35,13 @@ class ValidationService:
 
         self.update_status("reviewer", "working", "Analyzing error with full project context...")
 
-        full_code_context = json.dumps(all_project_files, indent=2)
-
         crashing_file, line_number = self._parse_error_traceback(error_report)
         if crashing_file and self.project_manager.active_project_path and line_number > 0:
             self.event_bus.emit("error_highlight_requested", self.project_manager.active_project_path / crashing_file,
                                 line_number)
 
+        full_code_context = json.dumps(self._select_fix_context(all_project_files, crashing_file), indent=2)
+
         # Simplified call without git_diff
         changes_json_str = await self.reviewer_service.review_and_correct_code(
             full_code_context=full_code_context,
@@ -64,13 +67,44 @@ class ValidationService:
             self.handle_error("reviewer", f"Failed to parse AI's fix response: {e}")
             return False
 
-        self.project_manager.save_files(files_to_commit)
+        changes = self.project_manager.save_files(files_to_commit)
+        if changes.failed:
+            failures = "; ".join(f"{path}: {error}" for path, error in changes.failed.items())
+            if not changes.changed:
+                self.handle_error("reviewer", f"Could not save the proposed fix ({failures}).")
+                return False
+            self.log("warning", f"Some fixed files could not be saved: {failures}")
+        if not changes.changed:
+            self.update_status("reviewer", "success", "The proposed fix matches the files on disk; nothing changed.")
+            self.log("warning", "AI's fix did not change any file.")
+            return False
 
-        self.event_bus.emit("code_generation_complete", files_to_commit)
-        self.update_status("reviewer", "success", f"Fix applied to {len(files_to_commit)} file(s).")
+        # Only changed files are re-displayed, so untouched editors are not reloaded.
+        self.event_bus.emit("code_generation_complete", changes.changed_files(files_to_commit))
+        self.update_status("reviewer", "success", f"Fix applied to {len(changes.changed)} file(s).")
         self.log("success", "Successfully applied fix. Please try running the code again.")
         return True
 
+    def _select_fix_context(self, all_project_files: Mapping[str, str], crashing_file: Optional[str]) -> Dict[str, str]:
+        """
+        The files the fixer needs to see: the crashing file, everything it
+        imports (transitively) and the files importing it, plus all non-Python
+        files. Falls back to the whole project when the crash cannot be placed
+        in the import graph.
+        """
+        project_root = self.project_manager.active_project_path
+        if not crashing_file or not crashing_file.endswith(".py") or not self.project_indexer or not project_root:
+            return dict(all_project_files)
+        self.project_indexer.build_index(project_root)
+        related = self.project_indexer.import_graph.related_files([crashing_file])
+        if not related:
+            return dict(all_project_files)
+        selected = {path: content for path, content in all_project_files.items()
+                    if path in related or not path.endswith(".py")}
+        self.log("info", f"Fix context narrowed to {len(selected)} of {len(all_project_files)} files "
+                         f"via the import graph of {crashing_file}.")
+        return selected
+
     def _robustly_parse_json_from_llm_response(self, response_text: str) -> dict:
         match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', response_text, re.DOTALL)
         if match:
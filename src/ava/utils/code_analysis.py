@@ -0,0 +1,279 @@
+# src/ava/utils/code_analysis.py
+import ast
+import builtins
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from src.ava.utils.code_summarizer import CodeSummarizer, content_key, remember_summary
+from src.ava.utils.symbol_extractor import symbol_records_from_tree
+
+ANALYSIS_CACHE_MAX_ENTRIES = 512
+
+# Names every module can read without defining or importing them.
+BUILTIN_NAMES = frozenset(dir(builtins)) | {"__file__", "__builtins__", "__path__", "__annotations__"}
+
+_analysis_cache: "OrderedDict[str, CodeAnalysis]" = OrderedDict()
+_analysis_cache_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class ImportedModule:
+    """One import statement target: 'import a.b' -> ('a.b', 0, (), False); 'from .x import y' -> ('x', 1, ('y',), True)."""
+    module: str
+    level: int
+    names: Tuple[str, ...]
+    is_from: bool
+
+
+@dataclass(frozen=True)
+class CodeAnalysis:
+    """Everything the generation pipeline needs to know about one piece of Python source."""
+    content_hash: str
+    symbols: Tuple[Dict[str, Any], ...]  # symbol_records_from_tree records; treat as read-only
+    imports: Tuple[ImportedModule, ...]
+    undefined_names: FrozenSet[str]
+    summary: str
+    syntax_error: Optional[str]
+
+    @property
+    def ok(self) -> bool:
+        return self.syntax_error is None
+
+
+class _AnalysisVisitor(ast.NodeVisitor):
+    """
+    Walks the whole tree once, tracking the names each scope defines and
+    every name read, and collecting import statements along the way. A read
+    remembers the scope chain it happened in; since the scope sets keep
+    growing until the walk ends, names defined later in a scope (a function
+    using a module constant declared below it) still count as defined.
+    """
+
+    def __init__(self):
+        self.scopes: List[Set[str]] = [set()]
+        self.used_names: List[Tuple[str, Tuple[Set[str], ...]]] = []
+        self.imports: List[ImportedModule] = []
+
+    def _define(self, name: str):
+        self.scopes[-1].add(name)
+
+    def _visit_arguments(self, args: ast.arguments):
+        """Defaults and annotations are evaluated in the enclosing scope."""
+        for default in args.defaults + [d for d in args.kw_defaults if d is not None]:
+            self.visit(default)
+        for arg in args.posonlyargs + args.args + args.kwonlyargs + [a for a in (args.vararg, args.kwarg) if a]:
+            if arg.annotation is not None:
+                self.visit(arg.annotation)
+
+    @staticmethod
+    def _argument_names(args: ast.arguments) -> Set[str]:
+        return {arg.arg for arg in args.posonlyargs + args.args + args.kwonlyargs
+                + [a for a in (args.vararg, args.kwarg) if a]}
+
+    def _visit_in_new_scope(self, names: Set[str], body):
+        self.scopes.append(names)
+        for node in body if isinstance(body, list) else [body]:
+            self.visit(node)
+        self.scopes.pop()
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        self._visit_arguments(node.args)
+        if node.returns is not None:
+            self.visit(node.returns)
+        # A function defines its own name in the parent scope, and its arguments in a new one.
+        self._define(node.name)
+        self._visit_in_new_scope(self._argument_names(node.args), node.body)
+
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef):
+        self.visit_FunctionDef(node)
+
+    def visit_Lambda(self, node: ast.Lambda):
+        self._visit_arguments(node.args)
+        self._visit_in_new_scope(self._argument_names(node.args), node.body)
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        for expression in node.decorator_list + node.bases + [kw.value for kw in node.keywords]:
+            self.visit(expression)
+        self._define(node.name)
+        self._visit_in_new_scope(set(), node.body)
+
+    def visit_Name(self, node: ast.Name):
+        if isinstance(node.ctx, ast.Load):
+            self.used_names.append((node.id, tuple(self.scopes)))
+        else:
+            self._define(node.id)
+
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            # 'import a.b' binds 'a'.
+            self._define(alias.asname or alias.name.split(".")[0])
+            self.imports.append(ImportedModule(alias.name, 0, (), False))
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        for alias in node.names:
+            if alias.name != "*":
+                self._define(alias.asname or alias.name)
+        self.imports.append(ImportedModule(node.module or "", node.level,
+                                           tuple(alias.name for alias in node.names), True))
+
+    def visit_ExceptHandler(self, node: ast.ExceptHandler):
+        if node.name:
+            self._define(node.name)
+        self.generic_visit(node)
+
+    def visit_Global(self, node: ast.Global):
+        self.scopes[0].update(node.names)
+
+    def visit_Nonlocal(self, node: ast.Nonlocal):
+        self.scopes[-1].update(node.names)
+
+    def visit_MatchAs(self, node):
+        if node.name:
+            self._define(node.name)
+        self.generic_visit(node)
+
+    def visit_MatchStar(self, node):
+        if node.name:
+            self._define(node.name)
+
+    def visit_MatchMapping(self, node):
+        if node.rest:
+            self._define(node.rest)
+        self.generic_visit(node)
+
+    def undefined_names(self) -> Set[str]:
+        return {name for name, chain in self.used_names
+                if name not in BUILTIN_NAMES and not any(name in scope for scope in chain)}
+
+
+def _analyze(code: str, key: str) -> CodeAnalysis:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return CodeAnalysis(key, (), (), frozenset(),
+                            f"# [CodeSummarizer] Error: Could not parse file due to SyntaxError: {e}", str(e))
+    visitor = _AnalysisVisitor()
+    visitor.visit(tree)
+    # The symbol records and the summary only read module and class bodies, not function bodies.
+    return CodeAnalysis(
+        content_hash=key,
+        symbols=tuple(symbol_records_from_tree(tree)),
+        imports=tuple(visitor.imports),
+        undefined_names=frozenset(visitor.undefined_names()),
+        summary=CodeSummarizer(code).summarize_tree(tree),
+        syntax_error=None,
+    )
+
+
+def analyze_code(code: str) -> CodeAnalysis:
+    """
+    Parses code once and returns its symbols, imports, undefined names,
+    summary and syntax error, memoized by content hash. The import fixer,
+    the indexer, the integration validator and the summarizer all read from
+    this, so a freshly generated file is parsed once rather than once each.
+    """
+    key = content_key(code)
+    with _analysis_cache_lock:
+        cached = _analysis_cache.get(key)
+        if cached is not None:
+            _analysis_cache.move_to_end(key)
+            return cached
+    analysis = _analyze(code, key)
+    remember_summary(key, analysis.summary)
+    with _analysis_cache_lock:
+        _analysis_cache[key] = analysis
+        while len(_analysis_cache) > ANALYSIS_CACHE_MAX_ENTRIES:
+            _analysis_cache.popitem(last=False)
+    return analysis
+
+
+def clear_analysis_cache():
+    with _analysis_cache_lock:
+        _analysis_cache.clear()
+
+
+def _synthetic_module(lines: int) -> str:
+    """A plausible module of roughly the given number of lines."""
+    parts = ['"""Synthetic benchmark module."""', "import os", "import json", "from typing import Dict, List", ""]
+    index = 0
+    while len(parts) < lines:
+        parts += [
+            f"MAX_ITEMS_{index} = {index}",
+            "",
+            f"class Service{index}(object):",
+            f'    """Service number {index}."""',
+            "    retries: int = 3",
+            "",
+            "    def __init__(self, root: str, options: Dict[str, int] = None) -> None:",
+            "        self.root = root",
+            "        self.options = options or {}",
+            "",
+            "    def load(self, names: List[str]) -> Dict[str, str]:",
+            "        result = {}",
+            "        for name in names:",
+            "            path = os.path.join(self.root, name)",
+            "            if len(result) < MAX_ITEMS_" + str(index) + ":",
+            "                result[name] = json.dumps({'path': path, 'size': len(name)})",
+            "        return result",
+            "",
+            f"def helper_{index}(value: int, *, scale: float = 1.5) -> float:",
+            f"    return Service{index}('.').retries * value * scale",
+            "",
+        ]
+        index += 1
+    return "\n".join(parts[:lines]) + "\n"
+
+
+def benchmark_analysis(lines: int = 5000, repeats: int = 5) -> Dict[str, Any]:
+    """
+    Times the four consumers of a generated file (indexer symbols, import
+    fixer names, integration validator imports, summarizer) each parsing
+    and walking on their own, against one shared analyze_code pass, cold
+    and cached, on a synthetic module of the given size.
+    """
+    code = _synthetic_module(lines)
+
+    def separate():
+        symbol_records_from_tree(ast.parse(code))
+        _AnalysisVisitor().visit(ast.parse(code))
+        [node for node in ast.walk(ast.parse(code)) if isinstance(node, (ast.Import, ast.ImportFrom))]
+        CodeSummarizer(code).summarize()
+
+    def shared_cold():
+        clear_analysis_cache()
+        analysis = analyze_code(code)
+        analysis.symbols, analysis.undefined_names, analysis.imports, analysis.summary
+
+    def shared_cached():
+        for _ in range(4):
+            analyze_code(code)
+
+    def best_ms(fn) -> float:
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - started) * 1000)
+        return min(timings)
+
+    separate_ms = best_ms(separate)
+    cold_ms = best_ms(shared_cold)
+    analyze_code(code)
+    cached_ms = best_ms(shared_cached)
+    return {
+        "lines": code.count("\n"),
+        "separate_passes_ms": round(separate_ms, 2),
+        "shared_cold_ms": round(cold_ms, 2),
+        "shared_cached_ms": round(cached_ms, 3),
+        "cold_speedup": round(separate_ms / cold_ms, 2) if cold_ms else None,
+    }
+
+
+if __name__ == "__main__":
+    import json
+    print(json.dumps(benchmark_analysis(), indent=2))
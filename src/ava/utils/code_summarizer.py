@@ -1,16 +1,35 @@
 # src/ava/utils/code_summarizer.py
 import ast
+import hashlib
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Mapping
+
+# Summarizing one file takes about a millisecond, while each spawned worker re-imports the
+# application (Qt included) for seconds; below this many uncached files, stay in-process.
+PARALLEL_SUMMARY_MIN_FILES = 2000
+SUMMARY_CACHE_MAX_ENTRIES = 4096
+MAX_VALUE_CHARS = 60
+
+_summary_cache: "OrderedDict[str, str]" = OrderedDict()
+_summary_cache_lock = threading.Lock()
 
 
 class CodeSummarizer(ast.NodeVisitor):
     """
     Parses Python source code using the AST module to extract a high-level
-    summary of its structure, including imports, classes, and functions.
+    summary of its structure: imports, module constants, classes with their
+    bases and attributes, and function signatures with annotations and
+    defaults. Bodies are replaced by '...'.
     """
 
     def __init__(self, source_code: str):
         self.source_code = source_code
         self.summary = []
+        self._indent = ""
 
     def summarize(self) -> str:
         """
@@ -20,47 +39,159 @@ class CodeSummarizer(ast.NodeVisitor):
             A string containing the structural summary of the code.
         """
         try:
-            tree = ast.parse(self.source_code)
-            self.visit(tree)
-            return "\n".join(self.summary)
+            return self.summarize_tree(ast.parse(self.source_code))
         except SyntaxError as e:
             # If the code can't be parsed, return a clear error message
             # instead of the full, potentially huge, source code.
             return f"# [CodeSummarizer] Error: Could not parse file due to SyntaxError: {e}"
 
+    def summarize_tree(self, tree: ast.Module) -> str:
+        """Summarizes an already parsed tree of source_code."""
+        self.visit(tree)
+        return "\n".join(self.summary)
+
+    @staticmethod
+    def _unparse(node: ast.AST, limit: int = 0) -> str:
+        try:
+            text = ast.unparse(node)
+        except Exception:
+            return "..."
+        return text if not limit or len(text) <= limit else text[:limit] + "..."
+
+    def _docstring(self, node: ast.AST, indent: str):
+        doc = ast.get_docstring(node, clean=True)
+        if doc and doc.strip():
+            self.summary.append(f'{indent}"""{doc.strip().splitlines()[0]}"""')
+
+    def visit_Module(self, node: ast.Module):
+        self._docstring(node, "")
+        for item in node.body:
+            if isinstance(item, (ast.Assign, ast.AnnAssign)):
+                self._visit_assignment(item)
+            else:
+                self.visit(item)
+
     def visit_Import(self, node: ast.Import):
-        for alias in node.names:
-            self.summary.append(f"import {alias.name}")
-        self.generic_visit(node)
+        names = ", ".join(alias.name + (f" as {alias.asname}" if alias.asname else "") for alias in node.names)
+        self.summary.append(f"{self._indent}import {names}")
 
     def visit_ImportFrom(self, node: ast.ImportFrom):
-        module = node.module or ''
-        names = ", ".join(alias.name for alias in node.names)
-        self.summary.append(f"from {module} import {names}")
-        self.generic_visit(node)
+        module = "." * node.level + (node.module or '')
+        names = ", ".join(alias.name + (f" as {alias.asname}" if alias.asname else "") for alias in node.names)
+        self.summary.append(f"{self._indent}from {module} import {names}")
+
+    def _visit_assignment(self, node):
+        """Module constants and class attributes, with short values."""
+        if isinstance(node, ast.AnnAssign):
+            if not isinstance(node.target, ast.Name):
+                return
+            line = f"{node.target.id}: {self._unparse(node.annotation)}"
+            if node.value is not None:
+                line += f" = {self._unparse(node.value, MAX_VALUE_CHARS)}"
+        else:
+            names = [target.id for target in node.targets if isinstance(target, ast.Name)]
+            if not names:
+                return
+            line = f"{' = '.join(names)} = {self._unparse(node.value, MAX_VALUE_CHARS)}"
+        self.summary.append(f"{self._indent}{line}")
 
     def visit_ClassDef(self, node: ast.ClassDef):
-        self.summary.append(f"\nclass {node.name}:")
-        # We only visit the direct children (methods) of the class
+        indent = self._indent
+        for decorator in node.decorator_list:
+            self.summary.append(f"{indent}@{self._unparse(decorator)}")
+        bases = [self._unparse(base) for base in node.bases] + [self._unparse(kw) for kw in node.keywords]
+        self.summary.append(f"\n{indent}class {node.name}({', '.join(bases)}):" if bases
+                            else f"\n{indent}class {node.name}:")
+        self._docstring(node, indent + "    ")
+        self._indent = indent + "    "
+        # Only the direct children: attributes, methods and nested classes, never method bodies
         for item in node.body:
-            if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
-                self.visit_FunctionDef(item, in_class=True)
-        # Do not call generic_visit to avoid recursing into method bodies
+            if isinstance(item, (ast.Assign, ast.AnnAssign)):
+                self._visit_assignment(item)
+            elif isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                self.visit(item)
+        self._indent = indent
 
-    def visit_FunctionDef(self, node: ast.FunctionDef, in_class: bool = False):
-        indent = "    " if in_class else ""
-        decorator_list = [f"@{dec.id}" for dec in node.decorator_list if hasattr(dec, 'id')]
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        indent = self._indent
+        for decorator in node.decorator_list:
+            self.summary.append(f"{indent}@{self._unparse(decorator)}")
+        prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+        returns = f" -> {self._unparse(node.returns)}" if node.returns is not None else ""
+        self.summary.append(f"{indent}{prefix} {node.name}({self._unparse(node.args)}){returns}:")
+        self._docstring(node, indent + "    ")
+        self.summary.append(f"{indent}    ...")  # Indicate body is omitted
+        # Do not call generic_visit to avoid recursing into the function body
 
-        args = [arg.arg for arg in node.args.args]
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef):
+        self.visit_FunctionDef(node)
 
-        func_signature = f"{indent}def {node.name}({', '.join(args)}):"
 
-        for decorator in decorator_list:
-            self.summary.append(f"{indent}{decorator}")
-        self.summary.append(func_signature)
-        self.summary.append(f"{indent}    ...")  # Indicate body is omitted
-        # Do not call generic_visit to avoid recursing into the function body
+def _summarize_uncached(source_code: str) -> str:
+    return CodeSummarizer(source_code).summarize()
+
+
+def content_key(source_code: str) -> str:
+    """The content hash summaries are memoized under."""
+    return hashlib.sha1(source_code.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+def remember_summary(key: str, summary: str):
+    """Stores a summary computed elsewhere (e.g. by analyze_code) under content_key(source)."""
+    with _summary_cache_lock:
+        _summary_cache[key] = summary
+        _summary_cache.move_to_end(key)
+        while len(_summary_cache) > SUMMARY_CACHE_MAX_ENTRIES:
+            _summary_cache.popitem(last=False)
+
+
+def summarize_source(source_code: str) -> str:
+    """CodeSummarizer(source_code).summarize(), memoized by content hash."""
+    key = content_key(source_code)
+    with _summary_cache_lock:
+        cached = _summary_cache.get(key)
+        if cached is not None:
+            _summary_cache.move_to_end(key)
+            return cached
+    summary = _summarize_uncached(source_code)
+    remember_summary(key, summary)
+    return summary
+
+
+def summarize_sources(sources: Mapping[str, str], max_workers: int = 0) -> Dict[str, str]:
+    """
+    Summarizes many files at once ({path: source} -> {path: summary}).
+    Cached summaries are reused; when enough files are uncached they are
+    summarized on a process pool.
+    """
+    summaries: Dict[str, str] = {}
+    pending: Dict[str, List[str]] = {}  # content hash -> paths with that content
+    pending_sources: Dict[str, str] = {}
+    with _summary_cache_lock:
+        for path, source_code in sources.items():
+            key = content_key(source_code)
+            cached = _summary_cache.get(key)
+            if cached is not None:
+                _summary_cache.move_to_end(key)
+                summaries[path] = cached
+            else:
+                pending.setdefault(key, []).append(path)
+                pending_sources[key] = source_code
+    if not pending:
+        return summaries
 
-    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef, in_class: bool = False):
-        # This reuses the logic from FunctionDef for async functions
-        self.visit_FunctionDef(node, in_class)
\ No newline at end of file
+    keys = list(pending)
+    workers = min(max_workers or max(1, (os.cpu_count() or 2) - 1), len(keys))
+    if len(keys) < PARALLEL_SUMMARY_MIN_FILES or workers < 2:
+        results = [_summarize_uncached(pending_sources[key]) for key in keys]
+    else:
+        # 'spawn' everywhere, so workers never inherit a forked Qt application state.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            chunksize = max(1, len(keys) // (workers * 4))
+            results = list(executor.map(_summarize_uncached, [pending_sources[key] for key in keys],
+                                        chunksize=chunksize))
+    for key, summary in zip(keys, results):
+        remember_summary(key, summary)
+        for path in pending[key]:
+            summaries[path] = summary
+    return summaries
@@ -0,0 +1,82 @@
+# src/ava/utils/embedding_tokenizer.py
+import threading
+from typing import Dict
+
+
+class EmbeddingTokenizer:
+    """
+    Counts tokens the way the RAG server's embedding model does, so chunks can
+    be sized to the model's input window. The tokenizer is loaded on the
+    first count, once per model name, and shared by every caller. Without the `tokenizers` or
+    `transformers` package (or offline without a cached copy) counts fall back
+    to a characters-per-token estimate.
+    """
+
+    _instances: Dict[str, "EmbeddingTokenizer"] = {}
+    _instances_lock = threading.Lock()
+
+    # WordPiece splits code into short pieces; ~3 characters per token is typical.
+    FALLBACK_CHARS_PER_TOKEN = 3.0
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._tokenizer = None
+        self._encode = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, model_name: str) -> "EmbeddingTokenizer":
+        with cls._instances_lock:
+            if model_name not in cls._instances:
+                cls._instances[model_name] = cls(model_name)
+            return cls._instances[model_name]
+
+    @property
+    def available(self) -> bool:
+        self._ensure_loaded()
+        return self._encode is not None
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+
+    def _load(self):
+        try:
+            from tokenizers import Tokenizer
+            self._tokenizer = Tokenizer.from_pretrained(self.model_name)
+            self._tokenizer.no_truncation()
+            self._encode = lambda text: len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+            print(f"[EmbeddingTokenizer] Loaded tokenizer for '{self.model_name}'.")
+            return
+        except Exception:
+            pass
+        try:
+            from transformers import AutoTokenizer
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            self._encode = lambda text: len(self._tokenizer.encode(text, add_special_tokens=False,
+                                                                   truncation=False, verbose=False))
+            print(f"[EmbeddingTokenizer] Loaded tokenizer for '{self.model_name}' via transformers.")
+        except Exception as e:
+            print(f"[EmbeddingTokenizer] Tokenizer for '{self.model_name}' unavailable ({e}); "
+                  f"estimating {self.FALLBACK_CHARS_PER_TOKEN} characters per token.")
+
+    def count(self, text: str) -> int:
+        """Number of model tokens in text, excluding the special tokens the model adds."""
+        if not text:
+            return 0
+        self._ensure_loaded()
+        if self._encode is not None:
+            return self._encode(text)
+        return int(len(text) / self.FALLBACK_CHARS_PER_TOKEN) + 1
+
+    def chars_for_tokens(self, text: str, tokens: int) -> int:
+        """Approximate character length of a prefix of text holding about `tokens` tokens."""
+        total = self.count(text)
+        if total <= tokens:
+            return len(text)
+        return max(1, int(len(text) * tokens / total))
@@ -0,0 +1,112 @@
+# src/ava/utils/rag_context_packer.py
+import re
+from typing import List, Dict, Any, Set
+
+# Matches the per-snippet header written by rag_server's /query endpoint.
+SNIPPET_HEADER_PATTERN = re.compile(r'^--- Relevant Snippet \d+ \(from: (?P<origin>.*?)\) ---$', re.MULTILINE)
+
+
+class RAGContextPacker:
+    """
+    Packs structured RAG hits into a token budget. Hits are taken in score
+    order; near-duplicates and chunks whose line windows largely overlap an
+    already-selected chunk of the same file are dropped, so the LLM is not
+    sent the same code twice.
+    """
+
+    def __init__(self, chars_per_token: float = 4.0, near_duplicate_threshold: float = 0.85,
+                 overlap_threshold: float = 0.5, shingle_size: int = 5):
+        self.chars_per_token = chars_per_token
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.overlap_threshold = overlap_threshold
+        self.shingle_size = shingle_size
+
+    def estimate_tokens(self, text: str) -> int:
+        """Cheap token estimate; the client has no tokenizer for the LLM in use."""
+        return int(len(text) / self.chars_per_token) + 1
+
+    def pack(self, hits: List[Dict[str, Any]], token_budget: int) -> List[Dict[str, Any]]:
+        """
+        Selects hits in descending score order until the token budget is spent.
+
+        Args:
+            hits: Hit dicts as returned by RAGService.query_hits (needs at least 'text').
+            token_budget: Maximum estimated tokens for the selected snippets.
+
+        Returns:
+            The selected hits, in score order.
+        """
+        selected: List[Dict[str, Any]] = []
+        selected_shingles: List[Set[str]] = []
+        used_tokens = 0
+
+        for hit in sorted(hits, key=lambda h: h.get("score", 0.0), reverse=True):
+            text = (hit.get("text") or "").strip()
+            if not text:
+                continue
+            cost = self.estimate_tokens(text) + 16  # Header overhead
+            if used_tokens + cost > token_budget:
+                continue
+            if any(self._windows_overlap(hit, other) for other in selected):
+                continue
+            shingles = self._shingles(text)
+            if any(self._jaccard(shingles, other) >= self.near_duplicate_threshold for other in selected_shingles):
+                continue
+
+            selected.append(hit)
+            selected_shingles.append(shingles)
+            used_tokens += cost
+
+        return selected
+
+    def format(self, hits: List[Dict[str, Any]]) -> str:
+        """Renders hits with the same snippet headers the RAG server uses."""
+        parts = []
+        for i, hit in enumerate(hits):
+            metadata = hit.get("metadata") or {}
+            origin = metadata.get("source") or hit.get("source", "Unknown Source")
+            if hit.get("start_line") is not None and hit.get("end_line") is not None:
+                origin += f":{hit['start_line']}-{hit['end_line']}"
+            if hit.get("source_collection"):
+                origin += f", source: {hit['source_collection']}"
+            parts.append(f"--- Relevant Snippet {i + 1} (from: {origin}) ---\n{hit.get('text', '').strip()}")
+        return "\n\n".join(parts)
+
+    def split_context(self, context: str) -> List[Dict[str, Any]]:
+        """
+        Parses a preformatted context string back into hits. Earlier snippets
+        get higher scores, mirroring the server's ranking.
+        """
+        matches = list(SNIPPET_HEADER_PATTERN.finditer(context or ""))
+        hits = []
+        for i, match in enumerate(matches):
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(context)
+            hits.append({
+                "text": context[match.end():end].strip(),
+                "source": match.group("origin"),
+                "score": 1.0 / (i + 1),
+            })
+        return hits
+
+    def _windows_overlap(self, hit: Dict[str, Any], other: Dict[str, Any]) -> bool:
+        if hit.get("source") != other.get("source"):
+            return False
+        start, end = hit.get("start_line"), hit.get("end_line")
+        other_start, other_end = other.get("start_line"), other.get("end_line")
+        if None in (start, end, other_start, other_end):
+            return False
+        overlap = min(end, other_end) - max(start, other_start) + 1
+        smaller = min(end - start, other_end - other_start) + 1
+        return overlap > 0 and smaller > 0 and overlap / smaller >= self.overlap_threshold
+
+    def _shingles(self, text: str) -> Set[str]:
+        words = text.split()
+        if len(words) <= self.shingle_size:
+            return {" ".join(words)}
+        return {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+
+    @staticmethod
+    def _jaccard(a: Set[str], b: Set[str]) -> float:
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
@@ -0,0 +1,160 @@
+# src/ava/utils/symbol_extractor.py
+import ast
+from pathlib import PurePosixPath
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Top-level kinds that belong in the flat name -> module index.
+INDEXED_KINDS = ("class", "function", "async function", "constant")
+
+
+def module_path_for(rel_path: str) -> str:
+    """'game_logic/player.py' -> 'game_logic.player'."""
+    return str(PurePosixPath(rel_path.replace('\\', '/')).with_suffix('')).replace('/', '.')
+
+
+def package_module_name(module: str) -> str:
+    """'pkg.__init__' -> 'pkg'; other module paths are returned unchanged."""
+    return module[:-len(".__init__")] if module.endswith(".__init__") else module
+
+
+def extract_import_candidates(tree: ast.Module, module: str) -> List[List[str]]:
+    """
+    Returns, per imported module, the absolute module names it may refer to,
+    most specific first: 'from a.b import c' may import the submodule a.b.c
+    or the name c from a.b. Relative imports are resolved against module.
+    Which candidate is a project module is decided later by the import graph.
+    """
+    is_package = module.endswith(".__init__")
+    package_parts = package_module_name(module).split(".")
+    if not is_package:
+        package_parts = package_parts[:-1]
+    candidates: List[List[str]] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                parts = alias.name.split(".")
+                candidates.append([".".join(parts[:i]) for i in range(len(parts), 0, -1)])
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                if node.level - 1 > len(package_parts):
+                    continue
+                base_parts = package_parts[:len(package_parts) - (node.level - 1)]
+                base = ".".join(base_parts + (node.module.split(".") if node.module else []))
+            else:
+                base = node.module or ""
+            if not base:
+                continue
+            for alias in node.names:
+                if alias.name == "*":
+                    candidates.append([base])
+                else:
+                    candidates.append([f"{base}.{alias.name}", base])
+    return candidates
+
+
+def _declared_all(tree: ast.Module) -> Optional[Set[str]]:
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == "__all__" for t in node.targets):
+            if isinstance(node.value, (ast.List, ast.Tuple)):
+                return {elt.value for elt in node.value.elts
+                        if isinstance(elt, ast.Constant) and isinstance(elt.value, str)}
+    return None
+
+
+def _signature(node) -> str:
+    try:
+        signature = f"({ast.unparse(node.args)})"
+        if node.returns is not None:
+            signature += f" -> {ast.unparse(node.returns)}"
+        return signature
+    except Exception:
+        return "(...)"
+
+
+def _doc_head(node) -> str:
+    doc = ast.get_docstring(node, clean=True) if isinstance(
+        node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)) else None
+    lines = doc.strip().splitlines() if doc else []
+    return lines[0][:200] if lines else ""
+
+
+def _unparse_all(nodes) -> List[str]:
+    result = []
+    for node in nodes:
+        try:
+            result.append(ast.unparse(node))
+        except Exception:
+            pass
+    return result
+
+
+def symbol_records_from_tree(tree: ast.Module) -> List[Dict[str, Any]]:
+    """
+    Returns one record per module-level class, function, constant and
+    variable, and per method and nested class, with its qualified name,
+    kind, signature, decorators, first docstring line, line span and whether
+    the module exports it (listed in __all__, or public when there is no
+    __all__).
+    """
+    declared_all = _declared_all(tree)
+    records: List[Dict[str, Any]] = []
+
+    def exported(name: str) -> bool:
+        return name in declared_all if declared_all is not None else not name.startswith("_")
+
+    def add(node, name: str, qualname: str, kind: str, top_level: bool, signature: str = "",
+            decorators: Optional[List[str]] = None):
+        records.append({
+            "name": name,
+            "qualname": qualname,
+            "kind": kind,
+            "signature": signature,
+            "decorators": decorators or [],
+            "doc": _doc_head(node),
+            "start_line": getattr(node, "lineno", 0),
+            "end_line": getattr(node, "end_lineno", None) or getattr(node, "lineno", 0),
+            "exported": top_level and exported(name),
+            "top_level": top_level,
+        })
+
+    def visit_body(body, prefix: str, in_class: bool):
+        for node in body:
+            top_level = not prefix
+            if isinstance(node, ast.ClassDef):
+                qualname = f"{prefix}{node.name}"
+                bases = ", ".join(_unparse_all(node.bases))
+                add(node, node.name, qualname, "class", top_level, f"({bases})" if bases else "",
+                    _unparse_all(node.decorator_list))
+                visit_body(node.body, qualname + ".", True)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                kind = "method" if in_class else "function"
+                if isinstance(node, ast.AsyncFunctionDef):
+                    kind = f"async {kind}"
+                add(node, node.name, f"{prefix}{node.name}", kind, top_level, _signature(node),
+                    _unparse_all(node.decorator_list))
+            elif top_level and isinstance(node, (ast.Assign, ast.AnnAssign)):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                for target in targets:
+                    if isinstance(target, ast.Name) and target.id != "__all__":
+                        kind = "constant" if target.id.isupper() else "variable"
+                        add(node, target.id, target.id, kind, True)
+
+    visit_body(tree.body, "", False)
+    return records
+
+
+def parse_file_symbols(rel_path: str, abs_path: str
+                       ) -> Tuple[str, List[Dict[str, Any]], List[List[str]], Optional[str]]:
+    """
+    Reads and parses one file. Runs in the indexer's worker processes, so it
+    only depends on the standard library. Returns (rel_path, records,
+    import_candidates, error).
+    """
+    try:
+        with open(abs_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        tree = ast.parse(content)
+        return (rel_path, symbol_records_from_tree(tree),
+                extract_import_candidates(tree, module_path_for(rel_path)), None)
+    except Exception as e:
+        return rel_path, [], [], str(e)
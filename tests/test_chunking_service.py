@@ -0,0 +1,42 @@
+from src.ava.services.chunking_service import ChunkingService
+
+
+def _module(function_count: int, insert_at: int = -1) -> str:
+    parts = ['"""Example module."""', "import os", "import json", "", "LIMIT = 10", ""]
+    for index in range(function_count):
+        if index == insert_at:
+            parts += ["def inserted(value):", "    total = value * 2", "    return total + 1", ""]
+        parts += [
+            f"def function_{index}(path, options=None):",
+            f'    """Loads item {index}."""',
+            "    options = options or {}",
+            "    full_path = os.path.join(path, str(LIMIT))",
+            f"    return json.dumps({{'index': {index}, 'path': full_path, 'options': options}})",
+            "",
+        ]
+    return "\n".join(parts)
+
+
+def _ids_by_name(chunks):
+    return {chunk['metadata']['qualified_name']: chunk['id'] for chunk in chunks}
+
+
+def test_inserting_a_function_keeps_other_chunk_ids():
+    service = ChunkingService()
+    original = _ids_by_name(service.chunk_document(_module(40), "/project/pkg/example.py"))
+    assert "function_0" in original and "function_39" in original
+
+    for position in (0, 1, 10, 20, 39):
+        edited = _ids_by_name(service.chunk_document(_module(40, insert_at=position), "/project/pkg/example.py"))
+        assert "inserted" in edited
+        assert {name: edited[name] for name in original} == original
+
+
+def test_editing_a_function_changes_only_its_chunk_id():
+    service = ChunkingService()
+    content = _module(10)
+    original = _ids_by_name(service.chunk_document(content, "/project/pkg/example.py"))
+    edited = _ids_by_name(service.chunk_document(content.replace("Loads item 3.", "Loads item three."),
+                                                 "/project/pkg/example.py"))
+    changed = {name for name in original if original[name] != edited[name]}
+    assert changed == {"function_3"}